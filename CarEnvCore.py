@@ -0,0 +1,385 @@
+"""
+One car racing env core shared by the straight, turn and custom track envs.
+
+Each env is a configuration of CarRacingEnvCore: a track backend plus the
+dynamics and reward settings of the original script. A track backend is any
+object with
+
+    track_length              x position of the finish line
+    get_width()               distance between the two boundaries
+    get_y_range()             (low, high) y for the observation space
+    boundaries(x)             (left, right) boundary y at one x position
+    get_boundaries(xs)        (left, right) arrays for an array of x positions
+    x_limits                  (low, high) x the car must stay within, or None
+
+and optionally
+
+    distances(x, y)           signed distances of a point to the (left, right)
+                              boundaries, negative past that boundary. Replaces
+                              the vertical distances at x in the observation
+                              and the off-track check.
+
+track_Custom.Track is one; RectangleTrack and TurnTrack below wrap the fixed
+tracks of CarRacingEnv and track.py, and track_sdf.SDFTrack adds distances()
+to any of them.
+"""
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+import track as turn_track
+from raycast import boundary_segments, cast_rays, track_polylines
+
+# Why an episode was truncated, in the order the limits are checked
+TRUNCATION_REASONS = ("stalled", "no_progress", "time_limit")
+
+
+class RectangleTrack:
+    """The fixed 100 x 5 box of CarRacingEnv, boundaries at y = bottom and y = top."""
+
+    def __init__(self, left=0, right=100, bottom=0, top=5):
+        self.track_bounds = {"left": left, "right": right, "top": top, "bottom": bottom}
+        self.track_length = right
+        self.x_limits = (left, right)
+
+    def get_width(self):
+        return self.track_bounds["top"] - self.track_bounds["bottom"]
+
+    def get_y_range(self):
+        return self.track_bounds["bottom"], self.track_bounds["top"]
+
+    def boundaries(self, x_position):
+        return self.track_bounds["bottom"], self.track_bounds["top"]
+
+    def get_boundaries(self, x_positions):
+        shape = np.shape(x_positions)
+        return np.full(shape, float(self.track_bounds["bottom"])), np.full(shape, float(self.track_bounds["top"]))
+
+
+class TurnTrack:
+    """Backend over the straight-then-sloped track of track.py."""
+
+    x_limits = None
+    track_length = turn_track.TRACK_LENGTH
+
+    def get_width(self):
+        return turn_track.TRACK_WIDTH
+
+    def get_y_range(self):
+        # The bounds CarEnvTurn's checkpoints were trained with
+        return -turn_track.TRACK_WIDTH / 2, turn_track.TRACK_WIDTH / 2 + 15
+
+    def boundaries(self, x_position):
+        return turn_track.left_boundary(x_position), turn_track.right_boundary(x_position)
+
+    def get_boundaries(self, x_positions):
+        return turn_track.get_boundaries(x_positions)
+
+
+class CarRacingEnvCore(gym.Env):
+    """
+    Car on a track backend: turn left or right each step, stay between the boundaries.
+
+    :param track: Track backend, see the module docstring
+    :param turn_angle: Heading change per left/right action, in radians
+    :param wrap_angle: Keep the heading in [0, 2π)
+    :param start_position: (x, y) of the car after reset()
+    :param start_angle: Heading of the car after reset()
+    :param speed_recovery: Speed regained per step on track, up to 1
+    :param collision: "clamp" puts the car on the boundary it crossed and
+        stops it, the episode goes on. "bounce" slows the car by the impact
+        angle and ends the episode.
+    :param move: When the car moves to its new position. "first" moves
+        before the checks with the old speed, "always" after them with the
+        new speed, "on_track" likewise but only when on track and not finished.
+    :param centre_reward: Base reward falls off with the distance to the
+        centre line instead of a flat 1
+    :param progress_reward: Add 2 for moving forward and subtract 3 for moving backward
+    :param finish_reward: Reward of the step that crosses the finish line,
+        None keeps the shaped reward
+    :param boundary_distances: Append the distances to both boundaries to the observation
+    :param ray_angles: Range-sensor mode: the observation is the distance to
+        the boundaries along a ray at each of these angles from the heading,
+        see raycast.py. None keeps the car state observation.
+    :param ray_range: Longest distance a ray measures
+    :param action_repeat: Physics substeps per step(). The action holds for all
+        of them, their rewards are summed and the step ends early on the
+        first one that ends the episode.
+    :param max_steps: Truncate episodes after this many steps, None for no limit
+    :param stall_steps: Truncate when the car was slower than stall_speed for
+        this many steps in a row, e.g. pinned against a boundary. Every
+        boundary hit stops the car, and it takes stall_speed / speed_recovery
+        steps to speed up again, so keep stall_steps well above that.
+    :param stall_speed: Speed below which a step counts as stalled
+    :param progress_window: Truncate when the car got no further than
+        min_progress beyond its best x within this many steps
+    :param min_progress: Forward distance that counts as progress
+    """
+
+    # profiling.StepStats timing the phases of step(), set by profiling.StepProfiler
+    profiler = None
+
+    def __init__(self, track, turn_angle=np.pi / 36, wrap_angle=True, start_position=(0.0, 0.0), start_angle=0,
+                 speed_recovery=0.1, collision="clamp", move="always", centre_reward=False, progress_reward=True,
+                 finish_reward=100, boundary_distances=False, ray_angles=None, ray_range=20.0, action_repeat=1,
+                 max_steps=None, stall_steps=None, stall_speed=0.5, progress_window=None, min_progress=1.0):
+        super().__init__()
+        if collision not in ("clamp", "bounce"):
+            raise ValueError(f"Unknown collision mode {collision!r}")
+        if move not in ("first", "always", "on_track"):
+            raise ValueError(f"Unknown move mode {move!r}")
+        if action_repeat < 1:
+            raise ValueError(f"action_repeat must be at least 1, got {action_repeat}")
+        self.track = track
+        self.turn_angle = turn_angle
+        self.wrap_angle = wrap_angle
+        self.start_position = start_position
+        self.start_angle = start_angle
+        self.speed_recovery = speed_recovery
+        self.collision = collision
+        self.move = move
+        self.centre_reward = centre_reward
+        self.progress_reward = progress_reward
+        self.finish_reward = finish_reward
+        self.boundary_distances = boundary_distances
+        self.ray_angles = None if ray_angles is None else np.asarray(ray_angles, dtype=np.float64)
+        self.ray_range = ray_range
+        self._ray_track = None
+        self.action_repeat = action_repeat
+        self.max_steps = max_steps
+        self.stall_steps = stall_steps
+        self.stall_speed = stall_speed
+        self.progress_window = progress_window
+        self.min_progress = min_progress
+        self._limits = max_steps is not None or stall_steps is not None or progress_window is not None
+
+        # Truncated episodes by reason, and the steps the step limit would still have allowed them
+        self.truncations = dict.fromkeys(TRUNCATION_REASONS, 0)
+        self.steps_saved = 0
+
+        # Define the action space: 0 = turn left, 1 = turn right
+        self.action_space = spaces.Discrete(2)
+        self.observation_space = self._observation_space(track)
+
+        # Initial car settings
+        self.speed = 1.0  # Initial speed
+        self.car_position = np.array(start_position, dtype=np.float64)
+        self.angle = start_angle
+        self.done = False
+        self.episode_steps = 0
+        self._slow_steps = 0
+        self._best_x = self.car_position[0]
+        self._best_x_step = 0
+        self.finish_line = self.track.track_length  # Finish line is at the end of the track
+
+    def _observation_space(self, bounds):
+        if self.ray_angles is not None:
+            return spaces.Box(low=0, high=self.ray_range, shape=self.ray_angles.shape, dtype=np.float32)
+        # (x_position, y_position, angle[, distance_to_left_boundary, distance_to_right_boundary])
+        # x spans the whole track and y everything the track reaches
+        low_y, high_y = bounds.get_y_range()
+        if not self.boundary_distances:
+            return spaces.Box(low=np.array([0, low_y, -np.pi]), high=np.array([bounds.track_length, high_y, np.pi]),
+                              dtype=np.float32)
+        half_width = bounds.get_width() / 2
+        return spaces.Box(low=np.array([0, low_y, -np.pi, 0, 0]),
+                          high=np.array([bounds.track_length, high_y, np.pi, half_width, half_width]),
+                          dtype=np.float32)
+
+    def _observation(self, distance_to_left_boundary, distance_to_right_boundary):
+        if self.ray_angles is not None:
+            return self._ray_observation()
+        if self.boundary_distances:
+            return np.array([self.car_position[0], self.car_position[1], self.angle,
+                             distance_to_left_boundary, distance_to_right_boundary])
+        return np.array([self.car_position[0], self.car_position[1], self.angle])
+
+    def _ray_observation(self):
+        # The boundary segments only change with the track
+        if self._ray_track is not self.track:
+            self._ray_segments = boundary_segments(*track_polylines(self.track), self.ray_range)[None]
+            self._ray_track = self.track
+        return cast_rays(self.car_position[:1], self.car_position[1:], np.array([self.angle]), self.ray_angles,
+                         self._ray_segments, self.ray_range)[0]
+
+    def _distances(self, x_position, y_position, left_boundary, right_boundary):
+        # Vertical distances at x, unless the backend measures them itself
+        if hasattr(self.track, "distances"):
+            return self.track.distances(x_position, y_position)
+        return y_position - left_boundary, right_boundary - y_position
+
+    def _select_track(self):
+        # Called by reset() after seeding, envs that change track between episodes do it here
+        return {}
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        info = self._select_track()
+        self.car_position = np.array(self.start_position, dtype=np.float64)
+        self.angle = self.start_angle
+        self.speed = 1.0  # Reset speed
+        self.done = False
+        self.episode_steps = 0
+        self._slow_steps = 0
+        self._best_x = self.car_position[0]
+        self._best_x_step = 0
+        left_boundary, right_boundary = self.track.boundaries(self.car_position[0])
+        return self._observation(*self._distances(*self.car_position, left_boundary, right_boundary)), info
+
+    def step(self, action):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        # The action holds for every substep, up to the first one that ends the episode
+        reward, off_track, distance_to_left_boundary, distance_to_right_boundary = self._substep(action, profiler)
+        off_track_any = off_track
+        substeps = 1
+        while substeps < self.action_repeat and not self.done:
+            substep_reward, off_track, distance_to_left_boundary, distance_to_right_boundary = self._substep(
+                action, profiler)
+            reward += substep_reward
+            off_track_any = off_track_any or off_track
+            substeps += 1
+
+        self.episode_steps += 1
+        truncation_reason = self._truncation_reason() if self._limits and not self.done else None
+        truncated = truncation_reason is not None
+        observation = self._observation(distance_to_left_boundary, distance_to_right_boundary)
+
+        # Flag the step's events for callbacks, e.g. telemetry.TelemetryCallback
+        info = {}
+        if off_track_any:
+            info["off_track"] = True
+        if self.done and not off_track:
+            info["finished"] = True
+        if self.action_repeat > 1:
+            info["substeps"] = substeps
+        if truncated:
+            info["truncation_reason"] = truncation_reason
+            self.truncations[truncation_reason] += 1
+            if self.max_steps is not None:
+                info["steps_saved"] = self.max_steps - self.episode_steps
+                self.steps_saved += info["steps_saved"]
+        if profiler is not None:
+            profiler.lap("observation")
+            if off_track_any:
+                profiler.count("off_track")
+            if self.done and not off_track:
+                profiler.count("finished")
+            profiler.end_step()
+        return observation, reward, self.done, truncated, info
+
+    def _truncation_reason(self):
+        # Why the running episode should end after this step, None if it goes on
+        self._slow_steps = self._slow_steps + 1 if self.speed < self.stall_speed else 0
+        if self.car_position[0] >= self._best_x + self.min_progress:
+            self._best_x = self.car_position[0]
+            self._best_x_step = self.episode_steps
+        if self.stall_steps is not None and self._slow_steps >= self.stall_steps:
+            return "stalled"
+        if self.progress_window is not None and self.episode_steps - self._best_x_step >= self.progress_window:
+            return "no_progress"
+        if self.max_steps is not None and self.episode_steps >= self.max_steps:
+            return "time_limit"
+        return None
+
+    def _substep(self, action, profiler=None):
+        # One physics update, returns the reward, whether the car went off track and the boundary distances
+        # Save the previous position to compare with the new position
+        prev_x_position = self.car_position[0]
+
+        # Update angle based on action: 0 = turn left, 1 = turn right
+        if action == 0:  # Turn left
+            self.angle += self.turn_angle
+        elif action == 1:  # Turn right
+            self.angle -= self.turn_angle
+        if self.wrap_angle:
+            self.angle %= 2 * np.pi
+
+        # Predict the next position based on the current angle and speed
+        cos_angle = np.cos(self.angle)
+        sin_angle = np.sin(self.angle)
+        predicted_position = np.copy(self.car_position)
+        predicted_position[0] += cos_angle * self.speed
+        predicted_position[1] += sin_angle * self.speed
+        if self.move == "first":
+            self.car_position[:] = predicted_position
+        if profiler is not None:
+            profiler.lap("action")
+
+        # Track boundaries and distances to them at the predicted position
+        left_boundary, right_boundary = self.track.boundaries(predicted_position[0])
+        distance_to_left_boundary, distance_to_right_boundary = self._distances(
+            predicted_position[0], predicted_position[1], left_boundary, right_boundary)
+        if profiler is not None:
+            profiler.lap("boundaries")
+
+        if self.centre_reward:
+            # Reward for staying in the middle of the track (closer to the center is better)
+            track_middle = (left_boundary + right_boundary) / 2
+            distance_to_middle = abs(predicted_position[1] - track_middle)
+            reward = max(0, 1 - distance_to_middle / (self.track.get_width() / 2))
+        else:
+            reward = 1  # Default reward for staying on track
+
+        if self.progress_reward:
+            if predicted_position[0] > prev_x_position:
+                reward += 2  # Reward for moving forward
+            if predicted_position[0] < prev_x_position:
+                reward -= 3  # Penalty for moving backward
+
+        below = distance_to_left_boundary < 0
+        above = distance_to_right_boundary < 0
+        off_track = below or above
+        x_limits = self.track.x_limits
+        if x_limits is not None:
+            off_track = off_track or predicted_position[0] < x_limits[0] or predicted_position[0] > x_limits[1]
+
+        if off_track:
+            if self.collision == "clamp":
+                # Place the car at the nearest boundary and stop it immediately
+                if below:
+                    self.car_position[1] = left_boundary
+                elif above:
+                    self.car_position[1] = right_boundary
+                self.speed = 0
+            else:
+                # Lose speed depending on the impact angle and end the episode
+                impact_angle = np.arctan2(
+                    predicted_position[1] - (right_boundary if above else left_boundary),
+                    predicted_position[0] - (x_limits[1] if predicted_position[0] > x_limits[1] else x_limits[0])
+                )
+                self.speed *= max(0, np.cos(impact_angle))
+                if self.speed < 0.1:
+                    self.speed = 0  # Stop the car if speed drops very low
+                self.done = True
+            reward = -10  # Penalty for going off track, replaces every other reward
+
+        elif self.car_position[0] >= self.finish_line:
+            self.done = True  # End the episode only when the track is finished
+            if self.finish_reward is not None:
+                reward = self.finish_reward
+
+        else:
+            # Gradually restore speed when on track
+            self.speed = min(self.speed + self.speed_recovery, 1.0)
+            if self.move == "on_track":
+                self.car_position[0] += cos_angle * self.speed
+                self.car_position[1] += sin_angle * self.speed
+
+        if self.move == "always":
+            self.car_position[0] += cos_angle * self.speed
+            self.car_position[1] += sin_angle * self.speed
+
+        if profiler is not None:
+            profiler.lap("reward")
+        return reward, off_track, distance_to_left_boundary, distance_to_right_boundary
+
+    def render(self):
+        # Display the car's position, angle, speed, and track boundaries at the current x position
+        left_boundary, right_boundary = self.track.boundaries(self.car_position[0])
+        print(f"Car Position: {self.car_position}, Angle: {self.angle * 180 / np.pi:.2f} degrees, Speed: {self.speed:.2f}")
+        print(f"Track Boundaries at x={self.car_position[0]:.2f}: Left={left_boundary:.2f}, Right={right_boundary:.2f}")
+
+    def close(self):
+        pass
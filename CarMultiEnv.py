@@ -0,0 +1,165 @@
+"""
+Many cars racing on one shared track_Custom.Track.
+
+MultiCarRacingVecEnv exposes every car as one slot of an SB3 VecEnv, so one
+policy drives them all (self-play) and PPO trains on all their transitions:
+
+    env = MultiCarRacingVecEnv(num_cars=200, n_opponents=3)
+    model = PPO("MlpPolicy", env)
+
+Cars are discs. Besides the boundaries they collide with each other, and each
+car observes the positions of its nearest opponents. Both pairwise queries use
+a sorted sweep along x: cars are sorted by x once per query and only pairs
+inside an x window are examined, so the cost grows with the number of cars and
+the local traffic density instead of with every pair of cars.
+"""
+import numpy as np
+from gymnasium import spaces
+from CarVecEnv import SimpleCarRacingVecEnv
+from track_Custom import Track
+
+
+def close_pairs(x, y, radius):
+    """All pairs (i, j), i != j, closer than radius, each listed once.
+
+    Sorts by x and pairs every car only with those ahead of it within radius
+    along x, then keeps the pairs that are also within radius in 2D.
+    """
+    n = len(x)
+    order = np.argsort(x, kind="stable")
+    sorted_x = x[order]
+    # For each car, the cars after it in x order that are less than radius ahead
+    window_end = np.searchsorted(sorted_x, sorted_x + radius, side="left")
+    counts = window_end - np.arange(n) - 1
+    counts = np.maximum(counts, 0)
+    first = np.repeat(np.arange(n), counts)
+    # Position of each pair within its car's window: 0, 1, ... counts - 1
+    within = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+    i, j = order[first], order[first + 1 + within]
+    dx = x[j] - x[i]
+    dy = y[j] - y[i]
+    close = dx * dx + dy * dy < radius * radius
+    return i[close], j[close]
+
+
+class MultiCarRacingVecEnv(SimpleCarRacingVecEnv):
+    """
+    num_cars cars on one shared track, one VecEnv slot per car.
+
+    Per car the dynamics, rewards and auto-reset are those of
+    SimpleCarRacingVecEnv. A car whose predicted position comes within two
+    radii of another car's while they approach each other crashes: it stays
+    where it is, stops and gets the off-track penalty.
+
+    :param num_cars: Number of cars on the track
+    :param track: The shared track, a random Track() by default
+    :param car_radius: Radius of the disc each car occupies
+    :param n_opponents: Nearest opponents appended to each observation as
+        (dx, dy) relative to the car. 0 keeps the observation of CarEnvCustom,
+        so checkpoints trained on it can drive the cars.
+    :param sensor_range: Opponents farther away are not observed. Empty slots
+        read (sensor_range, 0), as if the opponent were far ahead.
+    :param grid_spacing: Distance between the rows of the starting grid,
+        which is laid out backwards from the start line
+    :param action_repeat: Physics substeps per step, see SimpleCarRacingVecEnv
+    :param max_steps: Episode limits, see SimpleCarRacingVecEnv
+    :param stall_steps: Likewise
+    :param progress_window: Likewise
+    """
+
+    def __init__(self, num_cars, track=None, car_radius=0.5, n_opponents=3, sensor_range=10.0, grid_spacing=None,
+                 action_repeat=1, max_steps=None, stall_steps=None, progress_window=None):
+        self.track = track if track is not None else Track()
+        self.car_radius = car_radius
+        self.n_opponents = n_opponents
+        self.sensor_range = sensor_range
+        self.grid_spacing = grid_spacing if grid_spacing is not None else 4 * car_radius
+        super().__init__(num_cars, tracks=[self.track] * num_cars, action_repeat=action_repeat, max_steps=max_steps,
+                         stall_steps=stall_steps, progress_window=progress_window)
+
+        self.start_positions = self._starting_grid()
+        self.car_collisions = np.zeros(num_cars, dtype=np.int64)  # Crashes into other cars, per car
+        self._crashed = []  # Collision masks of the physics substeps of a step
+
+        # The grid may reach behind x = 0, where the track's boundaries wrap or extend its first segment,
+        # and every opponent adds a relative (dx, dy)
+        low, high = self.observation_space.low.astype(np.float64), self.observation_space.high.astype(np.float64)
+        grid_left, grid_right = self.track.get_boundaries(self.start_positions[:, 0])
+        low[0] = min(low[0], self.start_positions[:, 0].min())
+        low[1] = min(low[1], grid_left.min())
+        high[1] = max(high[1], grid_right.max())
+        self.observation_space = spaces.Box(
+            low=np.concatenate([low, np.tile([-sensor_range, -sensor_range], n_opponents)]),
+            high=np.concatenate([high, np.tile([sensor_range, sensor_range], n_opponents)]),
+            dtype=np.float32,
+        )
+        self.buf_obs = np.zeros((num_cars, 5 + 2 * n_opponents), dtype=np.float32)
+
+    def _starting_grid(self):
+        # Lanes across the track with a car's width of space between cars, rows behind the start line
+        lanes = max(1, int(self.track.get_width() // (4 * self.car_radius)))
+        index = np.arange(self.num_envs)
+        x = -(index // lanes) * self.grid_spacing
+        left, right = self.track.get_boundaries(x)
+        lane_width = (right - left) / lanes
+        y = left + (index % lanes + 0.5) * lane_width
+        return np.stack([x, y], axis=1)
+
+    def _car_collisions(self, predicted_x, predicted_y):
+        i, j = close_pairs(predicted_x, predicted_y, 2 * self.car_radius)
+        # Only pairs getting closer collide, so cars that overlap after a respawn can drive apart
+        now = self.positions
+        current = (now[j, 0] - now[i, 0]) ** 2 + (now[j, 1] - now[i, 1]) ** 2
+        predicted = (predicted_x[j] - predicted_x[i]) ** 2 + (predicted_y[j] - predicted_y[i]) ** 2
+        approaching = predicted < current
+        crashed = np.zeros(self.num_envs, dtype=bool)
+        crashed[i[approaching]] = True
+        crashed[j[approaching]] = True
+        self._crashed.append(crashed)  # The base class masks out off-track cars in place
+        return crashed
+
+    def nearest_opponents(self, rows=None):
+        """(len(rows), n_opponents, 2) offsets to the nearest opponents of each car, nearest first."""
+        rows = self._rows if rows is None else rows
+        offsets = np.zeros((self.num_envs, self.n_opponents, 2))
+        offsets[:, :, 0] = self.sensor_range
+        if self.n_opponents == 0:
+            return offsets[rows]
+
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        i, j = close_pairs(x, y, self.sensor_range)
+        # Every pair is an opponent of both its cars
+        cars = np.concatenate([i, j])
+        opponents = np.concatenate([j, i])
+        dx = x[opponents] - x[cars]
+        dy = y[opponents] - y[cars]
+        distance = dx * dx + dy * dy
+
+        # Group by car, nearest first, and keep the first n_opponents of each group
+        order = np.lexsort((distance, cars))
+        cars, dx, dy = cars[order], dx[order], dy[order]
+        group_start = np.searchsorted(cars, cars, side="left")
+        rank = np.arange(len(cars)) - group_start
+        keep = rank < self.n_opponents
+        offsets[cars[keep], rank[keep], 0] = dx[keep]
+        offsets[cars[keep], rank[keep], 1] = dy[keep]
+        return offsets[rows]
+
+    def _extend_observations(self, obs, rows):
+        if self.n_opponents == 0:
+            return obs
+        return np.concatenate([obs, self.nearest_opponents(rows).reshape(len(rows), -1)], axis=1)
+
+    def step_wait(self):
+        self._crashed = []
+        obs, rewards, dones, infos = super().step_wait()
+        crashed = np.logical_or.reduce(self._crashed)
+        self.car_collisions += crashed
+        for env_idx in np.flatnonzero(crashed):
+            infos[env_idx]["car_collision"] = True
+        return obs, rewards, dones, infos
+
+    def _state_attr(self, attr_name):
+        if attr_name == "car_collisions":
+            return self.car_collisions
+        return super()._state_attr(attr_name)
@@ -0,0 +1,451 @@
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from track_Custom import Track  # Same tracks as CarEnvCustom
+from CarEnvCore import TRUNCATION_REASONS
+from track_pool import TrackPool
+from track_sdf import SDFTrackBatch
+from raycast import boundary_segments, cast_rays, stack_segments, track_polylines
+
+
+class SimpleCarRacingVecEnv(VecEnv):
+    """
+    N curved-track cars stepped together with numpy.
+
+    Same dynamics, rewards and auto-reset behaviour as wrapping N
+    CarEnvCustom.SimpleCarRacingEnv in a DummyVecEnv, but the state of every
+    car lives in flat arrays and one step_wait updates them all at once.
+    ray_angles and ray_range select the range-sensor observations of the
+    scalar env, cast for all cars at once, action_repeat its physics
+    substeps per step, and max_steps, stall_steps, stall_speed,
+    progress_window and min_progress its episode limits.
+
+    There are no per-env instances, so env_method serves only the calls the
+    flat state can answer: reset (with seed and options, returning
+    (observation, info) per env), seed (kept for the next reset, like
+    VecEnv.seed) and get_wrapper_attr. Any other method raises an
+    AttributeError naming it. get_attr and set_attr map car_position, angle,
+    speed, done and track onto the state arrays.
+    """
+
+    # profiling.StepStats timing the phases of step_wait, set by profiling.VecStepProfiler
+    profiler = None
+
+    def __init__(self, num_envs, tracks=None, track_pool=None, ray_angles=None, ray_range=20.0, action_repeat=1,
+                 max_steps=None, stall_steps=None, stall_speed=0.5, progress_window=None, min_progress=1.0):
+        if action_repeat < 1:
+            raise ValueError(f"action_repeat must be at least 1, got {action_repeat}")
+        self.action_repeat = action_repeat
+        self.max_steps = max_steps
+        self.stall_steps = stall_steps
+        self.stall_speed = stall_speed
+        self.progress_window = progress_window
+        self.min_progress = min_progress
+        self._limits = max_steps is not None or stall_steps is not None or progress_window is not None
+        self.truncations = dict.fromkeys(TRUNCATION_REASONS, 0)
+        self.steps_saved = 0
+        # With a track pool every reset draws a new track for that env, like the scalar env
+        if track_pool is not None:
+            if tracks is not None:
+                raise ValueError("Pass either tracks or track_pool, not both")
+            if not isinstance(track_pool, TrackPool):
+                track_pool = TrackPool(track_pool)
+            self._pool_rng = np.random.default_rng()
+            self.track_indices = self._pool_rng.integers(len(track_pool), size=num_envs)
+            tracks = [track_pool.track(i) for i in self.track_indices]
+        self.track_pool = track_pool
+
+        # Otherwise every env keeps its own random track for its whole life
+        if tracks is None:
+            tracks = [Track() for _ in range(num_envs)]
+        if len(tracks) != num_envs:
+            raise ValueError(f"Expected {num_envs} tracks, got {len(tracks)}")
+        self.tracks = list(tracks)
+        self.render_mode = None
+
+        # Action and observation spaces of CarEnvCustom.SimpleCarRacingEnv, widened to fit every track
+        bounds = [track_pool] if track_pool is not None else self.tracks
+        y_ranges = np.array([b.get_y_range() for b in bounds])
+        max_half_width = max(b.get_width() for b in bounds) / 2
+        action_space = spaces.Discrete(2)
+        self.ray_angles = None if ray_angles is None else np.asarray(ray_angles, dtype=np.float64)
+        self.ray_range = ray_range
+        observation_space = spaces.Box(low=np.array([0, y_ranges[:, 0].min(), -np.pi, 0, 0]),
+                                       high=np.array([max(b.track_length for b in bounds), y_ranges[:, 1].max(),
+                                                      np.pi, max_half_width, max_half_width]),
+                                       dtype=np.float32)
+        if self.ray_angles is not None:
+            observation_space = spaces.Box(low=0, high=ray_range, shape=self.ray_angles.shape, dtype=np.float32)
+        super().__init__(num_envs, observation_space, action_space)
+
+        self.half_widths = np.array([t.get_width() for t in self.tracks], dtype=np.float64) / 2
+        self.finish_lines = np.array([t.track_length for t in self.tracks], dtype=np.float64)
+        self._build_segment_tables()
+        # Tracks with distance grids (track_sdf.SDFTrack) measure the boundary distances on them
+        self._distance_fields = (SDFTrackBatch(self.tracks) if all(hasattr(t, "distances") for t in self.tracks)
+                                 else None)
+
+        # Car state, one entry per env
+        self.start_positions = np.zeros((num_envs, 2))  # Every car starts at the track centre by default
+        self.positions = np.zeros((num_envs, 2))
+        self.angles = np.zeros(num_envs)
+        self.speeds = np.ones(num_envs)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+        self._slow_steps = np.zeros(num_envs, dtype=np.int64)
+        self._best_x = np.zeros(num_envs)
+        self._best_x_step = np.zeros(num_envs, dtype=np.int64)
+
+        if self.ray_angles is not None:
+            self._ray_segments = stack_segments([self._track_segments(t) for t in self.tracks])
+
+        self.buf_obs = np.zeros((num_envs,) + observation_space.shape, dtype=np.float32)
+        self.buf_rews = np.zeros(num_envs, dtype=np.float32)
+
+    def _build_segment_tables(self):
+        # Per-env segment tables padded to the longest segment list
+        n_segments = max(t.n_segments for t in self.tracks)
+        self.segment_starts = np.full((self.num_envs, n_segments), np.inf)
+        self.curvatures = np.zeros((self.num_envs, n_segments))
+        self.segment_offsets = np.zeros((self.num_envs, n_segments))
+        self.last_segments = np.array([t.n_segments - 1 for t in self.tracks])
+        self.wrap_negative_x = np.array([getattr(t, "wrap_negative_x", False) for t in self.tracks])
+        for i, t in enumerate(self.tracks):
+            self.segment_starts[i, :t.n_segments] = t.segment_starts
+            self.curvatures[i, :t.n_segments] = t.curvatures
+            self.segment_offsets[i, :t.n_segments] = t.segment_offsets
+        self._rows = np.arange(self.num_envs)
+
+        # Tracks generated with the same segment lengths share one binary search
+        if self.track_pool is not None:
+            self._shared_starts = self.track_pool.shared_starts
+            return
+        first = self.tracks[0].segment_starts
+        same_starts = all(np.array_equal(t.segment_starts, first) for t in self.tracks)
+        self._shared_starts = first if same_starts else None
+
+    def _draw_pool_tracks(self, mask):
+        # Gather the rows of freshly drawn pool tracks into the per-env tables
+        rows = np.flatnonzero(mask)
+        indices = self._pool_rng.integers(len(self.track_pool), size=len(rows))
+        pool = self.track_pool
+        self.track_indices[rows] = indices
+        self.segment_starts[rows] = pool.segment_starts[indices]
+        self.curvatures[rows] = pool.curvatures[indices]
+        self.segment_offsets[rows] = pool.segment_offsets[indices]
+        self.half_widths[rows] = pool.widths[indices] / 2
+        self.finish_lines[rows] = pool.track_lengths[indices]
+        self.wrap_negative_x[rows] = ~pool.custom_segments[indices]
+        for row, index in zip(rows, indices):
+            self.tracks[row] = pool.track(index)
+            if self.ray_angles is not None:
+                segments = self._track_segments(self.tracks[row])
+                self._ray_segments[row] = 0
+                self._ray_segments[row, :len(segments)] = segments
+
+    def _track_segments(self, track):
+        return boundary_segments(*track_polylines(track), self.ray_range)
+
+    def _cast_rays(self, rows):
+        positions = self.positions[rows]
+        return cast_rays(positions[:, 0], positions[:, 1], self.angles[rows], self.ray_angles,
+                         self._ray_segments[rows], self.ray_range)
+
+    def get_boundaries(self, x_positions):
+        # Track_Custom.Track.get_boundaries, but each row reads its own track
+        if self._shared_starts is not None:
+            index = np.searchsorted(self._shared_starts, x_positions, side="right") - 1
+        else:
+            index = np.count_nonzero(self.segment_starts <= x_positions[:, None], axis=1) - 1
+        index = np.clip(index, 0, self.last_segments)
+        slope_term = self.curvatures[self._rows, index] * (x_positions - self.segment_starts[self._rows, index])
+        offset = self.segment_offsets[self._rows, index]
+        # Cars behind the start line of tracks with wrap_negative_x, rarely any
+        wrapped = np.flatnonzero(self.wrap_negative_x & (x_positions <= -1)) if x_positions.min() <= -1 else ()
+        if len(wrapped):
+            x_wrapped = x_positions[wrapped]
+            table_x = self.finish_lines[wrapped] + np.ceil(x_wrapped)
+            wrapped_index = np.count_nonzero(self.segment_starts[wrapped] <= table_x[:, None], axis=1) - 1
+            wrapped_index = np.clip(wrapped_index, 0, self.last_segments[wrapped])
+            slope_term[wrapped] = self.curvatures[wrapped, wrapped_index] * x_wrapped
+            offset[wrapped] = 0.0
+        left = -self.half_widths + slope_term + offset
+        right = self.half_widths + slope_term + offset
+        return left, right
+
+    def _reset_envs(self, mask):
+        if self.track_pool is not None:
+            self._draw_pool_tracks(mask)
+
+        # Back to the start position, facing right at full speed
+        self.positions[mask] = self.start_positions[mask]
+        self.angles[mask] = 0.0
+        self.speeds[mask] = 1.0
+        self.dones[mask] = False
+        self.episode_steps[mask] = 0
+        self._slow_steps[mask] = 0
+        self._best_x[mask] = self.positions[mask, 0]
+        self._best_x_step[mask] = 0
+
+        if self.ray_angles is not None:
+            rows = np.flatnonzero(mask)
+            return self._extend_observations(self._cast_rays(rows), rows)
+        obs = np.zeros((int(np.count_nonzero(mask)), 5))
+        obs[:, :2] = self.positions[mask]
+        left, right = self.get_boundaries(self.positions[:, 0])
+        left, right = self._distances(self.positions[:, 0], self.positions[:, 1], left, right)
+        obs[:, 3] = left[mask]
+        obs[:, 4] = right[mask]
+        return self._extend_observations(obs, np.flatnonzero(mask))
+
+    def _distances(self, x_positions, y_positions, left_boundary, right_boundary):
+        # Vertical distances at x, unless the tracks carry distance grids
+        if self._distance_fields is not None:
+            return self._distance_fields.distances(x_positions, y_positions)
+        return y_positions - left_boundary, right_boundary - y_positions
+
+    def _extend_observations(self, obs, rows):
+        # Observations of the given env rows; subclasses append their own columns here
+        return obs
+
+    def _car_collisions(self, predicted_x, predicted_y):
+        # Mask of cars that hit another car, None for independent envs
+        return None
+
+    def reset(self):
+        # Seeds only feed the gymnasium RNG of the scalar env, which the dynamics never use,
+        # apart from drawing pool tracks
+        if self.track_pool is not None and self._seeds[0] is not None:
+            self._pool_rng = np.random.default_rng(self._seeds[0])
+        self.buf_obs[:] = self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        self.reset_infos = [self._reset_info(i) for i in range(self.num_envs)]
+        self._reset_seeds()
+        self._reset_options()
+        return self.buf_obs.copy()
+
+    def _reset_info(self, env_idx):
+        return {"track_index": int(self.track_indices[env_idx])} if self.track_pool is not None else {}
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        # The actions hold for every substep, cars whose episode ended sit out the rest
+        reward, off_track, finished, distance_to_left_boundary, distance_to_right_boundary = self._substep(
+            None, profiler)
+        substeps = np.ones(self.num_envs, dtype=np.int64)
+        for _ in range(self.action_repeat - 1):
+            active = ~self.dones
+            if not active.any():
+                break
+            substep_reward, substep_off_track, substep_finished, distance_to_left_boundary, \
+                distance_to_right_boundary = self._substep(active, profiler)
+            reward += substep_reward
+            off_track |= substep_off_track
+            finished |= substep_finished
+            substeps += active
+
+        positions = self.positions
+        if self.ray_angles is not None:
+            obs = self._cast_rays(self._rows)
+        else:
+            # Cars that sat out substeps did not move, so the last distances are theirs too
+            obs = np.stack([positions[:, 0], positions[:, 1], self.angles,
+                            distance_to_left_boundary, distance_to_right_boundary], axis=1)
+        obs = self._extend_observations(obs, self._rows)
+        self.buf_obs[:] = obs
+        self.buf_rews[:] = reward
+
+        self.episode_steps += 1
+        dones = self.dones.copy()
+        infos = [{"TimeLimit.truncated": False} for _ in range(self.num_envs)]
+        if self._limits:
+            reasons = self._truncation_reasons()
+            for env_idx in np.flatnonzero(reasons >= 0):
+                reason = TRUNCATION_REASONS[reasons[env_idx]]
+                infos[env_idx]["TimeLimit.truncated"] = True
+                infos[env_idx]["truncation_reason"] = reason
+                self.truncations[reason] += 1
+                if self.max_steps is not None:
+                    infos[env_idx]["steps_saved"] = int(self.max_steps - self.episode_steps[env_idx])
+                    self.steps_saved += infos[env_idx]["steps_saved"]
+            dones |= reasons >= 0
+        for env_idx in np.flatnonzero(off_track):
+            infos[env_idx]["off_track"] = True
+        for env_idx in np.flatnonzero(finished):
+            infos[env_idx]["finished"] = True
+        if self.action_repeat > 1:
+            for info, n in zip(infos, substeps.tolist()):
+                info["substeps"] = n
+        if dones.any():
+            # Save the final observation where SB3 expects it, then auto-reset
+            for env_idx in np.flatnonzero(dones):
+                infos[env_idx]["terminal_observation"] = obs[env_idx]
+            self.buf_obs[dones] = self._reset_envs(dones)
+            for env_idx in np.flatnonzero(dones):
+                self.reset_infos[env_idx] = self._reset_info(env_idx)
+
+        if profiler is not None:
+            profiler.lap("observation")  # Including the auto-resets
+            profiler.count("off_track", int(np.count_nonzero(off_track)))
+            profiler.count("finished", int(np.count_nonzero(finished)))
+            profiler.end_step(self.num_envs)
+        return self.buf_obs.copy(), self.buf_rews.copy(), dones, infos
+
+    def _truncation_reasons(self):
+        # Index into TRUNCATION_REASONS per env for the running episodes to cut short now, -1 to go on
+        self._slow_steps = np.where(self.speeds < self.stall_speed, self._slow_steps + 1, 0)
+        x = self.positions[:, 0]
+        progressed = x >= self._best_x + self.min_progress
+        self._best_x[progressed] = x[progressed]
+        self._best_x_step[progressed] = self.episode_steps[progressed]
+
+        reasons = np.full(self.num_envs, -1)
+        checks = (
+            self._slow_steps >= self.stall_steps if self.stall_steps is not None else None,
+            self.episode_steps - self._best_x_step >= self.progress_window if self.progress_window is not None
+            else None,
+            self.episode_steps >= self.max_steps if self.max_steps is not None else None,
+        )
+        # The first reason that applies wins, as in the scalar env
+        for index in reversed(range(len(checks))):
+            if checks[index] is not None:
+                reasons[checks[index]] = index
+        reasons[self.dones] = -1  # Finished episodes end normally
+        return reasons
+
+    def _substep(self, active, profiler=None):
+        # One physics update of the cars in the active mask, all of them if None. Returns
+        # the rewards, the off-track and finished masks and the boundary distances.
+        positions = self.positions
+        prev_x_position = positions[:, 0].copy()
+
+        # Update angle based on action: 0 = turn left, 1 = turn right
+        turn_angle = np.pi / 36  # 5 degrees in radians
+        turn_left = self.actions == 0
+        turn_right = self.actions == 1
+        if active is not None:
+            turn_left &= active
+            turn_right &= active
+        self.angles += np.where(turn_left, turn_angle, 0.0)
+        self.angles -= np.where(turn_right, turn_angle, 0.0)
+        self.angles %= 2 * np.pi
+
+        # Predict the next positions based on the current angles and speeds
+        cos_angle = np.cos(self.angles)
+        sin_angle = np.sin(self.angles)
+        predicted_x = positions[:, 0] + cos_angle * self.speeds
+        predicted_y = positions[:, 1] + sin_angle * self.speeds
+        if profiler is not None:
+            profiler.lap("action")
+
+        left_boundary, right_boundary = self.get_boundaries(predicted_x)
+        distance_to_left_boundary, distance_to_right_boundary = self._distances(
+            predicted_x, predicted_y, left_boundary, right_boundary)
+        if profiler is not None:
+            profiler.lap("boundaries")
+
+        # Reward for staying in the middle of the track plus forward/backward shaping
+        track_middle = (left_boundary + right_boundary) / 2
+        distance_to_middle = np.abs(predicted_y - track_middle)
+        reward = np.maximum(0, 1 - distance_to_middle / self.half_widths)
+        reward += np.where(predicted_x > prev_x_position, 2, 0)
+        reward -= np.where(predicted_x < prev_x_position, 3, 0)
+
+        # Off track: clamp to the nearest boundary, stop the car and penalise
+        below = distance_to_left_boundary < 0
+        above = distance_to_right_boundary < 0
+        if active is not None:
+            below &= active
+            above &= active
+        off_track = below | above
+        positions[below, 1] = left_boundary[below]
+        positions[above, 1] = right_boundary[above]
+        self.speeds[off_track] = 0
+        reward[off_track] = -10
+
+        # Cars hitting another car stop where they are, with the same penalty
+        stopped = off_track
+        crashed = self._car_collisions(predicted_x, predicted_y)
+        if crashed is not None:
+            crashed &= ~off_track
+            if active is not None:
+                crashed &= active
+            self.speeds[crashed] = 0
+            reward[crashed] = -10
+            stopped = off_track | crashed
+
+        # The finish check uses the position before the move, like the scalar env
+        finished = ~stopped & (positions[:, 0] >= self.finish_lines)
+        if active is not None:
+            finished &= active
+            stopped = stopped | ~active
+            reward[~active] = 0
+        self.dones |= finished
+
+        # Everyone else recovers speed and moves
+        moving = ~stopped & ~finished
+        self.speeds[moving] = np.minimum(self.speeds[moving] + 0.1, 1.0)
+        positions[moving, 0] += cos_angle[moving] * self.speeds[moving]
+        positions[moving, 1] += sin_angle[moving] * self.speeds[moving]
+        if profiler is not None:
+            profiler.lap("reward")
+        return reward, off_track, finished, distance_to_left_boundary, distance_to_right_boundary
+
+    def close(self):
+        pass
+
+    def _state_attr(self, attr_name):
+        # Per-env views of the flat state under the scalar env's attribute names
+        return {
+            "car_position": self.positions,
+            "angle": self.angles,
+            "speed": self.speeds,
+            "done": self.dones,
+            "track": self.tracks,
+        }.get(attr_name)
+
+    def get_attr(self, attr_name, indices=None):
+        values = self._state_attr(attr_name)
+        if values is None:
+            value = getattr(self, attr_name)
+            return [value for _ in self._get_indices(indices)]
+        return [values[i] for i in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        values = self._state_attr(attr_name)
+        if values is None:
+            setattr(self, attr_name, value)
+            return
+        for i in self._get_indices(indices):
+            values[i] = value
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = list(self._get_indices(indices))
+        if method_name == "reset":
+            return [self._reset_env(i, *method_args, **method_kwargs) for i in indices]
+        if method_name == "seed":
+            seed = method_args[0] if method_args else method_kwargs.get("seed")
+            for i in indices:
+                self._seeds[i] = seed
+            return [None for _ in indices]
+        if method_name == "get_wrapper_attr":
+            return self.get_attr(*method_args, indices=indices, **method_kwargs)
+        raise AttributeError(f"{type(self).__name__} keeps no per-env instances and cannot call {method_name!r} "
+                             f"on them, only reset, seed and get_wrapper_attr")
+
+    def _reset_env(self, env_idx, seed=None, options=None):
+        # One env's reset(), as env_method("reset") calls it on the envs of a DummyVecEnv
+        if self.track_pool is not None and seed is not None:
+            self._pool_rng = np.random.default_rng(seed)
+        mask = np.zeros(self.num_envs, dtype=bool)
+        mask[env_idx] = True
+        return self._reset_envs(mask)[0].astype(np.float32), self._reset_info(env_idx)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
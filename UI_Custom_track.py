@@ -1,15 +1,9 @@
-import pygame
+import argparse
+
 import numpy as np
-import time
 from CarEnvCustom import SimpleCarRacingEnv  # Custom environment
-from stable_baselines3 import PPO
-from track_Custom import Track  # Import Track for consistent boundary calculations
-
-# Initialize Pygame
-pygame.init()
-screen_width, screen_height = 800, 400
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Curved Track Car Racing Simulation")
+from track_Custom import Track
+from numpy_policy import load_policy  # PPO checkpoint (.zip) or numpy export (.npz)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -18,167 +12,272 @@ RED = (255, 0, 0)
 BLUE = (173, 216, 230)
 COLLISION_COLOR = (255, 69, 0)  # Orange for collision effect
 
-# Track parameters
-track_length = 100  # Logical length of the track
-track = Track(track_length=track_length)
-scale = screen_width / track_length  # Scaling factor for display
-
-# Environment and model
-env = SimpleCarRacingEnv()
-obs, _ = env.reset()
-model_path = "car_race_model9.zip"  # Replace with your model file path
-model = PPO.load(model_path)
-
-# Car parameters
-car_x = 0  # Start at the beginning of the track
-car_y = screen_height // 2
-car_angle = 0  # Angle of the car (in radians)
-car_speed = 1.0 * scale  # Initial speed of the car
-normal_speed = 1.0 * scale  # Normal speed when not colliding
-min_speed = 0  # Minimum speed on collision
-
-# Collision control
-collision = False
-collision_start_time = 0
-collision_duration = 500  # Duration to display collision effect in milliseconds
-
-# Timer to track the time to finish
-start_time = pygame.time.get_ticks()
-
-# Helper function to invert y-coordinate
-def invert_y(y):
-    """Inverts the y-coordinate for Pygame's coordinate system."""
-    return screen_height - y
-
-# Game loop
-running = True
-clock = pygame.time.Clock()
-total_reward = 0
-font = pygame.font.Font(None, 30)
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    # Check if the car has reached the end of the track before checking for collisions
-    done = False
-    if car_x >= track_length * scale:  # Car reaches the end of the track
-        done = True  # Mark the episode as done
-
-    # Only check for collision if the car hasn't finished
-    if not done:
-        # Predict action
-        action, _ = model.predict(obs, deterministic=True)
-        obs, reward, _, truncated, _ = env.step(action)
-
-        # Update car parameters based on environment state
-        car_angle = env.angle
-        total_reward += reward
-
-        # Update car position based on angle and speed
-        car_x += int(np.cos(car_angle) * car_speed)
-        car_y += int(np.sin(car_angle) * car_speed)
-
-        # Check for collision and adjust as necessary
-        next_car_x = car_x + int(np.cos(car_angle) * car_speed)
-        next_car_y = car_y + int(np.sin(car_angle) * car_speed)
-
-        # Calculate boundaries with offset
-        track_offset = screen_height // 2
-        next_left_boundary = track.get_left_boundary(next_car_x / scale) * scale + track_offset
-        next_right_boundary = track.get_right_boundary(next_car_x / scale) * scale + track_offset
-
-        # Handle collisions
-        if next_car_y < next_left_boundary or next_car_y > next_right_boundary:
-            car_speed = min_speed  # Stop car on collision
-            collision = True
-            collision_start_time = pygame.time.get_ticks()
-
-            # Clamp car_y to the closest boundary
-            if next_car_y < next_left_boundary:
-                car_y = next_left_boundary
-            elif next_car_y > next_right_boundary:
-                car_y = next_right_boundary
-        else:
-            collision = False
-            car_speed = min(car_speed + 0.1 * scale, normal_speed)
-
-    # Clear screen
-    screen.fill(WHITE)
-
-    # Draw track boundaries
-    # Update the loop where you draw track boundaries to handle curvature transitions smoothly
-    for x in range(0, track_length):
-        left_x = x * scale
-        
-        # Get left and right boundaries with smooth curvature transitions
-        left_y = invert_y(track.get_left_boundary(x) * scale + track_offset)
-        right_y = invert_y(track.get_right_boundary(x) * scale + track_offset)
-
-        # Draw the track boundary between the left and right boundaries
-        pygame.draw.line(screen, BLUE, (left_x, left_y), (left_x, right_y), 8)
-
-
-    # Draw the car
-    car_color = COLLISION_COLOR if collision and pygame.time.get_ticks() - collision_start_time < collision_duration else RED
-    pygame.draw.circle(screen, car_color, (car_x, invert_y(car_y)), 5)
-
-    # Draw car’s direction line
-    direction_length = 20
-    direction_x = car_x + int(np.cos(car_angle) * direction_length)
-    direction_y = car_y + int(np.sin(car_angle) * direction_length)
-    pygame.draw.line(screen, BLACK, (car_x, invert_y(car_y)), (direction_x, invert_y(direction_y)), 2)
-
-    # Display text information
-    speed_text = font.render(f"Speed: {car_speed:.2f}", True, BLACK)
-    angle_text = font.render(f"Angle: {np.degrees(car_angle):.2f}", True, BLACK)
-    reward_text = font.render(f"Reward: {reward}", True, BLACK)
-    total_reward_text = font.render(f"Total Reward: {total_reward}", True, BLACK)
-    screen.blit(speed_text, (10, 10))
-    screen.blit(angle_text, (10, 40))
-    screen.blit(reward_text, (10, 70))
-    screen.blit(total_reward_text, (10, 100))
-
-    # Display collision message if there was a recent collision
-    if not done and collision:
-        collision_text = font.render("Collision!", True, COLLISION_COLOR)
-        screen.blit(collision_text, (screen_width // 2 - 50, screen_height // 2 - 20))
-
-    # End of episode prompt
-    if done or truncated:
-        elapsed_time = (pygame.time.get_ticks() - start_time) / 1000  # Calculate time in seconds
-        end_text = font.render(f"Episode finished! Time: {elapsed_time:.2f}s. Press R to restart or Q to quit.", True, BLACK)
-        screen.blit(end_text, (screen_width // 2 - 200, screen_height // 2))
-        pygame.display.flip()
-
-        waiting_for_input = True
-        while waiting_for_input:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                    waiting_for_input = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_r:
-                        # Reset environment and car variables
-                        obs, _ = env.reset()
-                        total_reward = 0
-                        car_x = 0
-                        car_y = screen_height // 2
-                        car_angle = 0
-                        car_speed = normal_speed
-                        collision = False
-                        done = False
-                        start_time = pygame.time.get_ticks()  # Reset start time for the new episode
-                        waiting_for_input = False
-                    elif event.key == pygame.K_q:
+
+def track_view(track, screen_width, screen_height):
+    """Background Surface with the track drawn on it, and the track to screen mapping."""
+    from ui_render import track_background
+    scale = screen_width / track.track_length  # Scaling factor for display
+    track_offset = screen_height // 2
+
+    def to_screen(x_positions, y_positions):
+        return x_positions * scale, screen_height - (y_positions * scale + track_offset)
+
+    x_positions = np.arange(int(track.track_length))
+    left_boundaries, right_boundaries = track.get_boundaries(x_positions)
+    background = track_background((screen_width, screen_height), x_positions, left_boundaries, right_boundaries,
+                                  to_screen, WHITE, BLUE)
+    return background, to_screen
+
+
+def main(model_path="car_race_model9.zip", show_hud=False, fps=60, sim_rate=10, max_speed=False):
+    """
+    Watch a checkpoint drive the curved track.
+
+    Keys: H toggles the frame-time HUD, F and S speed the simulation up and
+    down, M toggles max speed.
+
+    :param model_path: PPO checkpoint (.zip) or numpy export (.npz)
+    :param show_hud: Show frame times (render, inference, sim)
+    :param fps: Frame rate cap, 0 for as fast as possible
+    :param sim_rate: Simulation steps per second at 1x speed
+    :param max_speed: Start in max-speed mode, as many steps as fit in a frame
+    """
+    import pygame  # Rendering only, keeps imports of this module light
+    from ui_render import DirtyRectRenderer, FixedTimestep, FrameTimer, PolicyWorker, lerp, lerp_angle
+
+    # Initialize Pygame
+    pygame.init()
+    screen_width, screen_height = 800, 400
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Curved Track Car Racing Simulation")
+
+    # Environment and model, the policy runs on a background thread
+    env = SimpleCarRacingEnv()
+    obs, _ = env.reset()
+    worker = PolicyWorker(load_policy(model_path))
+    worker.submit(obs)
+
+    # Track parameters, from the track the env actually drives on
+    track = env.track
+    track_length = track.track_length  # Logical length of the track
+    scale = screen_width / track_length  # Scaling factor for display
+    track_offset = screen_height // 2
+
+    # Helper function to invert y-coordinate
+    def invert_y(y):
+        """Inverts the y-coordinate for Pygame's coordinate system."""
+        return screen_height - y
+
+    # The track never changes: draw its slices once and reuse them every frame
+    background, _ = track_view(track, screen_width, screen_height)
+    renderer = DirtyRectRenderer(screen, background)
+    timer = FrameTimer()
+    timestep = FixedTimestep(sim_rate)
+    timestep.max_speed = max_speed
+
+    # Car parameters
+    car_x = 0  # Start at the beginning of the track
+    car_y = screen_height // 2
+    car_angle = 0  # Angle of the car (in radians)
+    car_speed = 1.0 * scale  # Initial speed of the car
+    normal_speed = 1.0 * scale  # Normal speed when not colliding
+    min_speed = 0  # Minimum speed on collision
+    previous_x, previous_y, previous_angle = car_x, car_y, car_angle  # State before the last step
+
+    # Collision control
+    collision = False
+    collision_start_time = 0
+    collision_duration = 500  # Duration to display collision effect in milliseconds
+
+    # Timer to track the time to finish
+    start_time = pygame.time.get_ticks()
+
+    # Game loop
+    running = True
+    clock = pygame.time.Clock()
+    total_reward = 0
+    reward = 0
+    truncated = False
+    font = pygame.font.Font(None, 30)
+    hud_font = pygame.font.Font(None, 22)
+
+    while running:
+        timer.tick()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_h:
+                    show_hud = not show_hud
+                elif event.key == pygame.K_f:
+                    timestep.faster()
+                elif event.key == pygame.K_s:
+                    timestep.slower()
+                elif event.key == pygame.K_m:
+                    timestep.toggle_max_speed()
+
+        # Check if the car has reached the end of the track before checking for collisions
+        done = car_x >= track_length * scale
+
+        # Run the simulation steps that are due, at the fixed rate whatever the frame rate
+        with timer.phase("sim"):
+            for _ in timestep.due_steps():
+                if done or truncated:
+                    break
+                action = worker.poll(timestep.remaining())
+                if action is None:
+                    break  # The policy is still busy, draw this frame and step on the next
+                timer.record("inference", worker.inference_time)
+
+                obs, reward, _, truncated, _ = env.step(action)
+                worker.submit(obs)
+
+                # Update car parameters based on environment state
+                previous_x, previous_y, previous_angle = car_x, car_y, car_angle
+                car_angle = env.angle
+                total_reward += reward
+
+                # Update car position based on angle and speed
+                car_x += int(np.cos(car_angle) * car_speed)
+                car_y += int(np.sin(car_angle) * car_speed)
+
+                # Check for collision and adjust as necessary
+                next_car_x = car_x + int(np.cos(car_angle) * car_speed)
+                next_car_y = car_y + int(np.sin(car_angle) * car_speed)
+
+                # Calculate boundaries with offset
+                next_left_boundary, next_right_boundary = track.boundaries(next_car_x / scale)
+                next_left_boundary = next_left_boundary * scale + track_offset
+                next_right_boundary = next_right_boundary * scale + track_offset
+
+                # Handle collisions
+                if next_car_y < next_left_boundary or next_car_y > next_right_boundary:
+                    car_speed = min_speed  # Stop car on collision
+                    collision = True
+                    collision_start_time = pygame.time.get_ticks()
+
+                    # Clamp car_y to the closest boundary
+                    if next_car_y < next_left_boundary:
+                        car_y = next_left_boundary
+                    elif next_car_y > next_right_boundary:
+                        car_y = next_right_boundary
+                else:
+                    collision = False
+                    car_speed = min(car_speed + 0.1 * scale, normal_speed)
+
+                done = car_x >= track_length * scale
+
+        with timer.phase("render"):
+            # Restore the track under the last frame's car and text
+            renderer.begin()
+
+            # Draw the car between its last two simulated states
+            alpha = timestep.alpha()
+            draw_x = lerp(previous_x, car_x, alpha)
+            draw_y = lerp(previous_y, car_y, alpha)
+            draw_angle = lerp_angle(previous_angle, car_angle, alpha)
+            car_color = COLLISION_COLOR if collision and pygame.time.get_ticks() - collision_start_time < collision_duration else RED
+            renderer.draw(pygame.draw.circle, car_color, (draw_x, invert_y(draw_y)), 5)
+
+            # Draw car’s direction line
+            direction_length = 20
+            direction_x = draw_x + np.cos(draw_angle) * direction_length
+            direction_y = draw_y + np.sin(draw_angle) * direction_length
+            renderer.draw(pygame.draw.line, BLACK, (draw_x, invert_y(draw_y)), (direction_x, invert_y(direction_y)), 2)
+
+            # Display text information
+            renderer.blit(font.render(f"Speed: {car_speed:.2f}", True, BLACK), (10, 10))
+            renderer.blit(font.render(f"Angle: {np.degrees(car_angle):.2f}", True, BLACK), (10, 40))
+            renderer.blit(font.render(f"Reward: {reward}", True, BLACK), (10, 70))
+            renderer.blit(font.render(f"Total Reward: {total_reward}", True, BLACK), (10, 100))
+
+            # Display collision message if there was a recent collision
+            if not done and collision:
+                collision_text = font.render("Collision!", True, COLLISION_COLOR)
+                renderer.blit(collision_text, (screen_width // 2 - 50, screen_height // 2 - 20))
+
+            if show_hud:
+                hud_text = f"{timer.summary()}  sim {timestep.label()}"
+                renderer.blit(hud_font.render(hud_text, True, BLACK), (10, screen_height - 25))
+
+            # End of episode prompt
+            if done or truncated:
+                elapsed_time = (pygame.time.get_ticks() - start_time) / 1000  # Calculate time in seconds
+                end_text = font.render(f"Episode finished! Time: {elapsed_time:.2f}s. Press R to restart or Q to quit.", True, BLACK)
+                renderer.blit(end_text, (screen_width // 2 - 200, screen_height // 2))
+
+            # Update only the parts of the display that changed
+            renderer.end()
+
+        if done or truncated:
+            waiting_for_input = True
+            while waiting_for_input:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
                         running = False
                         waiting_for_input = False
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_r:
+                            # Reset environment and car variables
+                            obs, _ = env.reset()
+                            worker.submit(obs)
+                            total_reward = 0
+                            car_x = 0
+                            car_y = screen_height // 2
+                            car_angle = 0
+                            car_speed = normal_speed
+                            previous_x, previous_y, previous_angle = car_x, car_y, car_angle
+                            collision = False
+                            done = False
+                            truncated = False
+                            start_time = pygame.time.get_ticks()  # Reset start time for the new episode
+                            timestep.reset()  # The wait is not simulation time
+                            waiting_for_input = False
+                        elif event.key == pygame.K_q:
+                            running = False
+                            waiting_for_input = False
+
+        clock.tick(fps)
+
+    # Quit Pygame
+    worker.close()
+    pygame.quit()
+
+
+def replay(recording_path, show_hud=False, fps=60, sim_rate=10):
+    """
+    Play a trajectory.py recording on this track, no model or torch needed.
+
+    See ui_render.play_recording() for the keys.
+    """
+    import pygame
+    from trajectory import TrajectoryReader
+    from ui_render import play_recording
+
+    pygame.init()
+    screen_width, screen_height = 800, 400
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Curved Track Car Racing Replay")
+    play_recording(screen, TrajectoryReader(recording_path),
+                   lambda track: track_view(track, screen_width, screen_height),
+                   fps, sim_rate, show_hud, default_track=Track())
+    pygame.quit()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Watch a checkpoint drive the curved track")
+    parser.add_argument("--model-path", default="car_race_model9.zip")
+    parser.add_argument("--hud", action="store_true", help="Show render, inference and sim times per frame")
+    parser.add_argument("--fps", type=int, default=60, help="Frame rate cap, 0 for uncapped")
+    parser.add_argument("--sim-rate", type=float, default=10, help="Simulation steps per second at 1x speed")
+    parser.add_argument("--max-speed", action="store_true", help="Simulate as fast as the frame budget allows")
+    parser.add_argument("--replay", metavar="RECORDING", help="Play a trajectory.py recording instead of a model")
+    return parser.parse_args()
 
-    # Update display
-    pygame.display.flip()
-    clock.tick(30)
-    time.sleep(0.1)
 
-# Quit Pygame
-pygame.quit()
+if __name__ == "__main__":
+    args = parse_args()
+    if args.replay:
+        replay(args.replay, args.hud, args.fps, args.sim_rate)
+    else:
+        main(args.model_path, args.hud, args.fps, args.sim_rate, args.max_speed)
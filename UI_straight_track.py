@@ -1,14 +1,9 @@
-import pygame
+import argparse
+
 import numpy as np
-import time  # Import time for delay
+from CarEnvCore import RectangleTrack
 from CarRacingEnv import SimpleCarRacingEnv  # Import your custom environment
-from stable_baselines3 import PPO  # Assuming you used PPO for training
-
-# Initialize Pygame
-pygame.init()
-screen_width, screen_height = 800, 400
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Car Racing Simulation")
+from numpy_policy import load_policy  # PPO checkpoint (.zip) or numpy export (.npz)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -16,110 +11,215 @@ BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 BLUE = (173, 216, 230)  # Light blue for the track
 
-# Scaling factors for the car position and track bounds
-track_width, track_height = 100, 5  # Logical dimensions of the track in your environment
-scale = screen_width / track_width  # Scale for both x and y (800 / 100)
-
-# Initialize environment
-env = SimpleCarRacingEnv()
-obs, _ = env.reset()  # Reset the environment and unpack the observation
-
-# Load the trained model
-model_path = "car_race_model3.zip"  # Replace with your model file path
-model = PPO.load(model_path)
-
-# Center the track on the screen
-track_x_offset = (screen_width - track_width * scale) / 2
-track_y_offset = (screen_height - track_height * scale) / 2
-
-# Game loop
-running = True
-clock = pygame.time.Clock()
-total_reward = 0  # Accumulated reward for the current episode
-font = pygame.font.Font(None, 30)
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    # Use the model to predict the action based on the current observation
-    action, _ = model.predict(obs, deterministic=True)
-    obs, reward, done, truncated, _ = env.step(action)  # Updated to match gymnasium API
-    total_reward += reward  # Accumulate reward
-
-    # Clear the screen
-    screen.fill(WHITE)
-
-    # Draw the track (background of the track)
-    pygame.draw.rect(screen, BLUE, 
-                     (track_x_offset + env.track_bounds["left"] * scale, 
-                      track_y_offset + (track_height - env.track_bounds["top"]) * scale,  
-                      track_width * scale, 
-                      track_height * scale))
-
-    # Draw track boundaries
-    pygame.draw.rect(screen, BLACK, 
-                     (track_x_offset + env.track_bounds["left"] * scale, 
-                      track_y_offset + (track_height - env.track_bounds["top"]) * scale, 
-                      track_width * scale, 
-                      track_height * scale), 
-                     2)
-
-    # Calculate the car’s position on the screen (centered on the track)
-    car_x = int(track_x_offset + env.car_position[0] * scale)
-    car_y = screen_height - int(track_y_offset + env.car_position[1] * scale)  
-
-    # Draw the car as a small red circle
-    pygame.draw.circle(screen, RED, (car_x, car_y), 5)
-
-    # Draw the car’s direction as a line
-    direction_x = car_x + int(np.cos(env.angle) * 10)
-    direction_y = car_y - int(np.sin(env.angle) * 10)
-    pygame.draw.line(screen, BLACK, (car_x, car_y), (direction_x, direction_y), 2)
-
-    # Display text information (speed, angle, current reward, accumulated reward)
-    speed_text = font.render(f"Speed: {env.speed:.2f}", True, BLACK)
-    angle_text = font.render(f"Angle: {np.degrees(env.angle):.2f}", True, BLACK)
-    reward_text = font.render(f"Reward: {reward}", True, BLACK)
-    total_reward_text = font.render(f"Total Reward: {total_reward}", True, BLACK)
-    
-    screen.blit(speed_text, (10, 10))
-    screen.blit(angle_text, (10, 40))
-    screen.blit(reward_text, (10, 70))
-    screen.blit(total_reward_text, (10, 100))
-
-    # Check if the episode is done
-    if done or truncated:
-        # Display end-of-episode message and total reward
-        end_text = font.render("Episode finished! Press R to restart or Q to quit.", True, BLACK)
-        screen.blit(end_text, (screen_width // 2 - 200, screen_height // 2))
-        pygame.display.flip()
-        
-        # Wait for the player to choose to restart or quit
-        waiting_for_input = True
-        while waiting_for_input:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                    waiting_for_input = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_r:  # Reset if 'R' is pressed
-                        obs, _ = env.reset()  # Reset environment and observation if player chooses to restart
-                        total_reward = 0  # Reset accumulated reward
-                        waiting_for_input = False
-                    elif event.key == pygame.K_q:  # Quit if 'Q' is pressed
+
+def track_view(track, screen_width, screen_height):
+    """Background Surface with the track drawn on it, and the track to screen mapping."""
+    import pygame
+    bounds = track.track_bounds
+    track_width, track_height = bounds["right"] - bounds["left"], bounds["top"] - bounds["bottom"]
+    scale = screen_width / track_width
+    track_x_offset = (screen_width - track_width * scale) / 2
+    track_y_offset = (screen_height - track_height * scale) / 2
+
+    def to_screen(x_positions, y_positions):
+        return track_x_offset + x_positions * scale, screen_height - (track_y_offset + y_positions * scale)
+
+    background = pygame.Surface((screen_width, screen_height)).convert()
+    background.fill(WHITE)
+    track_rect = (track_x_offset + bounds["left"] * scale,
+                  track_y_offset + (track_height - bounds["top"]) * scale,
+                  track_width * scale,
+                  track_height * scale)
+    pygame.draw.rect(background, BLUE, track_rect)  # Background of the track
+    pygame.draw.rect(background, BLACK, track_rect, 2)  # Track boundaries
+    return background, to_screen
+
+
+def main(model_path="car_race_model3.zip", show_hud=False, fps=60, sim_rate=10, max_speed=False):
+    """
+    Watch a checkpoint drive the straight track.
+
+    Keys: H toggles the frame-time HUD, F and S speed the simulation up and
+    down, M toggles max speed.
+
+    :param model_path: PPO checkpoint (.zip) or numpy export (.npz)
+    :param show_hud: Show frame times (render, inference, sim)
+    :param fps: Frame rate cap, 0 for as fast as possible
+    :param sim_rate: Simulation steps per second at 1x speed
+    :param max_speed: Start in max-speed mode, as many steps as fit in a frame
+    """
+    import pygame  # Rendering only, keeps imports of this module light
+    from ui_render import DirtyRectRenderer, FixedTimestep, FrameTimer, PolicyWorker, lerp
+
+    # Initialize Pygame
+    pygame.init()
+    screen_width, screen_height = 800, 400
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Car Racing Simulation")
+
+    # Scaling factors for the car position and track bounds
+    track_width, track_height = 100, 5  # Logical dimensions of the track in your environment
+    scale = screen_width / track_width  # Scale for both x and y (800 / 100)
+
+    # Initialize environment
+    env = SimpleCarRacingEnv()
+    obs, _ = env.reset()  # Reset the environment and unpack the observation
+
+    # Load the trained model, it runs on a background thread
+    worker = PolicyWorker(load_policy(model_path))
+    worker.submit(obs)
+
+    # Center the track on the screen
+    track_x_offset = (screen_width - track_width * scale) / 2
+    track_y_offset = (screen_height - track_height * scale) / 2
+
+    # The track never changes: draw it once and reuse it every frame
+    background, _ = track_view(env.track, screen_width, screen_height)
+    renderer = DirtyRectRenderer(screen, background)
+    timer = FrameTimer()
+    timestep = FixedTimestep(sim_rate)
+    timestep.max_speed = max_speed
+
+    # Game loop
+    running = True
+    clock = pygame.time.Clock()
+    total_reward = 0  # Accumulated reward for the current episode
+    reward = 0
+    done = truncated = False
+    previous_position, previous_angle = env.car_position.copy(), env.angle  # State before the last step
+    font = pygame.font.Font(None, 30)
+    hud_font = pygame.font.Font(None, 22)
+
+    while running:
+        timer.tick()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_h:
+                    show_hud = not show_hud
+                elif event.key == pygame.K_f:
+                    timestep.faster()
+                elif event.key == pygame.K_s:
+                    timestep.slower()
+                elif event.key == pygame.K_m:
+                    timestep.toggle_max_speed()
+
+        # Run the simulation steps that are due, at the fixed rate whatever the frame rate
+        with timer.phase("sim"):
+            for _ in timestep.due_steps():
+                if done or truncated:
+                    break
+                action = worker.poll(timestep.remaining())
+                if action is None:
+                    break  # The policy is still busy, draw this frame and step on the next
+                timer.record("inference", worker.inference_time)
+
+                previous_position, previous_angle = env.car_position.copy(), env.angle
+                obs, reward, done, truncated, _ = env.step(action)  # Updated to match gymnasium API
+                worker.submit(obs)
+                total_reward += reward  # Accumulate reward
+
+        with timer.phase("render"):
+            # Restore the track under the last frame's car and text
+            renderer.begin()
+
+            # Calculate the car’s position on the screen between its last two simulated states
+            alpha = timestep.alpha()
+            car_x = track_x_offset + lerp(previous_position[0], env.car_position[0], alpha) * scale
+            car_y = screen_height - (track_y_offset + lerp(previous_position[1], env.car_position[1], alpha) * scale)
+            angle = lerp(previous_angle, env.angle, alpha)  # Never wrapped in this env
+
+            # Draw the car as a small red circle
+            renderer.draw(pygame.draw.circle, RED, (car_x, car_y), 5)
+
+            # Draw the car’s direction as a line
+            direction_x = car_x + np.cos(angle) * 10
+            direction_y = car_y - np.sin(angle) * 10
+            renderer.draw(pygame.draw.line, BLACK, (car_x, car_y), (direction_x, direction_y), 2)
+
+            # Display text information (speed, angle, current reward, accumulated reward)
+            renderer.blit(font.render(f"Speed: {env.speed:.2f}", True, BLACK), (10, 10))
+            renderer.blit(font.render(f"Angle: {np.degrees(env.angle):.2f}", True, BLACK), (10, 40))
+            renderer.blit(font.render(f"Reward: {reward}", True, BLACK), (10, 70))
+            renderer.blit(font.render(f"Total Reward: {total_reward}", True, BLACK), (10, 100))
+
+            if show_hud:
+                hud_text = f"{timer.summary()}  sim {timestep.label()}"
+                renderer.blit(hud_font.render(hud_text, True, BLACK), (10, screen_height - 25))
+
+            # Display end-of-episode message
+            if done or truncated:
+                end_text = font.render("Episode finished! Press R to restart or Q to quit.", True, BLACK)
+                renderer.blit(end_text, (screen_width // 2 - 200, screen_height // 2))
+
+            # Update only the parts of the display that changed
+            renderer.end()
+
+        # Check if the episode is done
+        if done or truncated:
+            # Wait for the player to choose to restart or quit
+            waiting_for_input = True
+            while waiting_for_input:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
                         running = False
                         waiting_for_input = False
-
-    # Update display
-    pygame.display.flip()
-    
-    # Slow down the loop
-    time.sleep(0.1)  # Add delay to slow down the simulation
-
-    # Control the frame rate
-    clock.tick(30)
-
-# Quit Pygame
-pygame.quit()
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_r:  # Reset if 'R' is pressed
+                            obs, _ = env.reset()  # Reset environment and observation if player chooses to restart
+                            worker.submit(obs)
+                            total_reward = 0  # Reset accumulated reward
+                            done = truncated = False
+                            previous_position, previous_angle = env.car_position.copy(), env.angle
+                            timestep.reset()  # The wait is not simulation time
+                            waiting_for_input = False
+                        elif event.key == pygame.K_q:  # Quit if 'Q' is pressed
+                            running = False
+                            waiting_for_input = False
+
+        # Control the frame rate
+        clock.tick(fps)
+
+    # Quit Pygame
+    worker.close()
+    pygame.quit()
+
+
+def replay(recording_path, show_hud=False, fps=60, sim_rate=10):
+    """
+    Play a trajectory.py recording on this track, no model or torch needed.
+
+    See ui_render.play_recording() for the keys.
+    """
+    import pygame
+    from trajectory import TrajectoryReader
+    from ui_render import play_recording
+
+    pygame.init()
+    screen_width, screen_height = 800, 400
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Car Racing Replay")
+    play_recording(screen, TrajectoryReader(recording_path),
+                   lambda track: track_view(track, screen_width, screen_height),
+                   fps, sim_rate, show_hud, default_track=RectangleTrack())
+    pygame.quit()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Watch a checkpoint drive the straight track")
+    parser.add_argument("--model-path", default="car_race_model3.zip")
+    parser.add_argument("--hud", action="store_true", help="Show render, inference and sim times per frame")
+    parser.add_argument("--fps", type=int, default=60, help="Frame rate cap, 0 for uncapped")
+    parser.add_argument("--sim-rate", type=float, default=10, help="Simulation steps per second at 1x speed")
+    parser.add_argument("--max-speed", action="store_true", help="Simulate as fast as the frame budget allows")
+    parser.add_argument("--replay", metavar="RECORDING", help="Play a trajectory.py recording instead of a model")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.replay:
+        replay(args.replay, args.hud, args.fps, args.sim_rate)
+    else:
+        main(args.model_path, args.hud, args.fps, args.sim_rate, args.max_speed)
@@ -0,0 +1,255 @@
+"""
+Headless benchmarks for import times, the envs, the track queries and the policy.
+
+    python benchmark.py --output results.json
+    python benchmark.py --save-baseline              # record this machine's baseline
+    python benchmark.py --baseline                   # compare against benchmark_baseline.json
+
+With --baseline, every metric that got worse than the baseline by more than
+--tolerance is reported and the script exits with status 1.
+
+benchmark_baseline.json next to this file is the committed baseline, recorded
+with the full workloads and one torch thread; its "machine" entry says where.
+Timings only compare on the same machine, so on another one record a baseline
+first with --save-baseline (from the commit to compare against), then run
+--baseline on the change. Paths default to the repository, so the script runs
+from any directory.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmark_baseline.json")
+DEFAULT_MODEL = os.path.join(ROOT, "car_race_model9.zip")
+PREDICT_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+IMPORT_MODULES = ("track", "track_Custom", "CarRacingEnv", "CarEnvTurn", "CarEnvCustom",
+                  "numpy_policy", "UI_Custom_track", "UI_Turn_track", "UI_straight_track")
+# Dependencies that the modules above must only load on demand
+HEAVY_MODULES = ("matplotlib", "pygame", "torch", "stable_baselines3")
+
+
+def _timed(fn, repeats):
+    # Median wall time of fn() over a few repeats, after one warm-up call
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _metric(value, unit, higher_is_better):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _import_probe(module):
+    # Run in a fresh interpreter so every import is a cold start
+    return (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+
+
+def bench_imports(repeats):
+    """Cold import time of the track, env and UI modules, each in a new interpreter."""
+    results = {}
+    for module in IMPORT_MODULES:
+        times = []
+        for _ in range(repeats):
+            # From the repository, where the modules are importable whatever the caller's directory
+            out = subprocess.run([sys.executable, "-c", _import_probe(module)], capture_output=True,
+                                 text=True, check=True, cwd=ROOT).stdout.split()
+            times.append(float(out[0]))
+        metric = _metric(statistics.median(times) * 1000, "ms", False)
+        # Any heavy dependency pulled in at import time is a cold-start regression
+        metric["heavy_modules"] = out[1].split(",") if len(out) > 1 else []
+        results[f"import/{module}"] = metric
+    return results
+
+
+def bench_env_steps(n_steps, repeats):
+    """Raw env.step throughput of the three single-car envs."""
+    import CarRacingEnv
+    import CarEnvTurn
+    import CarEnvCustom
+
+    results = {}
+    for name, module in [("straight", CarRacingEnv), ("turn", CarEnvTurn), ("custom", CarEnvCustom)]:
+        np.random.seed(0)
+        env = module.SimpleCarRacingEnv()
+        # Fixed action pattern so every run follows the same trajectories
+        actions = np.random.default_rng(0).integers(0, 2, size=n_steps)
+
+        def run():
+            env.reset(seed=0)
+            for action in actions:
+                _, _, done, truncated, _ = env.step(action)
+                if done or truncated:
+                    env.reset()
+
+        seconds = _timed(run, repeats)
+        results[f"env_steps/{name}"] = _metric(n_steps / seconds, "steps/s", True)
+    return results
+
+
+def bench_track_queries(n_queries, repeats):
+    """Boundary query cost of track.py and track_Custom.Track, scalar and batched."""
+    import track
+    from track_Custom import Track
+
+    np.random.seed(0)
+    custom_track = Track()
+    xs = np.random.default_rng(0).uniform(0, track.TRACK_LENGTH, size=n_queries)
+    xs_list = xs.tolist()
+
+    cases = {
+        "track/scalar": lambda: [track.left_boundary(x) for x in xs_list],
+        "track/batched": lambda: track.get_boundaries(xs),
+        "track_custom/scalar": lambda: [custom_track.get_left_boundary(x) for x in xs_list],
+        "track_custom/batched": lambda: custom_track.get_boundaries(xs),
+    }
+    results = {}
+    for name, fn in cases.items():
+        seconds = _timed(fn, repeats)
+        results[f"boundary_query/{name}"] = _metric(seconds / n_queries * 1e9, "ns/query", False)
+    return results
+
+
+def bench_predict(model_path, repeats, batch_sizes=PREDICT_BATCH_SIZES):
+    """PPO.predict latency for a range of observation batch sizes."""
+    from stable_baselines3 import PPO
+
+    model = PPO.load(model_path, device="cpu")
+    space = model.observation_space
+    rng = np.random.default_rng(0)
+
+    results = {}
+    for batch_size in batch_sizes:
+        obs = rng.uniform(space.low, space.high, size=(batch_size, *space.shape)).astype(space.dtype)
+        if batch_size == 1:
+            obs = obs[0]  # Unbatched, the way the UI scripts call it
+        seconds = _timed(lambda: model.predict(obs, deterministic=True), repeats)
+        results[f"predict/batch_{batch_size}"] = _metric(seconds * 1e6, "us/call", False)
+    return results
+
+
+def bench_learn(n_timesteps, n_envs):
+    """End-to-end PPO.learn throughput on the curved track, rollouts plus updates."""
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv
+    from CarEnvCustom import SimpleCarRacingEnv
+
+    np.random.seed(0)
+    env = DummyVecEnv([SimpleCarRacingEnv for _ in range(n_envs)])
+    model = PPO("MlpPolicy", env, n_steps=512, batch_size=64, seed=0, device="cpu")
+    start = time.perf_counter()
+    model.learn(total_timesteps=n_timesteps)
+    seconds = time.perf_counter() - start
+    env.close()
+    return {"learn/timesteps": _metric(model.num_timesteps / seconds, "steps/s", True)}
+
+
+BENCHMARKS = ("imports", "env", "track", "predict", "learn")
+
+
+def run_benchmarks(selected=BENCHMARKS, quick=False, model_path=DEFAULT_MODEL):
+    scale = 0.1 if quick else 1.0
+    repeats = 3 if quick else 5
+    results = {}
+    if "imports" in selected:
+        results.update(bench_imports(repeats))
+    if "env" in selected:
+        results.update(bench_env_steps(int(20000 * scale), repeats))
+    if "track" in selected:
+        results.update(bench_track_queries(int(100000 * scale), repeats))
+    if "predict" in selected:
+        results.update(bench_predict(model_path, repeats * 20))
+    if "learn" in selected:
+        results.update(bench_learn(2048 if quick else 8192, n_envs=4))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (name, baseline, current, change) for metrics worse than tolerance."""
+    regressions = []
+    for name, metric in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], metric["value"]
+        # Positive change always means "worse", whichever way the metric points
+        change = (old - new) / old if metric["higher_is_better"] else (new - old) / old
+        if change > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Car racing throughput benchmarks")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads for a fast smoke run")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL, help="Checkpoint used by predict")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help="Compare against this baseline JSON file (default: the committed benchmark_baseline.json)")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help="Store the results as the baseline (default: benchmark_baseline.json in the repository)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument("--torch-threads", type=int, default=1, help="torch threads, fixed for repeatability")
+    args = parser.parse_args(argv)
+
+    if "predict" in args.only or "learn" in args.only:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+
+    metrics = run_benchmarks(args.only, args.quick, args.model_path)
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "numpy": np.__version__, "quick": args.quick},
+        "metrics": metrics,
+    }
+
+    for name, metric in metrics.items():
+        heavy = metric.get("heavy_modules")
+        note = f"  (imports {', '.join(heavy)})" if heavy else ""
+        print(f"{name:40s} {metric['value']:14.2f} {metric['unit']}{note}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(metrics, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.2f} -> {new:.2f} ({change:+.0%} worse)")
+        for name, metric in metrics.items():
+            new_heavy = set(metric.get("heavy_modules", [])) - set(baseline.get(name, {}).get("heavy_modules", []))
+            if new_heavy:
+                regressions.append((name, None, None, None))
+                print(f"REGRESSION {name}: now imports {', '.join(sorted(new_heavy))}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Periodic checkpoints written on a background thread, and resuming from them.
+
+    callback = AsyncCheckpointCallback("checkpoints/run1", save_every=50000, keep_last=3)
+    model.learn(1_000_000, callback=callback)
+
+    # After a crash
+    model = load_checkpoint(latest_checkpoint("checkpoints/run1"), env=env)
+    model.learn(1_000_000 - model.num_timesteps, callback=callback, reset_num_timesteps=False)
+
+At the start of a rollout, right after an update, the training thread takes a
+snapshot: a copy of everything PPO.save would write (the policy and optimizer
+state dicts, the timestep counters and the schedules) plus the state of the
+python, numpy and torch RNGs. That takes milliseconds. A background thread
+then serializes the snapshot to a temp file and renames it to
+checkpoint_<timesteps>_steps.zip, so a checkpoint on disk is always complete.
+If the previous write is still going when the next snapshot is due, that
+snapshot is skipped rather than stalling the rollout.
+
+The files are ordinary PPO zips, loadable with PPO.load and indexed by
+model_registry, with the RNG states as an extra rng_state entry.
+load_checkpoint restores them too, so a resumed run continues at the exact
+timestep with the same RNG state and the same learning rate schedule. The envs
+are not part of a checkpoint: a resumed run starts new episodes.
+
+Retention: the keep_last newest checkpoints are kept, plus, with keep_every,
+every checkpoint at a multiple of keep_every timesteps.
+"""
+import concurrent.futures
+import copy
+import glob
+import io
+import os
+import random
+import re
+import tempfile
+import zipfile
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+CHECKPOINT_PATTERN = re.compile(r"_(\d+)_steps\.zip$")
+
+
+def checkpoint_path(directory, timesteps, prefix="checkpoint"):
+    return os.path.join(directory, f"{prefix}_{timesteps:012d}_steps.zip")
+
+
+def list_checkpoints(directory, prefix="checkpoint"):
+    """(timesteps, path) of every checkpoint in the directory, oldest first."""
+    checkpoints = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}_*_steps.zip")):
+        match = CHECKPOINT_PATTERN.search(path)
+        if match:
+            checkpoints.append((int(match.group(1)), path))
+    return sorted(checkpoints)
+
+
+def latest_checkpoint(directory, prefix="checkpoint"):
+    """Path of the newest checkpoint, None if there is none."""
+    checkpoints = list_checkpoints(directory, prefix)
+    return checkpoints[-1][1] if checkpoints else None
+
+
+def rng_state():
+    import torch
+
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["torch_cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    import torch
+
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "torch_cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["torch_cuda"])
+
+
+def snapshot(model):
+    """Copy of the model's save data, state dicts and the RNG states, safe to write from another thread."""
+    # The same split as BaseAlgorithm.save, copied so training can go on meanwhile
+    state_dict_names, torch_variable_names = model._get_torch_save_params()
+    exclude = set(model._excluded_save_params())
+    exclude.update(name.split(".")[0] for name in state_dict_names + torch_variable_names)
+    data = copy.deepcopy({name: value for name, value in model.__dict__.items() if name not in exclude})
+    params = copy.deepcopy(model.get_parameters())
+    pytorch_variables = {name: copy.deepcopy(getattr(model, name)) for name in torch_variable_names}
+    return {"timesteps": model.num_timesteps, "data": data, "params": params,
+            "pytorch_variables": pytorch_variables, "rng_state": rng_state()}
+
+
+def write_checkpoint(state, path):
+    """Write a snapshot as a PPO zip, atomically."""
+    import torch
+    from stable_baselines3.common.save_util import save_to_zip_file
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            save_to_zip_file(file, data=state["data"], params=state["params"],
+                             pytorch_variables=state["pytorch_variables"])
+        with zipfile.ZipFile(tmp_path, "a") as archive:
+            buffer = io.BytesIO()
+            torch.save(state["rng_state"], buffer)
+            archive.writestr("rng_state", buffer.getvalue())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path, env=None, **load_kwargs):
+    """PPO.load plus the RNG states, ready to continue with reset_num_timesteps=False."""
+    import torch
+    from stable_baselines3 import PPO
+
+    model = PPO.load(path, env=env, **load_kwargs)
+    with zipfile.ZipFile(path) as archive:
+        if "rng_state" in archive.namelist():
+            set_rng_state(torch.load(io.BytesIO(archive.read("rng_state")), weights_only=False))
+    # The saved observations belong to envs that are gone, learn() resets the new ones
+    model._last_obs = None
+    return model
+
+
+def prune_checkpoints(directory, keep_last=3, keep_every=None, prefix="checkpoint"):
+    """Delete all but the keep_last newest checkpoints and those at multiples of keep_every."""
+    checkpoints = list_checkpoints(directory, prefix)
+    removed = []
+    for timesteps, path in checkpoints[:max(len(checkpoints) - keep_last, 0)]:
+        if keep_every and timesteps % keep_every == 0:
+            continue
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Checkpoints the model every save_every timesteps without stalling training.
+
+    :param directory: Where checkpoints go, created if needed
+    :param save_every: Timesteps between checkpoints, checked at every rollout start
+    :param keep_last: Number of newest checkpoints kept
+    :param keep_every: Also keep the checkpoints at multiples of this many timesteps, None keeps no others
+    :param prefix: File name prefix
+    """
+
+    def __init__(self, directory, save_every=50000, keep_last=3, keep_every=None, prefix="checkpoint", verbose=0):
+        super().__init__(verbose)
+        self.directory = directory
+        self.save_every = save_every
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self.prefix = prefix
+        self.saved = []
+        self.skipped = 0
+        self._executor = None
+        self._pending = None
+
+    def _on_training_start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="checkpoint-writer")
+        self._last_save = self.num_timesteps  # A resumed run starts at its checkpoint
+
+    def _on_rollout_start(self):
+        if self.num_timesteps - self._last_save < self.save_every:
+            return
+        if self._pending is not None and not self._pending.done():
+            self.skipped += 1  # Still writing the previous one, try again next rollout
+            return
+        self._collect()
+        self._last_save = self.num_timesteps
+        path = checkpoint_path(self.directory, self.num_timesteps, self.prefix)
+        self._pending = self._executor.submit(self._write, snapshot(self.model), path)
+
+    def _on_step(self):
+        return True
+
+    def _on_training_end(self):
+        self._executor.shutdown(wait=True)
+        self._collect()
+
+    def _write(self, state, path):
+        write_checkpoint(state, path)
+        prune_checkpoints(self.directory, self.keep_last, self.keep_every, self.prefix)
+        return path
+
+    def _collect(self):
+        # Raise errors of the last write in the training thread, where they are seen
+        if self._pending is not None and self._pending.done():
+            path = self._pending.result()
+            self._pending = None
+            self.saved.append(path)
+            if self.verbose:
+                print(f"Saved checkpoint {path}")
@@ -0,0 +1,251 @@
+"""
+Offline datasets of (obs, action, reward, next_obs, done) transitions.
+
+    python dataset.py generate data/ --transitions 5000000 --policy car_race_model9.npz --policy centre \
+        --vec-env shm --n-envs 64 --seed 0
+    for batch in TransitionDataset("data/").minibatches(256, seed=0):
+        ...                               # batch["obs"], batch["action"], ...
+
+Transitions are collected from a vec env of SimpleCarRacingEnv (any of the
+train.py vec env types) and appended to shards: one structured .npy file of
+shard_size records each, written to a temporary name and renamed when
+complete, so a shard on disk is never partial. Memory stays at one shard
+buffer however many transitions are generated, and generating into an
+existing directory appends new shards after the old ones.
+
+Readers open the shards with mmap_mode="r", like track_pool.py. Minibatches
+follow one permutation of the whole dataset and only the rows of each batch
+are read from disk.
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+
+SHARD_PATTERN = "shard_*.npy"
+
+
+def transition_dtype(obs_size):
+    return np.dtype([
+        ("obs", "f4", (obs_size,)),
+        ("action", "i8"),
+        ("reward", "f4"),
+        ("next_obs", "f4", (obs_size,)),
+        ("done", "?"),  # The episode terminated, bootstrapping stops here
+        ("truncated", "?"),  # The episode was cut short, next_obs is still a valid state
+    ])
+
+
+class CentreLinePolicy:
+    """
+    Scripted driver steering back towards the middle of the track.
+
+    Needs the boundary distances of CarEnvCustom's observation.
+
+    :param gain: Heading correction per unit of distance off centre
+    :param epsilon: Probability of a random action, for more varied data
+    :param seed: Seed of the random actions
+    """
+
+    def __init__(self, gain=0.3, epsilon=0.0, seed=None):
+        self.gain = gain
+        self.epsilon = epsilon
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, obs, deterministic=True):
+        obs = np.atleast_2d(obs)
+        angle = (obs[:, 2] + np.pi) % (2 * np.pi) - np.pi
+        # Above the centre line the left distance is the larger one, so head down, and vice versa
+        off_centre = (obs[:, 3] - obs[:, 4]) / 2
+        target = -np.arctan(self.gain * off_centre)
+        actions = (angle > target).astype(np.int64)  # 1 turns right
+        if self.epsilon > 0:
+            explore = self.rng.random(len(actions)) < self.epsilon
+            actions[explore] = self.rng.integers(2, size=int(explore.sum()))
+        return actions, None
+
+
+def load_driver(source, epsilon=0.0, seed=None):
+    """"centre" for CentreLinePolicy, otherwise a checkpoint for numpy_policy.load_policy()."""
+    if source == "centre":
+        return CentreLinePolicy(epsilon=epsilon, seed=seed)
+    from numpy_policy import load_policy
+    return load_policy(source, seed)
+
+
+class ShardWriter:
+    """
+    Appends transitions to a directory of fixed-size shards.
+
+    :param directory: Dataset directory, created if missing
+    :param obs_size: Length of an observation
+    :param shard_size: Transitions per shard, and the most kept in memory
+    """
+
+    def __init__(self, directory, obs_size, shard_size=2 ** 16):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self._buffer = np.zeros(shard_size, dtype=transition_dtype(obs_size))
+        self._n_buffered = 0
+        self._next_shard = len(glob.glob(os.path.join(directory, SHARD_PATTERN)))
+        self.n_added = 0
+        self.n_written = 0
+
+    def add(self, obs, actions, rewards, next_obs, dones, truncated):
+        """Append a batch of transitions, one row per env."""
+        self.n_added += len(actions)
+        start = 0
+        while start < len(actions):
+            n = min(len(actions) - start, self.shard_size - self._n_buffered)
+            rows = slice(self._n_buffered, self._n_buffered + n)
+            batch = slice(start, start + n)
+            self._buffer["obs"][rows] = obs[batch]
+            self._buffer["action"][rows] = actions[batch]
+            self._buffer["reward"][rows] = rewards[batch]
+            self._buffer["next_obs"][rows] = next_obs[batch]
+            self._buffer["done"][rows] = dones[batch]
+            self._buffer["truncated"][rows] = truncated[batch]
+            self._n_buffered += n
+            start += n
+            if self._n_buffered == self.shard_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered transitions as a shard, possibly shorter than shard_size."""
+        if self._n_buffered == 0:
+            return
+        path = os.path.join(self.directory, f"shard_{self._next_shard:06d}.npy")
+        temporary_path = os.path.join(self.directory, f".shard_{self._next_shard:06d}.tmp")
+        with open(temporary_path, "wb") as file:
+            np.save(file, self._buffer[:self._n_buffered])
+        os.replace(temporary_path, path)  # Readers only ever see whole shards
+        self.n_written += self._n_buffered
+        self._next_shard += 1
+        self._n_buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+def generate(directory, n_transitions, policies=("centre",), vec_env_type="shm", n_envs=16, n_workers=None,
+             seed=None, track_pool=None, shard_size=2 ** 16, epsilon=0.0, deterministic=True):
+    """
+    Collect n_transitions transitions into directory and return the number written.
+
+    :param policies: Sources for load_driver(), env i is driven by policies[i % len(policies)]
+    :param epsilon: Random action probability of the scripted driver
+    :param deterministic: Greedy actions from the checkpoints, or sampled ones
+    """
+    from train import build_vec_env
+
+    env = build_vec_env(vec_env_type, n_envs, n_workers, seed, track_pool)
+    drivers = [load_driver(source, epsilon, None if seed is None else seed + i) for i, source in enumerate(policies)]
+    slots = [np.arange(i, n_envs, len(drivers)) for i in range(len(drivers))]
+    writer = ShardWriter(directory, env.observation_space.shape[0], shard_size)
+    actions = np.zeros(n_envs, dtype=np.int64)
+
+    obs = env.reset()
+    while writer.n_added < n_transitions:
+        for driver, rows in zip(drivers, slots):
+            if len(rows):
+                actions[rows] = np.asarray(driver.predict(obs[rows], deterministic=deterministic)[0]).reshape(-1)
+        next_obs, rewards, dones, infos = env.step(actions)
+
+        # After an auto-reset the returned observation starts the next episode
+        final_obs = next_obs.copy()
+        truncated = np.zeros(n_envs, dtype=bool)
+        for env_idx in np.flatnonzero(dones):
+            final_obs[env_idx] = infos[env_idx]["terminal_observation"]
+            truncated[env_idx] = infos[env_idx].get("TimeLimit.truncated", False)
+
+        n = min(n_envs, n_transitions - writer.n_added)
+        writer.add(obs[:n], actions[:n], rewards[:n], final_obs[:n], (dones & ~truncated)[:n], truncated[:n])
+        obs = next_obs
+
+    writer.close()
+    env.close()
+    return writer.n_written
+
+
+class TransitionDataset:
+    """
+    Read-only view of the shards in a dataset directory.
+
+    :param directory: Directory written by generate() or ShardWriter
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = sorted(glob.glob(os.path.join(directory, SHARD_PATTERN)))
+        if not self.paths:
+            raise FileNotFoundError(f"No shards in {directory}")
+        # Plain ndarray views of the mapped pages, np.memmap indexing is several times slower
+        self.shards = [np.load(path, mmap_mode="r").view(np.ndarray) for path in self.paths]
+        self.fields = self.shards[0].dtype.names
+        sizes = np.array([len(shard) for shard in self.shards])
+        self.shard_starts = np.concatenate([[0], np.cumsum(sizes)])
+
+    def __len__(self):
+        return int(self.shard_starts[-1])
+
+    def gather(self, indices):
+        """Dict of field arrays for the given dataset rows, in the order of indices."""
+        # Read in sorted order, sequential within each shard, and put every row back where it was asked for
+        order = np.argsort(indices, kind="stable")
+        indices = np.asarray(indices)[order]
+        shard_ids = np.searchsorted(self.shard_starts, indices, side="right") - 1
+        batch = {name: np.empty((len(indices),) + self.shards[0].dtype[name].shape, self.shards[0].dtype[name].base)
+                 for name in self.fields}
+        boundaries = np.flatnonzero(np.diff(shard_ids)) + 1
+        for rows in np.split(np.arange(len(indices)), boundaries):
+            if len(rows) == 0:
+                continue
+            shard = shard_ids[rows[0]]
+            records = self.shards[shard][indices[rows] - self.shard_starts[shard]]
+            for name in self.fields:
+                batch[name][order[rows]] = records[name]
+        return batch
+
+    def minibatches(self, batch_size, seed=None, epochs=1, drop_last=False):
+        """Yield shuffled minibatches, each transition once per epoch."""
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(self))
+            stop = len(order) - len(order) % batch_size if drop_last else len(order)
+            for start in range(0, stop, batch_size):
+                yield self.gather(order[start:start + batch_size])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate or inspect offline transition datasets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="Collect transitions into a dataset directory")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("--transitions", type=int, default=1_000_000)
+    generate_parser.add_argument("--policy", action="append", default=None,
+                                 help="Checkpoint (.zip/.npz) or 'centre' for the scripted driver, repeatable")
+    generate_parser.add_argument("--vec-env", choices=("dummy", "subproc", "shm", "batched"), default="shm")
+    generate_parser.add_argument("--n-envs", type=int, default=16)
+    generate_parser.add_argument("--workers", type=int, default=None)
+    generate_parser.add_argument("--seed", type=int, default=None)
+    generate_parser.add_argument("--track-pool", default=None)
+    generate_parser.add_argument("--shard-size", type=int, default=2 ** 16)
+    generate_parser.add_argument("--epsilon", type=float, default=0.0, help="Random action rate of 'centre'")
+    generate_parser.add_argument("--stochastic", action="store_true", help="Sample checkpoint actions")
+    info_parser = subparsers.add_parser("info", help="Summarize a dataset directory")
+    info_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        written = generate(args.directory, args.transitions, args.policy or ["centre"], args.vec_env, args.n_envs,
+                           args.workers, args.seed, args.track_pool, args.shard_size, args.epsilon,
+                           not args.stochastic)
+        print(f"Wrote {written} transitions to {args.directory}")
+    else:
+        dataset = TransitionDataset(args.directory)
+        rewards = np.concatenate([shard["reward"] for shard in dataset.shards])
+        episodes = sum(int(shard["done"].sum() + shard["truncated"].sum()) for shard in dataset.shards)
+        print(f"{args.directory}: {len(dataset)} transitions in {len(dataset.paths)} shards, "
+              f"{episodes} episode ends, mean reward {rewards.mean():.3f}")
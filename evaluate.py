@@ -0,0 +1,149 @@
+"""
+Headless evaluation of every saved checkpoint and a leaderboard of the results.
+
+    python evaluate.py                          # all car_race_model*.zip, 100 episodes each
+    python evaluate.py car_race_model9.zip --episodes 500 --workers 8 --output leaderboard.json
+
+Each checkpoint runs against the env it was trained on, as recorded in the
+model registry. Episodes of one task are stepped in lockstep so predict() is
+called once per step for all of them, and tasks are spread across a process
+pool.
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+
+import numpy as np
+from model_registry import ModelRegistry, load_model
+
+ENV_MODULES = {
+    "straight": "CarRacingEnv",
+    "turn": "CarEnvTurn",
+    "custom": "CarEnvCustom",
+}
+
+
+def make_env(env_id, seed=None, env_kwargs=None):
+    import importlib
+    module = importlib.import_module(ENV_MODULES[env_id])
+    if seed is not None:
+        # The custom env draws its track from the global numpy RNG
+        np.random.seed(seed)
+    return module.SimpleCarRacingEnv(**(env_kwargs or {}))
+
+
+def run_episodes(model, env_id, seeds, max_steps, env_kwargs=None):
+    """Run one episode per seed in lockstep and return a record per episode.
+
+    env_kwargs, e.g. track_pool or action_repeat, are passed to every env.
+    """
+    envs = [make_env(env_id, seed, env_kwargs) for seed in seeds]
+    observations = np.stack([env.reset(seed=seed)[0] for env, seed in zip(envs, seeds)])
+    n = len(envs)
+    returns = np.zeros(n)
+    steps = np.zeros(n, dtype=int)
+    collisions = np.zeros(n, dtype=int)
+    finished = np.zeros(n, dtype=bool)
+    active = np.ones(n, dtype=bool)
+
+    for _ in range(max_steps):
+        indices = np.flatnonzero(active)
+        if len(indices) == 0:
+            break
+        # One forward pass for every episode still running
+        actions, _ = model.predict(observations[indices], deterministic=True)
+        for i, action in zip(indices, actions):
+            observation, reward, done, truncated, info = envs[i].step(action)
+            observations[i] = observation
+            returns[i] += reward
+            steps[i] += 1
+            # The info flags, not the reward: with action_repeat a step sums several substep rewards
+            collisions[i] += "off_track" in info
+            if done or truncated:
+                finished[i] = "finished" in info
+                active[i] = False
+
+    return [
+        {"seed": seed, "return": float(returns[i]), "steps": int(steps[i]),
+         "collisions": int(collisions[i]), "finished": bool(finished[i])}
+        for i, seed in enumerate(seeds)
+    ]
+
+
+def _init_worker():
+    import torch
+    # One thread per worker, the pool provides the parallelism
+    torch.set_num_threads(1)
+
+
+def _evaluate_task(task):
+    model_path, env_id, env_kwargs, seeds, max_steps = task
+    # Each worker keeps its loaded checkpoints in the registry's model cache
+    return model_path, env_id, run_episodes(load_model(model_path), env_id, seeds, max_steps, env_kwargs)
+
+
+def summarize(model_path, env_id, episodes):
+    returns = np.array([e["return"] for e in episodes])
+    finished = np.array([e["finished"] for e in episodes])
+    finish_steps = [e["steps"] for e in episodes if e["finished"]]
+    return {
+        "model": model_path,
+        "env": env_id,
+        "episodes": len(episodes),
+        "finish_rate": float(finished.mean()),
+        "mean_return": float(returns.mean()),
+        "std_return": float(returns.std()),
+        "mean_steps_to_finish": float(np.mean(finish_steps)) if finish_steps else None,
+        "mean_collisions": float(np.mean([e["collisions"] for e in episodes])),
+    }
+
+
+def evaluate(model_paths, n_episodes=100, max_steps=500, n_workers=None, episodes_per_task=50, seed=0):
+    """Evaluate every checkpoint on its own env and return the sorted leaderboard."""
+    # The env of each checkpoint comes from the registry index, no model is loaded here
+    registry = ModelRegistry()
+    entries = {path: registry.get(path) for path in model_paths}
+    env_ids = {path: entry["env_id"] for path, entry in entries.items()}
+    seeds = list(range(seed, seed + n_episodes))
+    tasks = [
+        (path, env_ids[path], entries[path].get("env_kwargs", {}), seeds[start:start + episodes_per_task], max_steps)
+        for path in model_paths
+        for start in range(0, n_episodes, episodes_per_task)
+    ]
+
+    episodes = {path: [] for path in model_paths}
+    with mp.get_context("spawn").Pool(n_workers, initializer=_init_worker) as pool:
+        for model_path, _, records in pool.imap_unordered(_evaluate_task, tasks):
+            episodes[model_path].extend(records)
+
+    leaderboard = [summarize(path, env_ids[path], episodes[path]) for path in model_paths]
+    leaderboard.sort(key=lambda row: (-row["finish_rate"], -row["mean_return"]))
+    return leaderboard
+
+
+def print_leaderboard(leaderboard):
+    print(f"{'rank':>4}  {'model':24s} {'env':9s} {'finish':>7} {'return':>9} {'steps':>7} {'collisions':>10}")
+    for rank, row in enumerate(leaderboard, 1):
+        steps = f"{row['mean_steps_to_finish']:.1f}" if row["mean_steps_to_finish"] is not None else "-"
+        print(f"{rank:>4}  {row['model']:24s} {row['env']:9s} {row['finish_rate']:>7.1%} "
+              f"{row['mean_return']:>9.1f} {steps:>7} {row['mean_collisions']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate saved checkpoints headlessly")
+    parser.add_argument("models", nargs="*", help="Checkpoints to evaluate (default: car_race_model*.zip)")
+    parser.add_argument("--episodes", type=int, default=100, help="Seeded episodes per checkpoint")
+    parser.add_argument("--max-steps", type=int, default=500, help="Step cap for episodes that never finish")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: all cores)")
+    parser.add_argument("--episodes-per-task", type=int, default=50, help="Episodes stepped in lockstep per task")
+    parser.add_argument("--seed", type=int, default=0, help="Episode i uses seed + i")
+    parser.add_argument("--output", help="Write the leaderboard as JSON to this file")
+    args = parser.parse_args()
+
+    model_paths = args.models or sorted(glob.glob("car_race_model*.zip"))
+    leaderboard = evaluate(model_paths, args.episodes, args.max_steps, args.workers, args.episodes_per_task, args.seed)
+    print_leaderboard(leaderboard)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(leaderboard, f, indent=2)
@@ -0,0 +1,326 @@
+"""
+Shared, batched policy inference for many concurrent episodes.
+
+One process loads a PPO checkpoint once. Observations from any number of
+clients are queued, gathered into a batch for up to max_wait_ms (or until
+max_batch_size rows are waiting) and answered with a single forward pass.
+
+In-process:
+    server = InferenceServer("car_race_model9.zip")
+    server.start()
+    action, _ = server.predict(obs)
+
+Across processes:
+    python inference_server.py car_race_model9.zip --socket /tmp/car_policy.sock
+    client = InferenceClient("/tmp/car_policy.sock")
+    action, _ = client.predict(obs)
+
+A request whose observations do not have the model's shape is rejected with a
+ValueError before it is batched. If a batched forward pass fails anyway, the
+requests are retried one by one, so only the failing ones get the error. Over
+the socket the error is sent back and the client raises it as a RuntimeError,
+and the connection stays usable.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Every message is a uint32 row count followed by the raw array bytes
+_HEADER = struct.Struct("!I")
+# A reply with this row count carries an error message, uint32 length plus utf-8 text, instead
+_ERROR_ROWS = 0xFFFFFFFF
+
+
+class _Request:
+    def __init__(self, observations):
+        self.observations = observations
+        self.actions = None
+        self.error = None
+        self.ready = threading.Event()
+
+
+class InferenceServer:
+    """
+    Batches predict() calls from many threads into one PPO forward pass.
+
+    :param model_path: PPO checkpoint to serve
+    :param max_batch_size: Maximum number of observation rows per forward pass
+    :param max_wait_ms: How long the first request of a batch waits for company
+    :param deterministic: Passed to PPO.predict for every batch
+    :param model: Already loaded model to serve instead of loading model_path
+    """
+
+    def __init__(self, model_path, max_batch_size=256, max_wait_ms=2.0, deterministic=True, model=None):
+        if model is None:
+            from model_registry import load_model
+            model = load_model(model_path)
+        self.model = model
+        self.observation_space = model.observation_space
+        self.action_space = model.action_space
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.deterministic = deterministic
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+
+        # Rolling window of recent batches for the statistics
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+        self._queue_depths = deque(maxlen=1000)
+        self._n_batches = 0
+        self._n_rows = 0
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._batch_loop, name="inference-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, observations):
+        """Queue a (rows, *obs_shape) array and return the pending request."""
+        observations = np.asarray(observations, dtype=self.observation_space.dtype)
+        # Checked here, one bad request must not break the batch it would join
+        if observations.shape[1:] != self.observation_space.shape or len(observations) == 0:
+            raise ValueError(f"Expected observations of shape (rows, *{self.observation_space.shape}), "
+                             f"got {observations.shape}")
+        request = _Request(observations)
+        self._queue.put(request)
+        return request
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=None):
+        """Drop-in for PPO.predict: one observation or a batch, returns (actions, None).
+
+        deterministic is fixed per server and the argument is only accepted for compatibility.
+        """
+        observation = np.asarray(observation, dtype=self.observation_space.dtype)
+        single = observation.shape == self.observation_space.shape
+        request = self.submit(observation[None] if single else observation)
+        request.ready.wait()
+        if request.error is not None:
+            raise request.error
+        return (request.actions[0] if single else request.actions), None
+
+    def _next_batch(self):
+        # Block for the first request, then gather more until the deadline or a full batch
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return [], 0
+        queue_depth = self._queue.qsize() + 1
+        batch, rows = [first], len(first.observations)
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += len(request.observations)
+        return batch, queue_depth
+
+    def _batch_loop(self):
+        while self._running:
+            batch, queue_depth = self._next_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                observations = np.concatenate([request.observations for request in batch])
+                actions, _ = self.model.predict(observations, deterministic=self.deterministic)
+            except Exception:
+                # Find the failing requests, the others still get their actions
+                self._predict_each(batch)
+                continue
+            latency = time.perf_counter() - start
+
+            offset = 0
+            for request in batch:
+                rows = len(request.observations)
+                request.actions = actions[offset:offset + rows]
+                offset += rows
+                request.ready.set()
+
+            with self._lock:
+                self._latencies.append(latency)
+                self._batch_sizes.append(len(observations))
+                self._queue_depths.append(queue_depth)
+                self._n_batches += 1
+                self._n_rows += len(observations)
+
+    def _predict_each(self, batch):
+        for request in batch:
+            try:
+                request.actions, _ = self.model.predict(request.observations, deterministic=self.deterministic)
+            except Exception as error:  # Hand the failure to the caller waiting for it
+                request.error = error
+            request.ready.set()
+
+    def stats(self):
+        """Forward-pass latency, batch size and queue depth over the recent batches."""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            batch_sizes = np.array(self._batch_sizes)
+            queue_depths = np.array(self._queue_depths)
+            n_batches, n_rows = self._n_batches, self._n_rows
+        if n_batches == 0:
+            return {"batches": 0, "observations": 0}
+        return {
+            "batches": n_batches,
+            "observations": n_rows,
+            "latency_ms_mean": float(latencies.mean()),
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p99": float(np.percentile(latencies, 99)),
+            "batch_size_mean": float(batch_sizes.mean()),
+            "batch_size_max": int(batch_sizes.max()),
+            "queue_depth_mean": float(queue_depths.mean()),
+            "queue_depth_max": int(queue_depths.max()),
+            "queue_depth_now": self._queue.qsize(),
+        }
+
+
+def _recv_exact(sock, n_bytes):
+    data = bytearray()
+    while len(data) < n_bytes:
+        chunk = sock.recv(n_bytes - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def _send_array(sock, array):
+    sock.sendall(_HEADER.pack(len(array)) + np.ascontiguousarray(array).tobytes())
+
+
+def _send_error(sock, error):
+    message = f"{type(error).__name__}: {error}".encode()
+    sock.sendall(_HEADER.pack(_ERROR_ROWS) + _HEADER.pack(len(message)) + message)
+
+
+def _recv_array(sock, shape, dtype):
+    (rows,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if rows == _ERROR_ROWS:
+        (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+        raise RuntimeError(f"Inference server error: {_recv_exact(sock, length).decode()}")
+    n_bytes = rows * int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return np.frombuffer(_recv_exact(sock, n_bytes), dtype=dtype).reshape(rows, *shape)
+
+
+def _space_spec(server):
+    return {
+        "obs_shape": list(server.observation_space.shape),
+        "obs_dtype": np.dtype(server.observation_space.dtype).str,
+        "action_shape": list(server.action_space.shape),
+        "action_dtype": np.dtype(server.action_space.dtype).str,
+    }
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server.inference_server
+        spec = _space_spec(server)
+        # Handshake: tell the client how to encode observations and decode actions
+        handshake = json.dumps(spec).encode()
+        self.request.sendall(_HEADER.pack(len(handshake)) + handshake)
+        while True:
+            try:
+                observations = _recv_array(self.request, spec["obs_shape"], spec["obs_dtype"])
+            except (ConnectionError, RuntimeError):
+                return
+            try:
+                request = server.submit(observations)
+            except ValueError as error:
+                _send_error(self.request, error)
+                continue
+            request.ready.wait()
+            if request.error is not None:
+                _send_error(self.request, request.error)
+                continue
+            _send_array(self.request, request.actions.astype(spec["action_dtype"]))
+
+
+def serve_unix(server, socket_path):
+    """Serve an InferenceServer on a Unix socket, one thread per connected client."""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    unix_server = socketserver.ThreadingUnixStreamServer(socket_path, _ClientHandler)
+    unix_server.daemon_threads = True
+    unix_server.inference_server = server
+    return unix_server
+
+
+class InferenceClient:
+    """Talks to a server started with serve_unix; predict() mirrors PPO.predict."""
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        (length,) = _HEADER.unpack(_recv_exact(self.sock, _HEADER.size))
+        spec = json.loads(_recv_exact(self.sock, length))
+        self.obs_shape = tuple(spec["obs_shape"])
+        self.obs_dtype = np.dtype(spec["obs_dtype"])
+        self.action_shape = tuple(spec["action_shape"])
+        self.action_dtype = np.dtype(spec["action_dtype"])
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        observation = np.asarray(observation, dtype=self.obs_dtype)
+        single = observation.shape == self.obs_shape
+        # The server reads rows * obs_shape values, another shape would garble the stream
+        if not single and observation.shape[1:] != self.obs_shape:
+            raise ValueError(f"Expected observations of shape {self.obs_shape} or (rows, *{self.obs_shape}), "
+                             f"got {observation.shape}")
+        _send_array(self.sock, observation[None] if single else observation)
+        actions = _recv_array(self.sock, self.action_shape, self.action_dtype)
+        return (actions[0] if single else actions), None
+
+    def close(self):
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a PPO checkpoint to many clients over a Unix socket")
+    parser.add_argument("model_path")
+    parser.add_argument("--socket", default="/tmp/car_policy.sock")
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="Seconds between statistics lines")
+    args = parser.parse_args()
+
+    inference_server = InferenceServer(args.model_path, args.max_batch_size, args.max_wait_ms).start()
+    unix_server = serve_unix(inference_server, args.socket)
+    threading.Thread(target=unix_server.serve_forever, daemon=True).start()
+    print(f"Serving {args.model_path} on {args.socket}")
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            print(json.dumps(inference_server.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        unix_server.shutdown()
+        unix_server.server_close()
+        inference_server.stop()
+        os.unlink(args.socket)
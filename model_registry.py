@@ -0,0 +1,274 @@
+"""
+Content-addressed registry of PPO checkpoints with an in-process model cache.
+
+Checkpoints are keyed by the sha256 of the zip file. For each one the index
+stores the env it was trained on, the observation/action spaces, the training
+timesteps and the PPO hyperparameters, all read from the archive's JSON "data"
+entry without unpickling anything or importing torch. The index lives in a
+small JSON file, so listing checkpoints never opens the archives, and a file is
+only re-hashed when its size or mtime changes, or right before it is loaded. A
+path whose content changed moves to the new hash, and a hash without any file
+left is dropped from the index.
+
+The env is whatever register() is given as env_id and env_kwargs, as train.py
+does for the checkpoints it saves. Only checkpoints registered without them,
+like the legacy car_race_model*.zip files, have their env inferred from the
+observation layouts of the three original envs. Any other layout, e.g. ray
+sensors, raises a ValueError.
+
+    registry = ModelRegistry()
+    registry.scan()                      # index every car_race_model*.zip
+    registry.list()                      # metadata for every known checkpoint
+    model = registry.load("car_race_model9.zip")   # PPO, cached by content hash
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+from gymnasium import spaces
+
+DEFAULT_INDEX = "model_registry.json"
+HYPERPARAMETERS = ("learning_rate", "n_steps", "batch_size", "n_epochs", "gamma", "gae_lambda",
+                   "ent_coef", "vf_coef", "max_grad_norm", "n_envs", "policy_kwargs")
+
+
+def infer_env_id(observation_space):
+    """Guess which env a legacy checkpoint was trained on from its observation space."""
+    low, high = observation_space.low, observation_space.high
+    # (x, y, angle), plus the two boundary distances for the custom env
+    if observation_space.shape in ((3,), (5,)) and np.isclose(low[2], -np.pi) and np.isclose(high[2], np.pi):
+        if observation_space.shape == (5,):
+            if np.all(low[3:] == 0):
+                return "custom"
+        elif low[1] < 0:
+            return "turn"  # Centred track, y can go below zero
+        else:
+            return "straight"
+    raise ValueError(f"Cannot infer the env of a checkpoint with observation space {observation_space}, "
+                     f"register it with env_id and env_kwargs")
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_array(text):
+    # SB3 stores Box bounds as their numpy repr, e.g. "[ 0.  -2.5  3.14]"
+    return [float(value) for value in text.strip("[]").split()]
+
+
+def read_checkpoint_metadata(path, env_id=None):
+    """Spaces, timesteps and hyperparameters from the archive's JSON data entry.
+
+    env_id is inferred from the observation space if not given, see infer_env_id.
+    """
+    with zipfile.ZipFile(path) as archive:
+        data = json.loads(archive.read("data"))
+
+    obs = data["observation_space"]
+    observation_space = {
+        "shape": obs["_shape"],
+        "low": _parse_array(obs["low"]),
+        "high": _parse_array(obs["high"]),
+        "dtype": obs["dtype"],
+    }
+    action = data["action_space"]
+    action_space = {"shape": action["_shape"], "dtype": action["dtype"]}
+    if "n" in action:
+        action_space["n"] = int(action["n"])
+
+    # Schedules are pickled functions, only plain JSON values are kept
+    hyperparameters = {
+        key: data[key] for key in HYPERPARAMETERS
+        if key in data and not (isinstance(data[key], dict) and ":serialized:" in data[key])
+    }
+    box = spaces.Box(low=np.array(observation_space["low"]), high=np.array(observation_space["high"]),
+                     dtype=observation_space["dtype"])
+    return {
+        "env_id": env_id if env_id is not None else infer_env_id(box),
+        "observation_space": observation_space,
+        "action_space": action_space,
+        "num_timesteps": data.get("num_timesteps"),
+        "hyperparameters": hyperparameters,
+    }
+
+
+class ModelRegistry:
+    """
+    Index of checkpoints by content hash plus an LRU of loaded models.
+
+    :param index_path: JSON file holding the index, created on first register
+    :param cache_size: Number of loaded models kept in memory
+    """
+
+    def __init__(self, index_path=DEFAULT_INDEX, cache_size=8):
+        self.index_path = index_path
+        self.cache_size = cache_size
+        self._models = OrderedDict()
+        self.entries = {}  # content hash -> metadata
+        self.paths = {}  # absolute path -> {"hash", "size", "mtime_ns"}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            self.entries = index.get("entries", {})
+            self.paths = index.get("paths", {})
+
+    def _save(self):
+        # Write to a temp file and rename so readers never see a half-written index
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"entries": self.entries, "paths": self.paths}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def register(self, path, **extra):
+        """Index a checkpoint (if new or changed) and return its content hash.
+
+        Extra keyword arguments are stored with the entry, in particular env_id
+        and env_kwargs, the ENV_MODULES key and constructor arguments of the env
+        it was trained on.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.paths.get(path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns and not extra:
+            return known["hash"]
+        return self._index(path, file_hash(path), stat, extra)
+
+    def _index(self, path, key, stat, extra=None):
+        known = self.paths.get(path)
+        if known and known["hash"] != key:
+            self._unlink(path, known["hash"])  # The file was rewritten
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = read_checkpoint_metadata(path, (extra or {}).get("env_id"))
+            entry["env_kwargs"] = {}  # The original envs' defaults, unless extra says otherwise
+            entry["size"] = stat.st_size
+            entry["paths"] = []
+            self.entries[key] = entry
+        entry.update(extra or {})
+        if path not in entry["paths"]:
+            entry["paths"].append(path)
+        self.paths[path] = {"hash": key, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        self._save()
+        return key
+
+    def _unlink(self, path, key):
+        # Entries without any file left are dropped, nothing could load them
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        if path in entry["paths"]:
+            entry["paths"].remove(path)
+        if not entry["paths"]:
+            del self.entries[key]
+            self._models.pop(key, None)
+
+    def _forget(self, path):
+        known = self.paths.pop(path, None)
+        if known:
+            self._unlink(path, known["hash"])
+        self._save()
+
+    def scan(self, pattern="car_race_model*.zip"):
+        """Register every checkpoint matching pattern and return their hashes."""
+        return [self.register(path) for path in sorted(glob.glob(pattern))]
+
+    def list(self, env_id=None):
+        """Metadata of every indexed checkpoint, read from the index only."""
+        return [
+            dict(entry, hash=key) for key, entry in self.entries.items()
+            if env_id is None or entry["env_id"] == env_id
+        ]
+
+    def resolve(self, key):
+        """Content hash for a checkpoint path, a full hash or a unique hash prefix."""
+        try:
+            return self.register(key)
+        except FileNotFoundError:
+            pass
+        matches = [h for h in self.entries if h.startswith(key)]
+        if len(matches) != 1:
+            raise KeyError(f"{key!r} matches {len(matches)} registered checkpoints")
+        return matches[0]
+
+    def get(self, key):
+        return self.entries[self.resolve(key)]
+
+    def load(self, key, **load_kwargs):
+        """Return the PPO model for key, loading it only if it is not cached.
+
+        load_kwargs are passed to PPO.load on a cache miss only.
+        """
+        content_hash = self.resolve(key)
+        model = self._models.get(content_hash)
+        if model is not None:
+            self._models.move_to_end(content_hash)
+            return model
+
+        from stable_baselines3 import PPO
+        path, content_hash = self._verified_path(key, content_hash)
+        load_kwargs.setdefault("device", "cpu")
+        model = PPO.load(path, **load_kwargs)
+        self._models[content_hash] = model
+        if len(self._models) > self.cache_size:
+            self._models.popitem(last=False)
+        return model
+
+    def _verified_path(self, key, content_hash):
+        # Size and mtime miss a rewrite that keeps both, so the file is hashed before loading.
+        # Returns the path to load and the hash it really has.
+        if os.path.isfile(key):
+            path = os.path.abspath(key)
+            actual = file_hash(path)
+            if actual != content_hash:
+                content_hash = self._index(path, actual, os.stat(path))
+            return path, content_hash
+        for path in list(self.entries[content_hash]["paths"]):
+            if not os.path.isfile(path):
+                self._forget(path)
+                continue
+            actual = file_hash(path)
+            if actual == content_hash:
+                return path, content_hash
+            self._index(path, actual, os.stat(path))
+        raise KeyError(f"No file with content {content_hash} is left, its checkpoints were changed or deleted")
+
+
+_default_registry = None
+
+
+def default_registry():
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ModelRegistry()
+    return _default_registry
+
+
+def load_model(path, **load_kwargs):
+    """Load a checkpoint through the shared registry and its model cache."""
+    return default_registry().load(path, **load_kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index and list saved checkpoints")
+    parser.add_argument("pattern", nargs="?", default="car_race_model*.zip")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    registry.scan(args.pattern)
+    for entry in sorted(registry.list(), key=lambda e: e["paths"][0]):
+        names = ", ".join(os.path.basename(p) for p in entry["paths"])
+        print(f"{entry['hash'][:12]}  {entry['env_id']:9s} obs{tuple(entry['observation_space']['shape'])} "
+              f"{entry['num_timesteps']:>7} steps  {names}")
@@ -0,0 +1,199 @@
+"""
+Run trained PPO MlpPolicy checkpoints with numpy only.
+
+Exporting needs stable_baselines3 and torch once:
+    python numpy_policy.py export car_race_model9.zip car_race_model9.npz --check 10000
+
+Running the exported file needs nothing but numpy:
+    policy = NumpyPolicy.load("car_race_model9.npz")
+    action, _ = policy.predict(obs)      # same as PPO.predict(obs, deterministic=True)
+
+With deterministic=False actions are sampled like PPO's: from the softmax of
+the logits for discrete actions, from a normal around the mean with the
+exported log_std for box actions, using the policy's own seeded RNG.
+"""
+import argparse
+
+import numpy as np
+
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x: np.maximum(x, 0, out=x),
+}
+
+
+def export_policy(model_path, output_path):
+    """Write the actor weights of a PPO MlpPolicy checkpoint to a compact .npz file."""
+    from gymnasium import spaces
+    from stable_baselines3 import PPO
+
+    model = PPO.load(model_path, device="cpu")
+    policy = model.policy
+    activation = policy.activation_fn.__name__
+    if activation not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation {activation}")
+    if type(policy.pi_features_extractor).__name__ != "FlattenExtractor":
+        raise ValueError("Only the default FlattenExtractor is supported")
+
+    arrays = {}
+    layers = [module for module in policy.mlp_extractor.policy_net if hasattr(module, "weight")]
+    for i, layer in enumerate(layers):
+        arrays[f"w{i}"] = layer.weight.detach().numpy().T.astype(np.float32)
+        arrays[f"b{i}"] = layer.bias.detach().numpy().astype(np.float32)
+    arrays["action_w"] = policy.action_net.weight.detach().numpy().T.astype(np.float32)
+    arrays["action_b"] = policy.action_net.bias.detach().numpy().astype(np.float32)
+
+    action_space = model.action_space
+    if isinstance(action_space, spaces.Discrete):
+        arrays["action_kind"] = np.array("discrete")
+        arrays["action_start"] = np.array(action_space.start)
+    elif isinstance(action_space, spaces.Box):
+        arrays["action_kind"] = np.array("box")
+        arrays["action_low"] = action_space.low
+        arrays["action_high"] = action_space.high
+        arrays["log_std"] = policy.log_std.detach().numpy().astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported action space {action_space}")
+    arrays["activation"] = np.array(activation)
+    arrays["obs_shape"] = np.array(model.observation_space.shape)
+    arrays["n_layers"] = np.array(len(layers))
+
+    np.savez(output_path, **arrays)
+    return output_path
+
+
+class NumpyPolicy:
+    """
+    Forward pass of an exported PPO MlpPolicy, greedy or sampled.
+
+    :param log_std: Log standard deviations of box actions, needed to sample them
+    :param seed: Seed of the RNG for sampled actions
+    """
+
+    def __init__(self, weights, biases, action_w, action_b, activation="Tanh", obs_shape=None,
+                 action_kind="discrete", action_start=0, action_low=None, action_high=None, log_std=None,
+                 seed=None):
+        self.weights = weights
+        self.biases = biases
+        self.action_w = action_w
+        self.action_b = action_b
+        self.activation = ACTIVATIONS[activation]
+        self.obs_shape = tuple(obs_shape) if obs_shape is not None else (weights[0].shape[0],)
+        self.action_kind = action_kind
+        self.action_start = action_start
+        self.action_low = action_low
+        self.action_high = action_high
+        self.log_std = log_std
+        self.rng = np.random.default_rng(seed)
+        self._layers = list(zip(weights, biases))
+
+    @classmethod
+    def load(cls, path, seed=None):
+        with np.load(path) as data:
+            n_layers = int(data["n_layers"])
+            kind = str(data["action_kind"])
+            return cls(
+                weights=[data[f"w{i}"] for i in range(n_layers)],
+                biases=[data[f"b{i}"] for i in range(n_layers)],
+                action_w=data["action_w"],
+                action_b=data["action_b"],
+                activation=str(data["activation"]),
+                obs_shape=data["obs_shape"],
+                action_kind=kind,
+                action_start=int(data["action_start"]) if kind == "discrete" else 0,
+                action_low=data["action_low"] if kind == "box" else None,
+                action_high=data["action_high"] if kind == "box" else None,
+                # Files exported before sampling was supported have no log_std
+                log_std=data["log_std"] if "log_std" in data else None,
+                seed=seed,
+            )
+
+    def forward(self, observations):
+        """Action logits (discrete) or means (box) for a (batch, *obs_shape) array."""
+        x = observations.reshape(len(observations), -1)
+        for w, b in self._layers:
+            x = x @ w
+            x += b
+            x = self.activation(x)
+        x = x @ self.action_w
+        x += self.action_b
+        return x
+
+    def _predict_single(self, x):
+        # Vector-matrix products with in-place ops, no batch axis to add and strip
+        for w, b in self._layers:
+            x = np.dot(x, w)
+            x += b
+            x = self.activation(x)
+        x = np.dot(x, self.action_w)
+        x += self.action_b
+        return np.int64(x.argmax() + self.action_start)
+
+    def _sample(self, out):
+        if self.action_kind == "discrete":
+            # Inverse CDF of the softmax, one uniform draw per row
+            probs = np.exp(out - out.max(axis=1, keepdims=True))
+            cdf = np.cumsum(probs, axis=1)
+            u = self.rng.random((len(out), 1)) * cdf[:, -1:]
+            return np.minimum((cdf < u).sum(axis=1), out.shape[1] - 1) + self.action_start
+        if self.log_std is None:
+            raise ValueError("This export has no log_std to sample box actions with, export the checkpoint again")
+        return out + np.exp(self.log_std) * self.rng.standard_normal(out.shape, dtype=np.float32)
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        """Same inputs and outputs as PPO.predict, sampling from the policy's RNG unless deterministic."""
+        observation = np.asarray(observation, dtype=np.float32)
+        if deterministic and observation.shape == self.obs_shape and self.action_kind == "discrete":
+            return self._predict_single(observation.ravel()), None
+        single = observation.shape == self.obs_shape
+        out = self.forward(observation[None] if single else observation)
+        if not deterministic:
+            actions = self._sample(out)
+        elif self.action_kind == "discrete":
+            actions = out.argmax(axis=1) + self.action_start
+        else:
+            actions = out
+        if self.action_kind == "box":
+            actions = np.clip(actions, self.action_low, self.action_high)
+        return (actions[0] if single else actions), None
+
+
+def load_policy(path, seed=None):
+    """NumpyPolicy for an exported .npz file, the cached PPO model for a .zip checkpoint.
+
+    seed seeds the sampled actions of a NumpyPolicy, PPO samples from the torch RNG.
+    """
+    if str(path).endswith(".npz"):
+        return NumpyPolicy.load(path, seed)
+    from model_registry import load_model
+    return load_model(path)
+
+
+def check_export(model_path, output_path, n_samples, seed=0):
+    """Number of random observations where the numpy and PPO actions differ."""
+    from stable_baselines3 import PPO
+
+    model = PPO.load(model_path, device="cpu")
+    policy = NumpyPolicy.load(output_path)
+    space = model.observation_space
+    observations = np.random.default_rng(seed).uniform(space.low, space.high, size=(n_samples, *space.shape))
+    expected, _ = model.predict(observations.astype(np.float32), deterministic=True)
+    actual, _ = policy.predict(observations)
+    return int(np.count_nonzero(np.any((expected != actual).reshape(n_samples, -1), axis=1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export PPO checkpoints for numpy-only inference")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("model_path")
+    export_parser.add_argument("output_path")
+    export_parser.add_argument("--check", type=int, default=0,
+                               help="Compare against PPO.predict on this many random observations")
+    args = parser.parse_args()
+
+    export_policy(args.model_path, args.output_path)
+    print(f"Exported {args.model_path} to {args.output_path}")
+    if args.check:
+        mismatches = check_export(args.model_path, args.output_path, args.check)
+        print(f"{mismatches} of {args.check} actions differ from PPO.predict")
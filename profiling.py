@@ -0,0 +1,191 @@
+"""
+Opt-in timing of the phases of env steps.
+
+    env = StepProfiler(SimpleCarRacingEnv(), dump_path="profile.jsonl", dump_every=10000)
+    envs = VecStepProfiler(SimpleCarRacingVecEnv(256), info_every=1000)
+    print(env.stats.summary())
+
+CarRacingEnvCore.step and SimpleCarRacingVecEnv.step_wait report to the
+StepStats in their profiler attribute: the time of each phase (action, the
+angle update and predicted position; boundaries, the boundary queries;
+reward, the reward and the collision and finish checks; observation) and
+counters of notable events. Without a profiler the attribute is None, and
+the only cost is one `is not None` test per phase.
+
+Times are summed per phase and binned into power-of-two nanosecond
+histograms, so recording is a few integer additions. With allocations=True,
+tracemalloc also measures each step's peak transient allocation and net
+memory blocks. That slows the whole process down and is meant for
+diagnosis, not for training runs.
+"""
+import json
+import sys
+import time
+import tracemalloc
+from time import perf_counter_ns
+
+import gymnasium as gym
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+PHASES = ("action", "boundaries", "reward", "observation")
+N_BUCKETS = 40  # Bucket k holds durations in [2^(k-1), 2^k) ns
+
+
+class StepStats:
+    """
+    Aggregated per-phase step times, event counters and optional allocation stats.
+
+    :param allocations: Also measure allocations per step with tracemalloc
+    """
+
+    def __init__(self, allocations=False):
+        self.allocations = allocations
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.calls = 0  # step() or step_wait() calls, each may run several substeps
+        self.totals = {phase: 0 for phase in PHASES}
+        self.histograms = {phase: [0] * N_BUCKETS for phase in PHASES}
+        self.counters = {}
+        self.peak_bytes = 0  # Summed per-step peaks of transient allocations
+        self.net_blocks = 0  # Summed change in allocated memory blocks
+        self._last = 0
+
+    def start(self):
+        if self.allocations:
+            self._blocks = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            self._traced = tracemalloc.get_traced_memory()[0]
+        self._last = perf_counter_ns()
+
+    def lap(self, phase):
+        """Close the phase running since start() or the previous lap()."""
+        now = perf_counter_ns()
+        elapsed = now - self._last
+        self._last = now
+        self.totals[phase] += elapsed
+        bucket = elapsed.bit_length()
+        self.histograms[phase][bucket if bucket < N_BUCKETS else N_BUCKETS - 1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def end_step(self, n=1):
+        """Count n env steps, the cars of a vec env step_wait."""
+        self.steps += n
+        self.calls += 1
+        if self.allocations:
+            self.peak_bytes += tracemalloc.get_traced_memory()[1] - self._traced
+            self.net_blocks += sys.getallocatedblocks() - self._blocks
+
+    def _percentile(self, phase, q):
+        # Upper edge of the histogram bucket holding the q-th quantile
+        histogram = self.histograms[phase]
+        target, seen = q * sum(histogram), 0
+        for bucket, n in enumerate(histogram):
+            seen += n
+            if n and seen >= target:
+                return 2 ** bucket
+        return 0
+
+    def summary(self):
+        """JSON-ready dict of the stats so far.
+
+        Mean phase times are in microseconds per step or step_wait call. The
+        percentiles are per lap, and with action_repeat the physics phases run
+        one lap per substep.
+        """
+        calls = self.calls
+        phases = {
+            phase: {
+                "mean_us": self.totals[phase] / calls / 1000 if calls else 0.0,
+                "p50_us": self._percentile(phase, 0.5) / 1000,
+                "p99_us": self._percentile(phase, 0.99) / 1000,
+            }
+            for phase in PHASES
+        }
+        summary = {"steps": self.steps, "calls": calls, "phases": phases, "counters": dict(self.counters)}
+        if self.allocations and calls:
+            summary["peak_bytes_per_call"] = self.peak_bytes / calls
+            summary["net_blocks_per_call"] = self.net_blocks / calls
+        return summary
+
+
+class _Reporting:
+    # Shared by both wrappers: hand out summaries in info and append them to a JSON lines file
+
+    def _setup_reporting(self, stats, allocations, info_every, dump_path, dump_every):
+        self.stats = stats if stats is not None else StepStats(allocations)
+        self.info_every = info_every
+        self.dump_path = dump_path
+        self.dump_every = dump_every
+        self._calls = 0
+
+    def _report(self, info):
+        self._calls += 1
+        if self.info_every and self._calls % self.info_every == 0:
+            info["profile"] = self.stats.summary()
+        if self.dump_path is not None and self._calls % self.dump_every == 0:
+            self.dump()
+
+    def dump(self):
+        with open(self.dump_path, "a") as file:
+            file.write(json.dumps({"time": time.time(), **self.stats.summary()}) + "\n")
+
+
+class StepProfiler(_Reporting, gym.Wrapper):
+    """
+    Profiles a CarRacingEnvCore env.
+
+    :param env: Env whose unwrapped env is a CarRacingEnvCore
+    :param stats: StepStats to report to, e.g. one shared by several envs
+    :param allocations: Measure allocations, see StepStats
+    :param info_every: Put stats.summary() in info["profile"] every this many steps, 0 never
+    :param dump_path: Append a summary line to this JSON lines file every dump_every steps
+    """
+
+    def __init__(self, env, stats=None, allocations=False, info_every=0, dump_path=None, dump_every=10000):
+        super().__init__(env)
+        self._setup_reporting(stats, allocations, info_every, dump_path, dump_every)
+        env.unwrapped.profiler = self.stats
+
+    def step(self, action):
+        observation, reward, done, truncated, info = self.env.step(action)
+        self._report(info)
+        return observation, reward, done, truncated, info
+
+    def close(self):
+        if self.dump_path is not None:
+            self.dump()
+        self.env.unwrapped.profiler = None
+        super().close()
+
+
+class VecStepProfiler(_Reporting, VecEnvWrapper):
+    """
+    Profiles a SimpleCarRacingVecEnv, or a subclass, the summaries go to the first env's info.
+
+    Parameters as for StepProfiler, counting step_wait calls.
+    """
+
+    def __init__(self, venv, stats=None, allocations=False, info_every=0, dump_path=None, dump_every=1000):
+        super().__init__(venv)
+        self._setup_reporting(stats, allocations, info_every, dump_path, dump_every)
+        self.venv.unwrapped.profiler = self.stats
+
+    def reset(self):
+        return self.venv.reset()
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        self._report(infos[0])
+        return obs, rewards, dones, infos
+
+    def close(self):
+        if self.dump_path is not None:
+            self.dump()
+        self.venv.unwrapped.profiler = None
+        self.venv.close()
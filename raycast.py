@@ -0,0 +1,104 @@
+"""
+Range-sensor observations: rays cast from the car to the track boundaries.
+
+    env = SimpleCarRacingEnv(ray_angles=fan_angles(9))   # 9 distances instead of the car state
+    envs = SimpleCarRacingVecEnv(256, ray_angles=fan_angles(32))
+
+Both boundaries are polylines through the knots of the track (the segment
+starts and the track end), continued past both ends like the boundaries
+themselves. Tracks with wrap_negative_x add the knots of their wrapped
+stretches behind the start line, see track_Custom.Track.wrapped_knots.
+A ray returns the distance to the first boundary segment it crosses, capped
+at the sensor range. All rays of all cars are intersected with all segments
+in one broadcast, (segments, cars, rays), which stays small since tracks
+have few segments.
+"""
+import numpy as np
+
+
+def fan_angles(n_rays, field_of_view=np.pi):
+    """n_rays angles relative to the heading, spread evenly over the field of view."""
+    if n_rays == 1:
+        return np.zeros(1)
+    return np.linspace(-field_of_view / 2, field_of_view / 2, n_rays)
+
+
+def track_polylines(track, n_samples=101):
+    """(x_knots, left, right) of a track backend's boundaries.
+
+    Tracks without knot tables are sampled evenly, which is exact for the
+    fixed tracks since their corners fall on the samples.
+    """
+    x_knots = getattr(track, "x_knots", None)
+    if x_knots is not None:
+        polylines = (np.asarray(x_knots), np.asarray(track.left_boundaries), np.asarray(track.right_boundaries))
+        if getattr(track, "wrap_negative_x", False):
+            polylines = tuple(np.concatenate(pair) for pair in zip(track.wrapped_knots(), polylines))
+        return polylines
+    x_limits = track.x_limits if track.x_limits is not None else (0, track.track_length)
+    x_knots = np.linspace(x_limits[0], x_limits[1], n_samples)
+    left, right = track.get_boundaries(x_knots)
+    return x_knots, left, right
+
+
+def boundary_segments(x_knots, left, right, extend):
+    """(segments, 4) array of (start x, start y, edge x, edge y) of both boundaries.
+
+    The first and last segments are lengthened by extend beyond the track ends.
+    """
+    segments = []
+    for y in (left, right):
+        xs = np.array(x_knots, dtype=np.float64)
+        ys = np.array(y, dtype=np.float64)
+        start_slope = (ys[1] - ys[0]) / (xs[1] - xs[0])
+        end_slope = (ys[-1] - ys[-2]) / (xs[-1] - xs[-2])
+        xs[0], ys[0] = xs[0] - extend, ys[0] - start_slope * extend
+        xs[-1], ys[-1] = xs[-1] + extend, ys[-1] + end_slope * extend
+        segments.append(np.stack([xs[:-1], ys[:-1], np.diff(xs), np.diff(ys)], axis=1))
+    return np.concatenate(segments)
+
+
+def stack_segments(segment_lists):
+    """(tracks, segments, 4) array padded with zero-length segments, which no ray hits."""
+    n_segments = max(len(s) for s in segment_lists)
+    stacked = np.zeros((len(segment_lists), n_segments, 4))
+    for row, segments in enumerate(segment_lists):
+        stacked[row, :len(segments)] = segments
+    return stacked
+
+
+def cast_rays(x, y, headings, ray_angles, segments, max_range):
+    """
+    Distance along each ray to the first boundary segment, at most max_range.
+
+    :param x: (cars,) ray origins
+    :param y: (cars,) ray origins
+    :param headings: (cars,) car headings
+    :param ray_angles: (rays,) ray directions relative to the heading
+    :param segments: (cars, segments, 4) boundary segments of each car's track
+    :return: (cars, rays) distances
+    """
+    # Segment terms relative to each car, shared by all its rays. Segments
+    # come first, so numpy's inner loops run over the rays and the closest
+    # hit is an elementwise minimum over a few (cars, rays) planes.
+    segments = segments.transpose(1, 0, 2)
+    offset_x = segments[:, :, 0] - x
+    offset_y = segments[:, :, 1] - y
+    edge_x, edge_y = segments[:, :, 2], segments[:, :, 3]
+    t_numerator = (offset_x * edge_y - offset_y * edge_x).astype(np.float32)[:, :, None]
+    offset_x, offset_y = offset_x.astype(np.float32)[:, :, None], offset_y.astype(np.float32)[:, :, None]
+    edge_x, edge_y = edge_x.astype(np.float32)[:, :, None], edge_y.astype(np.float32)[:, :, None]
+
+    # origin + t * direction = start + s * edge, solved with 2D cross products, in float32
+    # Ray directions are the fixed ray angles rotated by each heading
+    cos_heading, sin_heading = np.cos(headings)[:, None], np.sin(headings)[:, None]
+    cos_ray, sin_ray = np.cos(ray_angles), np.sin(ray_angles)
+    dx = (cos_heading * cos_ray - sin_heading * sin_ray).astype(np.float32)
+    dy = (sin_heading * cos_ray + cos_heading * sin_ray).astype(np.float32)
+    denominator = dx * edge_y - dy * edge_x
+    s_numerator = offset_x * dy - offset_y * dx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = t_numerator / denominator
+        s = s_numerator / denominator
+    t[~((t >= 0) & (s >= 0) & (s <= 1))] = max_range  # Parallel or zero-length segments give nan, never a hit
+    return np.minimum.reduce(t, axis=0).clip(max=max_range)
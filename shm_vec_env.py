@@ -0,0 +1,229 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+
+def _attach(name, shape, dtype):
+    # Map a shared memory block created by the parent process as a numpy array
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _worker(remote, parent_remote, env_fn_wrappers, first_index):
+    # Import here to avoid a circular import
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    envs = [env_fn() for env_fn in env_fn_wrappers.var]
+    rows = slice(first_index, first_index + len(envs))
+    remote.send((envs[0].observation_space, envs[0].action_space))
+
+    # The parent answers with the shared buffers, sized for every env
+    layout = remote.recv()
+    blocks, buffers = zip(*[_attach(*spec) for spec in layout])
+    obs_buf, actions_buf, rews_buf, dones_buf = (buf[rows] for buf in buffers)
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                infos, reset_infos = [], []
+                for i, env in enumerate(envs):
+                    observation, reward, terminated, truncated, info = env.step(actions_buf[i])
+                    # convert to SB3 VecEnv api
+                    done = terminated or truncated
+                    info["TimeLimit.truncated"] = truncated and not terminated
+                    reset_info = None
+                    if done:
+                        # save final observation where user can get it, then reset
+                        info["terminal_observation"] = observation
+                        observation, reset_info = env.reset()
+                    obs_buf[i] = observation
+                    rews_buf[i] = reward
+                    dones_buf[i] = done
+                    infos.append(info)
+                    reset_infos.append(reset_info)
+                # Only the (usually empty) info dicts travel through the pipe
+                remote.send((infos, reset_infos))
+            elif cmd == "reset":
+                reset_infos = []
+                for i, env in enumerate(envs):
+                    seed, options = data[i]
+                    maybe_options = {"options": options} if options else {}
+                    observation, reset_info = env.reset(seed=seed, **maybe_options)
+                    obs_buf[i] = observation
+                    reset_infos.append(reset_info)
+                remote.send(reset_infos)
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+            elif cmd == "env_method":
+                local_indices, name, args, kwargs = data
+                remote.send([envs[i].get_wrapper_attr(name)(*args, **kwargs) for i in local_indices])
+            elif cmd == "get_attr":
+                local_indices, name = data
+                remote.send([envs[i].get_wrapper_attr(name) for i in local_indices])
+            elif cmd == "set_attr":
+                local_indices, name, value = data
+                for i in local_indices:
+                    setattr(envs[i], name, value)
+                remote.send(None)
+            elif cmd == "is_wrapped":
+                local_indices, wrapper_class = data
+                remote.send([is_wrapped(envs[i], wrapper_class) for i in local_indices])
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
+
+    # Drop the numpy views before unmapping the shared blocks
+    del obs_buf, actions_buf, rews_buf, dones_buf, buffers
+    for block in blocks:
+        block.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Multiprocess VecEnv that passes observations, actions, rewards and done
+    flags through shared memory instead of pickling them over pipes.
+
+    The envs are split into n_workers contiguous groups, each stepped
+    sequentially by one process, so cheap envs can be packed several per core.
+
+    :param env_fns: Environments to run in subprocesses
+    :param n_workers: Number of worker processes, defaults to one per env
+    :param start_method: multiprocessing start method, as for SubprocVecEnv
+    """
+
+    def __init__(self, env_fns, n_workers=None, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        n_workers = min(n_workers or n_envs, n_envs)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # Contiguous, near-equal groups of envs per worker
+        bounds = np.linspace(0, n_envs, n_workers + 1).astype(int)
+        self.worker_slices = [range(bounds[w], bounds[w + 1]) for w in range(n_workers)]
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for work_remote, remote, env_slice in zip(self.work_remotes, self.remotes, self.worker_slices):
+            chunk = CloudpickleWrapper([env_fns[i] for i in env_slice])
+            args = (work_remote, remote, chunk, env_slice.start)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        observation_space, action_space = self.remotes[0].recv()
+        for remote in self.remotes[1:]:
+            remote.recv()
+        if not isinstance(observation_space, spaces.Box):
+            raise ValueError("SharedMemoryVecEnv only supports Box observation spaces")
+
+        # One shared block per buffer, every worker writes only its own rows
+        self._blocks = []
+        layout = []
+        for shape, dtype in [
+            ((n_envs, *observation_space.shape), observation_space.dtype),
+            ((n_envs, *action_space.shape), action_space.dtype),
+            ((n_envs,), np.float32),
+            ((n_envs,), np.bool_),
+        ]:
+            nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            block = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._blocks.append(block)
+            layout.append((block.name, shape, dtype))
+        self.buf_obs, self.buf_actions, self.buf_rews, self.buf_dones = (
+            np.ndarray(shape, dtype=dtype, buffer=block.buf) for block, (_, shape, dtype) in zip(self._blocks, layout)
+        )
+        for remote in self.remotes:
+            remote.send(layout)
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions):
+        self.buf_actions[:] = np.asarray(actions).reshape(self.buf_actions.shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = []
+        for remote, env_slice in zip(self.remotes, self.worker_slices):
+            worker_infos, worker_reset_infos = remote.recv()
+            infos.extend(worker_infos)
+            for env_idx, reset_info in zip(env_slice, worker_reset_infos):
+                if reset_info is not None:
+                    self.reset_infos[env_idx] = reset_info
+        self.waiting = False
+        return self.buf_obs.copy(), self.buf_rews.copy(), self.buf_dones.copy(), infos
+
+    def reset(self):
+        for remote, env_slice in zip(self.remotes, self.worker_slices):
+            remote.send(("reset", [(self._seeds[i], self._options[i]) for i in env_slice]))
+        self.reset_infos = []
+        for remote in self.remotes:
+            self.reset_infos.extend(remote.recv())
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self.buf_obs.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        del self.buf_obs, self.buf_actions, self.buf_rews, self.buf_dones
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self.closed = True
+
+    def _call_workers(self, cmd, indices, *args):
+        # Group the requested env indices by worker, then put each answer back at the
+        # position its index has in indices, which need not be sorted by worker
+        indices = list(self._get_indices(indices))
+        targets = []
+        for remote, env_slice in zip(self.remotes, self.worker_slices):
+            positions = [pos for pos, i in enumerate(indices) if i in env_slice]
+            if positions:
+                remote.send((cmd, ([indices[pos] - env_slice.start for pos in positions], *args)))
+                targets.append((remote, positions))
+        results = [None] * len(indices)
+        for remote, positions in targets:
+            answers = remote.recv()
+            if answers is not None:
+                for pos, answer in zip(positions, answers):
+                    results[pos] = answer
+        return results
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call_workers("get_attr", indices, attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call_workers("set_attr", indices, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call_workers("env_method", indices, method_name, method_args, method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._call_workers("is_wrapped", indices, wrapper_class)
@@ -0,0 +1,345 @@
+"""
+Parallel PPO hyperparameter sweeps with early stopping and resume.
+
+    python sweep.py run sweep_spec.json sweeps/lr --workers 4 --threads 1
+    python sweep.py table sweeps/lr
+
+The spec is a JSON file:
+
+    {
+        "method": "random",                     # or "grid"
+        "n_trials": 16,                         # random search only
+        "seed": 0,
+        "timesteps": 100000,                    # per trial
+        "eval_every": 20000,                    # timesteps between scores
+        "vec_env": "batched", "n_envs": 16,
+        "early_stopping": {"min_trials": 3, "quantile": 0.5, "grace_rungs": 1},
+        "parameters": {
+            "learning_rate": {"low": 1e-5, "high": 1e-3, "log": true},
+            "batch_size": [64, 128, 256],
+            "gamma": 0.99
+        }
+    }
+
+A grid search runs every combination of the listed values. A random search
+draws each parameter from its list, or from a {"low", "high", "log", "int"}
+range. Single values are fixed, and anything not given keeps
+train.PPO_DEFAULTS.
+
+Every eval_every timesteps a trial is scored, as the mean return of
+eval_episodes seeded evaluation episodes on the curved track, built with the
+trial's env_kwargs and track_pool, and its checkpoint is saved. One of these
+scores is a rung. A trial whose score at a rung falls below the quantile of
+the scores that the other trials reached at that rung is stopped, once
+min_trials others have reached it.
+
+The sweep directory holds sweep.json, with the spec and the drawn trials, and
+one directory per trial with status.json and model.zip. Both files are
+replaced atomically. Running the same directory again resumes the sweep:
+finished trials are skipped, and interrupted ones continue from their last
+rung checkpoint. A results table ranking the trials and naming their
+checkpoints is written to results.csv.
+
+Each worker process is pinned to its own CPUs, with torch limited to that
+many threads, so parallel trials do not oversubscribe the machine.
+"""
+import argparse
+import concurrent.futures
+import csv
+import glob
+import itertools
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+SPEC_DEFAULTS = {
+    "method": "grid",
+    "n_trials": 10,
+    "seed": 0,
+    "timesteps": 50000,
+    "eval_every": 10000,
+    "eval_episodes": 10,
+    "eval_max_steps": 500,
+    "vec_env": "batched",  # Trials run in parallel, so by default each is a single process
+    "n_envs": 8,
+    "env_workers": None,  # Worker processes of an shm trial's envs
+    "track_pool": None,
+    "env_kwargs": {},  # E.g. {"max_steps": 300, "stall_steps": 20}, see CarEnvCore
+    "early_stopping": None,
+    "parameters": {},
+}
+EARLY_STOPPING_DEFAULTS = {"min_trials": 3, "quantile": 0.5, "grace_rungs": 1}
+FINAL_STATES = ("completed", "stopped", "failed")
+# Evaluation seeds, shared by all trials and apart from the training seeds
+EVAL_SEED = 1_000_000
+
+
+def _write_json(path, data):
+    # Write to a temp file and rename, so readers and resumed sweeps never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _draw(rng, values):
+    if isinstance(values, list):
+        value = values[rng.integers(len(values))]
+    elif isinstance(values, dict):
+        low, high = values["low"], values["high"]
+        if values.get("log", False):
+            value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            value = float(rng.uniform(low, high))
+        if values.get("int", False):
+            value = int(round(value))
+    else:
+        value = values
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def expand_trials(spec):
+    """The list of trials, {"id", "seed", "params"}, a spec asks for."""
+    parameters = spec["parameters"]
+    if spec["method"] == "grid":
+        if any(isinstance(values, dict) for values in parameters.values()):
+            raise ValueError("A grid search needs lists of values, ranges are for random search")
+        names = list(parameters)
+        grid = [values if isinstance(values, list) else [values] for values in parameters.values()]
+        combinations = [dict(zip(names, values)) for values in itertools.product(*grid)]
+    elif spec["method"] == "random":
+        rng = np.random.default_rng(spec["seed"])
+        combinations = [{name: _draw(rng, values) for name, values in parameters.items()}
+                        for _ in range(spec["n_trials"])]
+    else:
+        raise ValueError(f"Unknown search method {spec['method']!r}, expected 'grid' or 'random'")
+    return [{"id": f"trial_{i:03d}", "seed": spec["seed"] + i, "params": params}
+            for i, params in enumerate(combinations)]
+
+
+def _peer_scores(sweep_dir, trial_id, rung):
+    # Scores the other trials reached at this rung, read from their status files
+    scores = []
+    for path in glob.glob(os.path.join(sweep_dir, "trial_*", "status.json")):
+        status = _read_json(path)
+        if status["id"] != trial_id and len(status["rungs"]) > rung:
+            scores.append(status["rungs"][rung]["score"])
+    return scores
+
+
+def should_stop(sweep_dir, trial_id, rung, score, early_stopping):
+    """True if the score is below the quantile of the other trials' scores at this rung."""
+    if early_stopping is None or rung < early_stopping["grace_rungs"]:
+        return False
+    scores = _peer_scores(sweep_dir, trial_id, rung)
+    if len(scores) < early_stopping["min_trials"]:
+        return False
+    return score < np.quantile(scores, early_stopping["quantile"])
+
+
+def _score(model, spec):
+    from evaluate import run_episodes
+    from track_pool import TrackPool
+
+    # Scored on the same tracks and env settings the trial trains on
+    env_kwargs = dict(spec["env_kwargs"])
+    if spec["track_pool"] is not None:
+        env_kwargs["track_pool"] = TrackPool(spec["track_pool"])
+    seeds = list(range(EVAL_SEED, EVAL_SEED + spec["eval_episodes"]))
+    episodes = run_episodes(model, "custom", seeds, spec["eval_max_steps"], env_kwargs)
+    return (float(np.mean([e["return"] for e in episodes])),
+            float(np.mean([e["finished"] for e in episodes])))
+
+
+def run_trial(sweep_dir, trial, spec):
+    """Train, score and checkpoint one trial until it completes or is stopped, return its status."""
+    from stable_baselines3 import PPO
+    from checkpointing import load_checkpoint
+    from train import PPO_DEFAULTS, build_vec_env
+
+    trial_dir = os.path.join(sweep_dir, trial["id"])
+    os.makedirs(trial_dir, exist_ok=True)
+    status_path = os.path.join(trial_dir, "status.json")
+    checkpoint = os.path.join(trial_dir, "model.zip")
+    status = _read_json(status_path) or {**trial, "state": "pending", "rungs": [], "checkpoint": checkpoint}
+    early_stopping = spec["early_stopping"] and {**EARLY_STOPPING_DEFAULTS, **spec["early_stopping"]}
+
+    env = build_vec_env(spec["vec_env"], spec["n_envs"], spec["env_workers"], trial["seed"], spec["track_pool"],
+                        env_kwargs=spec["env_kwargs"])
+    try:
+        if status["rungs"] and os.path.exists(checkpoint):
+            # Interrupted earlier, go on from the last rung with freshly reset envs
+            model = load_checkpoint(checkpoint, env=env)
+            if model.num_timesteps > status["rungs"][-1]["timesteps"]:
+                # Stopped between saving a checkpoint and its status, score it again
+                score, finish_rate = _score(model, spec)
+                status["rungs"].append({"timesteps": model.num_timesteps, "score": score,
+                                        "finish_rate": finish_rate, "train_s": None})
+        else:
+            status["rungs"] = []
+            model = PPO("MlpPolicy", env, seed=trial["seed"], verbose=0, **{**PPO_DEFAULTS, **trial["params"]})
+        status["state"] = "running"
+        _write_json(status_path, status)
+
+        while model.num_timesteps < spec["timesteps"]:
+            start_time = time.perf_counter()
+            model.learn(min(spec["eval_every"], spec["timesteps"] - model.num_timesteps), reset_num_timesteps=False)
+            train_time = time.perf_counter() - start_time
+            score, finish_rate = _score(model, spec)
+
+            # The checkpoint first, so a status naming a rung always has its model
+            tmp_checkpoint = os.path.join(trial_dir, "model.tmp.zip")
+            model.save(tmp_checkpoint)
+            os.replace(tmp_checkpoint, checkpoint)
+            status["rungs"].append({"timesteps": model.num_timesteps, "score": score,
+                                    "finish_rate": finish_rate, "train_s": train_time})
+            _write_json(status_path, status)
+
+            finishing = model.num_timesteps >= spec["timesteps"]
+            if not finishing and should_stop(sweep_dir, trial["id"], len(status["rungs"]) - 1, score, early_stopping):
+                status["state"] = "stopped"
+                break
+        else:
+            status["state"] = "completed"
+    except Exception as error:
+        # One bad combination, e.g. an invalid batch size, must not end the sweep
+        status["state"] = "failed"
+        status["error"] = repr(error)
+    finally:
+        env.close()
+    _write_json(status_path, status)
+    return status
+
+
+def _init_worker(cpu_sets, threads):
+    import torch
+    # Each worker takes its own CPUs, env worker processes it starts inherit them
+    cpus = cpu_sets.get()
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+
+
+def _cpu_sets(n_workers, threads):
+    if not hasattr(os, "sched_setaffinity"):
+        return [None] * n_workers  # No pinning on this platform, the thread limit still applies
+    cpus = sorted(os.sched_getaffinity(0))
+    return [[cpus[(k * threads + t) % len(cpus)] for t in range(threads)] for k in range(n_workers)]
+
+
+def run_sweep(spec, sweep_dir, n_workers=None, threads=1):
+    """Run, or resume, every unfinished trial of a sweep and return the ranked results."""
+    os.makedirs(sweep_dir, exist_ok=True)
+    sweep_path = os.path.join(sweep_dir, "sweep.json")
+    saved = _read_json(sweep_path)
+    if saved is not None:
+        # Resuming: the trials were drawn when the sweep started
+        spec, trials = saved["spec"], saved["trials"]
+    else:
+        spec = {**SPEC_DEFAULTS, **spec}
+        trials = expand_trials(spec)
+        _write_json(sweep_path, {"spec": spec, "trials": trials})
+
+    pending = []
+    for trial in trials:
+        status = _read_json(os.path.join(sweep_dir, trial["id"], "status.json"))
+        if status is None or status["state"] not in FINAL_STATES:
+            pending.append(trial)
+    print(f"{len(trials)} trials, {len(trials) - len(pending)} already finished")
+
+    if pending:
+        if n_workers is None:
+            n_workers = max(1, len(os.sched_getaffinity(0)) // threads if hasattr(os, "sched_getaffinity")
+                            else os.cpu_count() // threads)
+        n_workers = min(n_workers, len(pending))
+        context = mp.get_context("spawn")
+        cpu_sets = context.Queue()
+        for cpus in _cpu_sets(n_workers, threads):
+            cpu_sets.put(cpus)
+        # Not a multiprocessing.Pool: its daemonic workers could not start shm or subproc env workers
+        with concurrent.futures.ProcessPoolExecutor(n_workers, mp_context=context, initializer=_init_worker,
+                                                    initargs=(cpu_sets, threads)) as pool:
+            futures = [pool.submit(run_trial, sweep_dir, trial, spec) for trial in pending]
+            for future in concurrent.futures.as_completed(futures):
+                status = future.result()
+                score = status["rungs"][-1]["score"] if status["rungs"] else float("nan")
+                print(f"{status['id']} {status['state']} after {len(status['rungs'])} rungs, score {score:.1f}")
+
+    table = results_table(sweep_dir)
+    write_table(table, os.path.join(sweep_dir, "results.csv"))
+    return table
+
+
+def results_table(sweep_dir):
+    """Rows for every trial started, completed ones first, each group by descending last score."""
+    rows = []
+    for path in sorted(glob.glob(os.path.join(sweep_dir, "trial_*", "status.json"))):
+        status = _read_json(path)
+        last = status["rungs"][-1] if status["rungs"] else {}
+        rows.append({
+            "trial": status["id"],
+            "state": status["state"],
+            "timesteps": last.get("timesteps", 0),
+            "score": last.get("score"),
+            "finish_rate": last.get("finish_rate"),
+            "checkpoint": status["checkpoint"] if status["rungs"] else None,
+            "params": status["params"],
+        })
+    rows.sort(key=lambda row: (row["state"] != "completed", row["score"] is None, -(row["score"] or 0)))
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+    return rows
+
+
+def write_table(table, path):
+    param_names = list(dict.fromkeys(name for row in table for name in row["params"]))
+    fields = ["rank", "trial", "state", "timesteps", "score", "finish_rate", "checkpoint"] + param_names
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for row in table:
+            writer.writerow({**{field: row[field] for field in fields[:7]}, **row["params"]})
+
+
+def print_table(table):
+    print(f"{'rank':>4}  {'trial':10s} {'state':10s} {'steps':>8} {'score':>8} {'finish':>7}  params / checkpoint")
+    for row in table:
+        score = f"{row['score']:.1f}" if row["score"] is not None else "-"
+        finish = f"{row['finish_rate']:.0%}" if row["finish_rate"] is not None else "-"
+        params = " ".join(f"{name}={value}" for name, value in row["params"].items())
+        print(f"{row['rank']:>4}  {row['trial']:10s} {row['state']:10s} {row['timesteps']:>8} {score:>8} "
+              f"{finish:>7}  {params}")
+        if row["checkpoint"]:
+            print(f"{'':>6}{row['checkpoint']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel PPO hyperparameter sweeps")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Start a sweep, or resume the one in the directory")
+    run_parser.add_argument("spec", help="Sweep spec JSON, ignored when resuming")
+    run_parser.add_argument("directory")
+    run_parser.add_argument("--workers", type=int, default=None,
+                            help="Trials run in parallel (default: available CPUs / --threads)")
+    run_parser.add_argument("--threads", type=int, default=1, help="CPUs and torch threads per trial")
+    table_parser = subparsers.add_parser("table", help="Print the ranked results of a sweep")
+    table_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        with open(args.spec) as f:
+            sweep_spec = json.load(f)
+        print_table(run_sweep(sweep_spec, args.directory, args.workers, args.threads))
+    else:
+        print_table(results_table(args.directory))
@@ -0,0 +1,217 @@
+"""
+Training telemetry: throughput, rollout versus update time and episode outcomes.
+
+    model.learn(20000, callback=TelemetryCallback("metrics.jsonl"))
+    python train.py --telemetry metrics.csv
+
+One record per PPO iteration, a rollout and the gradient update after it, is
+appended to a JSON lines file, or a CSV file if the path ends in .csv:
+
+    timesteps, iteration    counters at the end of the iteration
+    rollout_s, update_s     wall time collecting the rollout and training on it
+    update_fraction         update_s / (rollout_s + update_s), above 0.5 the
+                            run is learner-bound, below collection-bound
+    steps_per_sec           env steps over the whole iteration
+    rollout_steps_per_sec   env steps over the rollout alone
+    episodes                episodes ended during the rollout
+    return_*, length_*      mean, min, p10, p50, p90 and max over them
+    off_track_rate          off-track steps per env step
+    car_collision_rate      likewise for cars hitting each other, CarMultiEnv
+    finish_rate             finished episodes per ended episode
+    truncated_rate          truncated episodes per ended episode
+    <reason>_rate           likewise for each CarEnvCore.TRUNCATION_REASONS
+    steps_saved             steps the truncated episodes had left before
+                            max_steps, see CarEnvCore
+
+Episode events come from the off_track, finished, car_collision and
+truncation_reason entries the envs put in info. Records queue in a bounded
+buffer and a background thread appends them to the file, so the training loop
+never waits on the disk.
+"""
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from CarEnvCore import TRUNCATION_REASONS
+
+PERCENTILES = (10, 50, 90)
+
+
+class MetricsWriter:
+    """
+    Appends dict records to a JSON lines or CSV file from a background thread.
+
+    :param path: Output file, CSV if it ends in .csv. Existing files are appended to.
+    :param max_pending: Records buffered at most, further records are dropped and counted
+    :param flush_interval: Seconds between writes of the buffered records
+    """
+
+    def __init__(self, path, max_pending=1000, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._csv = path.endswith(".csv")
+        self._fields = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write what is still buffered and stop the thread."""
+        self._closed.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not records:
+            return
+        with open(self.path, "a", newline="") as file:
+            if not self._csv:
+                file.writelines(json.dumps(record) + "\n" for record in records)
+                return
+            if self._fields is None:
+                self._fields = self._csv_fields(records[0])
+                if file.tell() == 0:
+                    csv.writer(file).writerow(self._fields)
+            csv.DictWriter(file, self._fields, extrasaction="ignore").writerows(records)
+
+    def _csv_fields(self, record):
+        # Keep the header of a file being appended to, so its columns stay aligned
+        if os.path.getsize(self.path) > 0:
+            with open(self.path, newline="") as file:
+                return next(csv.reader(file))
+        return list(record)
+
+
+def _distribution(prefix, values):
+    if len(values) == 0:
+        return {f"{prefix}_{stat}": None for stat in ("mean", "min", *(f"p{q}" for q in PERCENTILES), "max")}
+    values = np.asarray(values, dtype=np.float64)
+    stats = {f"{prefix}_mean": float(values.mean()), f"{prefix}_min": float(values.min())}
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"{prefix}_p{q}"] = float(value)
+    stats[f"{prefix}_max"] = float(values.max())
+    return stats
+
+
+class TelemetryCallback(BaseCallback):
+    """
+    Writes a metrics record per rollout and update, see the module docstring.
+
+    :param path: JSON lines or CSV output file
+    :param max_pending: See MetricsWriter
+    :param flush_interval: See MetricsWriter
+    """
+
+    def __init__(self, path, max_pending=1000, flush_interval=5.0, verbose=0):
+        super().__init__(verbose)
+        self.path = path
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.writer = None
+
+    def _on_training_start(self):
+        self.writer = MetricsWriter(self.path, self.max_pending, self.flush_interval)
+        n_envs = self.training_env.num_envs
+        # Episodes can span rollouts, so the running sums survive them
+        self._returns = np.zeros(n_envs)
+        self._lengths = np.zeros(n_envs, dtype=np.int64)
+        self._iteration = 0
+        self._rollout_start = None
+        self._rollout_end = None
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self._rollout_end is not None:
+            self._write_record(now)  # The previous iteration's update just ended
+        self._rollout_start = now
+        self._rollout_end = None
+        self._start_timesteps = self.num_timesteps
+        self._episode_returns = []
+        self._episode_lengths = []
+        self._finished = 0
+        self._truncated = 0
+        self._truncation_reasons = dict.fromkeys(TRUNCATION_REASONS, 0)
+        self._steps_saved = 0
+        self._off_track = 0
+        self._car_collisions = 0
+
+    def _on_step(self):
+        rewards, dones, infos = self.locals["rewards"], self.locals["dones"], self.locals["infos"]
+        self._returns += rewards
+        self._lengths += 1
+        for info in infos:
+            if info:
+                self._off_track += "off_track" in info
+                self._car_collisions += "car_collision" in info
+        for env_idx in np.flatnonzero(dones):
+            info = infos[env_idx]
+            self._episode_returns.append(float(self._returns[env_idx]))
+            self._episode_lengths.append(int(self._lengths[env_idx]))
+            self._finished += "finished" in info
+            self._truncated += bool(info.get("TimeLimit.truncated", False))
+            if "truncation_reason" in info:
+                self._truncation_reasons[info["truncation_reason"]] += 1
+                self._steps_saved += info.get("steps_saved", 0)
+            self._returns[env_idx] = 0
+            self._lengths[env_idx] = 0
+        return True
+
+    def _on_rollout_end(self):
+        self._rollout_end = time.perf_counter()
+
+    def _on_training_end(self):
+        if self._rollout_end is not None:
+            self._write_record(time.perf_counter())
+        self.writer.close()
+        if self.writer.dropped and self.verbose:
+            print(f"Telemetry: {self.writer.dropped} records dropped, the writer fell behind")
+
+    def _write_record(self, update_end):
+        self._iteration += 1
+        rollout_s = self._rollout_end - self._rollout_start
+        update_s = update_end - self._rollout_end
+        steps = self.num_timesteps - self._start_timesteps
+        episodes = len(self._episode_returns)
+        record = {
+            "time": time.time(),
+            "timesteps": self.num_timesteps,
+            "iteration": self._iteration,
+            "rollout_s": rollout_s,
+            "update_s": update_s,
+            "update_fraction": update_s / (rollout_s + update_s),
+            "steps_per_sec": steps / (rollout_s + update_s),
+            "rollout_steps_per_sec": steps / rollout_s,
+            "episodes": episodes,
+            **_distribution("return", self._episode_returns),
+            **_distribution("length", self._episode_lengths),
+            "off_track_rate": self._off_track / steps,
+            "car_collision_rate": self._car_collisions / steps,
+            "finish_rate": self._finished / episodes if episodes else None,
+            "truncated_rate": self._truncated / episodes if episodes else None,
+            **{f"{reason}_rate": n / episodes if episodes else None for reason, n in self._truncation_reasons.items()},
+            "steps_saved": self._steps_saved,
+        }
+        self.writer.write(record)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to this directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def model_path():
+    """A trained checkpoint of the curved-track env shipped with the repository."""
+    return os.path.join(ROOT, "car_race_model9.zip")
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from dataset import ShardWriter, TransitionDataset
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    # 100 transitions over 7 shards, each row's obs and action hold its own index
+    writer = ShardWriter(str(tmp_path), obs_size=5, shard_size=16)
+    rows = np.arange(100)
+    obs = np.repeat(rows[:, None], 5, axis=1).astype(np.float32)
+    zeros = np.zeros(100, dtype=bool)
+    for start in range(0, 100, 30):
+        batch = slice(start, start + 30)
+        writer.add(obs[batch], rows[batch], rows[batch].astype(np.float32), obs[batch] + 1, zeros[batch], zeros[batch])
+    writer.close()
+    return TransitionDataset(str(tmp_path))
+
+
+def test_gather_keeps_the_order_of_indices(dataset):
+    indices = np.array([97, 3, 50, 3, 16, 15, 80])
+    batch = dataset.gather(indices)
+    np.testing.assert_array_equal(batch["action"], indices)
+    np.testing.assert_array_equal(batch["obs"][:, 0], indices)
+    np.testing.assert_array_equal(batch["next_obs"][:, 4], indices + 1)
+
+
+def test_minibatches_follow_the_drawn_permutation(dataset):
+    order = np.random.default_rng(0).permutation(len(dataset))
+    batches = list(dataset.minibatches(32, seed=0))
+    assert [len(batch["action"]) for batch in batches] == [32, 32, 32, 4]
+    np.testing.assert_array_equal(np.concatenate([batch["action"] for batch in batches]), order)
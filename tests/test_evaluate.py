@@ -0,0 +1,39 @@
+import os
+import shutil
+
+import numpy as np
+
+import evaluate
+from conftest import ROOT
+from model_registry import ModelRegistry
+
+
+class RightTurner:
+    def predict(self, observations, deterministic=True):
+        return np.ones(len(observations), dtype=np.int64), None
+
+
+def test_evaluation_counts_off_track_steps_under_action_repeat():
+    seeds = [0, 1]
+    records = evaluate.run_episodes(RightTurner(), "custom", seeds, 60, {"action_repeat": 3})
+    for seed, record in zip(seeds, records):
+        env = evaluate.make_env("custom", seed, {"action_repeat": 3})
+        env.reset(seed=seed)
+        off_track = 0
+        for _ in range(record["steps"]):
+            # With action_repeat the reward of an off-track step sums several substeps, mostly not -10
+            _, _, _, _, info = env.step(1)
+            off_track += "off_track" in info
+        assert off_track > 0
+        assert record["collisions"] == off_track
+        assert not record["finished"]
+
+
+
+def test_leaderboard_uses_the_registered_env_kwargs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The workers read the default index of their working directory
+    shutil.copy(os.path.join(ROOT, "car_race_model9.zip"), "model.zip")
+    ModelRegistry().register("model.zip", env_id="custom", env_kwargs={"max_steps": 5})
+    row, = evaluate.evaluate(["model.zip"], n_episodes=2, n_workers=1)
+    assert row["env"] == "custom"
+    assert row["finish_rate"] == 0  # Truncated after 5 steps, long before the finish line
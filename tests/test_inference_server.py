@@ -0,0 +1,77 @@
+import threading
+
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+from inference_server import InferenceClient, InferenceServer, serve_unix
+
+
+class NanRejectingModel:
+    """Stands in for PPO: action 1 for every row, an error for NaN observations."""
+
+    observation_space = spaces.Box(-np.inf, np.inf, shape=(5,), dtype=np.float32)
+    action_space = spaces.Discrete(2)
+
+    def predict(self, observations, deterministic=True):
+        if np.isnan(observations).any():
+            raise FloatingPointError("NaN observation")
+        return np.ones(len(observations), dtype=np.int64), None
+
+
+@pytest.fixture
+def server():
+    # A long wait so concurrent requests land in the same batch
+    server = InferenceServer(None, max_wait_ms=100, model=NanRejectingModel()).start()
+    yield server
+    server.stop()
+
+
+def predict_concurrently(server, requests):
+    results = {}
+
+    def call(name, observations):
+        try:
+            results[name] = server.predict(observations)[0]
+        except Exception as error:
+            results[name] = error
+
+    threads = [threading.Thread(target=call, args=item) for item in requests.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_bad_shape_is_rejected_without_failing_the_batch(server):
+    good = np.zeros((3, 5), dtype=np.float32)
+    results = predict_concurrently(server, {"good": good, "bad": np.zeros((2, 7))})
+    np.testing.assert_array_equal(results["good"], [1, 1, 1])
+    assert isinstance(results["bad"], ValueError)
+
+
+def test_failing_request_does_not_fail_its_batch(server):
+    good = np.zeros((3, 5), dtype=np.float32)
+    results = predict_concurrently(server, {"good": good, "nan": np.full((1, 5), np.nan)})
+    np.testing.assert_array_equal(results["good"], [1, 1, 1])
+    assert isinstance(results["nan"], FloatingPointError)
+
+
+def test_socket_errors_are_sent_back(server, tmp_path):
+    socket_path = str(tmp_path / "policy.sock")
+    unix_server = serve_unix(server, socket_path)
+    threading.Thread(target=unix_server.serve_forever, daemon=True).start()
+    client = InferenceClient(socket_path)
+    try:
+        with pytest.raises(RuntimeError, match="NaN observation"):
+            client.predict(np.full((2, 5), np.nan))
+        # The connection is still usable
+        np.testing.assert_array_equal(client.predict(np.zeros((2, 5)))[0], [1, 1])
+        assert client.predict(np.zeros(5))[0] == 1
+        with pytest.raises(ValueError):
+            client.predict(np.zeros((2, 3)))
+    finally:
+        client.close()
+        unix_server.shutdown()
+        unix_server.server_close()
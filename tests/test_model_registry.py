@@ -0,0 +1,83 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import ROOT
+from model_registry import ModelRegistry, file_hash
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    for name, source in (("a", "car_race_model1.zip"), ("b", "car_race_model2.zip"), ("c", "car_race_model3.zip")):
+        shutil.copy(os.path.join(ROOT, source), tmp_path / f"{name}.zip")
+    return tmp_path
+
+
+def test_rewritten_path_moves_to_its_new_hash(checkpoints):
+    registry = ModelRegistry(str(checkpoints / "index.json"))
+    a, b = str(checkpoints / "a.zip"), str(checkpoints / "b.zip")
+    hash_a, hash_b = registry.register(a), registry.register(b)
+    copy = str(checkpoints / "copy.zip")
+    shutil.copy(a, copy)
+    assert registry.register(copy) == hash_a
+
+    shutil.copy(b, a)
+    assert registry.register(a) == hash_b
+    assert registry.entries[hash_a]["paths"] == [copy]
+    assert set(registry.entries[hash_b]["paths"]) == {a, b}
+
+    # The last file with the old content is gone, and so is its entry
+    os.remove(copy)
+    shutil.copy(b, copy)
+    registry.register(copy)
+    assert hash_a not in registry.entries
+    assert ModelRegistry(str(checkpoints / "index.json")).entries.keys() == registry.entries.keys()
+
+
+def test_load_verifies_the_hash(checkpoints):
+    registry = ModelRegistry(str(checkpoints / "index.json"))
+    a = str(checkpoints / "a.zip")
+    old_hash = registry.register(a)
+    stat = os.stat(a)
+
+    # Same size and mtime, different content: only hashing notices
+    shutil.copy(checkpoints / "c.zip", a)
+    os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    if os.stat(a).st_size != stat.st_size:
+        pytest.skip("The checkpoints differ in size")
+    assert registry.register(a) == old_hash
+
+    registry.load(a)
+    new_hash = file_hash(a)
+    assert new_hash in registry._models
+    assert old_hash not in registry.entries
+    with pytest.raises(KeyError):
+        registry.load(old_hash)
+
+
+@pytest.mark.parametrize("source, env_id", [("car_race_model.zip", "straight"), ("car_race_model6.zip", "straight"),
+                                            ("car_race_model7.zip", "turn"), ("car_race_model8.zip", "turn"),
+                                            ("car_race_model9.zip", "custom")])
+def test_legacy_checkpoints_get_their_env_inferred(tmp_path, source, env_id):
+    registry = ModelRegistry(str(tmp_path / "index.json"))
+    entry = registry.get(os.path.join(ROOT, source))
+    assert entry["env_id"] == env_id
+    assert entry["env_kwargs"] == {}
+
+
+def test_unrecognised_observation_spaces_need_an_explicit_env(tmp_path):
+    from stable_baselines3 import PPO
+    from CarEnvCustom import SimpleCarRacingEnv
+
+    env_kwargs = {"ray_angles": [-0.5, 0.0, 0.5], "ray_range": 10.0}
+    path = str(tmp_path / "rays.zip")
+    PPO("MlpPolicy", SimpleCarRacingEnv(**env_kwargs), n_steps=64, batch_size=64, device="cpu").save(path)
+    registry = ModelRegistry(str(tmp_path / "index.json"))
+    with pytest.raises(ValueError):
+        registry.register(path)
+
+    registry.register(path, env_id="custom", env_kwargs=env_kwargs)
+    entry = ModelRegistry(str(tmp_path / "index.json")).get(path)
+    assert entry["env_id"] == "custom"
+    assert entry["env_kwargs"] == env_kwargs
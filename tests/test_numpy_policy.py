@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import torch
+from stable_baselines3 import PPO
+
+from numpy_policy import NumpyPolicy, check_export, export_policy
+
+
+@pytest.fixture
+def exported(model_path, tmp_path):
+    return export_policy(model_path, str(tmp_path / "policy.npz"))
+
+
+def random_observations(space, n, seed=0):
+    return np.random.default_rng(seed).uniform(space.low, space.high, size=(n, *space.shape)).astype(np.float32)
+
+
+def test_export_matches_ppo_predict(model_path, exported):
+    assert check_export(model_path, exported, 2000) == 0
+
+    model = PPO.load(model_path, device="cpu")
+    policy = NumpyPolicy.load(exported)
+    for observation in random_observations(model.observation_space, 50):
+        assert policy.predict(observation)[0] == model.predict(observation, deterministic=True)[0]
+
+
+def test_sampled_actions_follow_the_action_probabilities(model_path, exported):
+    model = PPO.load(model_path, device="cpu")
+    observations = random_observations(model.observation_space, 6, seed=1)
+    with torch.no_grad():
+        probs = model.policy.get_distribution(torch.as_tensor(observations)).distribution.probs.numpy()
+
+    policy = NumpyPolicy.load(exported, seed=0)
+    n_draws = 5000
+    counts = np.zeros_like(probs)
+    for _ in range(n_draws):
+        actions, _ = policy.predict(observations, deterministic=False)
+        counts[np.arange(len(observations)), actions] += 1
+    np.testing.assert_allclose(counts / n_draws, probs, atol=0.03)
+
+
+def test_sampling_is_seeded(exported):
+    observations = np.zeros((200, 5), dtype=np.float32)
+    observations[:, 3:] = 2.5
+    first = NumpyPolicy.load(exported, seed=3).predict(observations, deterministic=False)[0]
+    second = NumpyPolicy.load(exported, seed=3).predict(observations, deterministic=False)[0]
+    np.testing.assert_array_equal(first, second)
+
+
+def test_box_actions(tmp_path):
+    model = PPO("MlpPolicy", "Pendulum-v1", device="cpu", seed=0)
+    path = str(tmp_path / "pendulum.zip")
+    model.save(path)
+    policy = NumpyPolicy.load(export_policy(path, str(tmp_path / "pendulum.npz")), seed=0)
+
+    observations = random_observations(model.observation_space, 100)
+    expected, _ = model.predict(observations, deterministic=True)
+    np.testing.assert_allclose(policy.predict(observations)[0], expected, atol=1e-5)
+    sampled, _ = policy.predict(observations, deterministic=False)
+    assert not np.allclose(sampled, expected)
+    assert np.all((sampled >= -2) & (sampled <= 2))
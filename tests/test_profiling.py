@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from CarEnvCustom import SimpleCarRacingEnv
+from CarVecEnv import SimpleCarRacingVecEnv
+from profiling import PHASES, StepProfiler, VecStepProfiler
+
+
+@pytest.mark.parametrize("action_repeat", [1, 4])
+def test_calls_count_steps_not_substeps(action_repeat):
+    np.random.seed(0)
+    env = StepProfiler(SimpleCarRacingEnv(action_repeat=action_repeat))
+    env.reset(seed=0)
+    substeps = 0
+    for i in range(300):
+        _, _, done, truncated, info = env.step(i % 2)
+        substeps += info.get("substeps", 1)
+        if done or truncated:
+            env.reset()
+    summary = env.stats.summary()
+    assert summary["calls"] == 300
+    # The action phase still laps once per substep
+    assert sum(env.stats.histograms[PHASES[0]]) == substeps
+
+
+def test_vec_calls_count_step_wait_calls():
+    env = VecStepProfiler(SimpleCarRacingVecEnv(4, action_repeat=3))
+    env.reset()
+    for _ in range(50):
+        env.step(np.ones(4, dtype=np.int64))
+    summary = env.stats.summary()
+    assert summary["calls"] == 50
+    assert summary["steps"] == 200
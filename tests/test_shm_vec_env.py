@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from train import build_vec_env
+
+
+@pytest.fixture(scope="module")
+def shm_env():
+    env = build_vec_env("shm", 6, n_workers=3, seed=0)
+    yield env
+    env.close()
+
+
+def test_matches_dummy_vec_env(shm_env):
+    dummy = build_vec_env("dummy", 6, seed=0)
+    np.testing.assert_array_equal(dummy.reset(), shm_env.reset())
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        actions = rng.integers(2, size=6)
+        expected, actual = dummy.step(actions), shm_env.step(actions)
+        for a, b in zip(expected[:3], actual[:3]):
+            np.testing.assert_array_equal(a, b)
+
+
+def test_answers_follow_the_order_of_indices(shm_env):
+    for i in range(6):
+        shm_env.set_attr("tag", i * 10, indices=[i])
+    # Spread over all three workers, out of order and with a repeat
+    assert shm_env.get_attr("tag", indices=[5, 0, 3, 2, 2]) == [50, 0, 30, 20, 20]
+    assert shm_env.env_method("get_wrapper_attr", "tag", indices=[4, 1]) == [40, 10]
+    assert shm_env.get_attr("tag") == [0, 10, 20, 30, 40, 50]
@@ -0,0 +1,46 @@
+import numpy as np
+
+import checkpointing
+import evaluate
+import sweep
+from checkpointing import load_checkpoint
+
+
+class RightTurner:
+    def predict(self, observations, deterministic=True):
+        return np.ones(len(observations), dtype=np.int64), None
+
+
+def test_sweep_resumes_with_fresh_envs_and_its_env_kwargs(tmp_path, monkeypatch):
+    spec = {**sweep.SPEC_DEFAULTS, "timesteps": 128, "eval_every": 64, "eval_episodes": 2, "eval_max_steps": 50,
+            "n_envs": 2, "env_kwargs": {"max_steps": 30}, "parameters": {"n_steps": 32, "batch_size": 32}}
+    trial = sweep.expand_trials(spec)[0]
+
+    scored = []
+    run_episodes = evaluate.run_episodes
+
+    def spy_run_episodes(model, env_id, seeds, max_steps, env_kwargs=None):
+        scored.append(env_kwargs)
+        return run_episodes(model, env_id, seeds, max_steps, env_kwargs)
+
+    monkeypatch.setattr(evaluate, "run_episodes", spy_run_episodes)
+    assert sweep.run_trial(str(tmp_path), trial, spec)["state"] == "completed"
+    assert scored and all(kwargs == {"max_steps": 30} for kwargs in scored)
+
+    loaded = []
+
+    def spy_load_checkpoint(*args, **kwargs):
+        model = load_checkpoint(*args, **kwargs)
+        loaded.append(model._last_obs)
+        return model
+
+    monkeypatch.setattr(checkpointing, "load_checkpoint", spy_load_checkpoint)
+    status = sweep.run_trial(str(tmp_path), trial, {**spec, "timesteps": 192})
+    assert status["state"] == "completed"
+    assert [rung["timesteps"] for rung in status["rungs"]] == [64, 128, 192]
+    assert loaded == [None]
+
+
+def test_env_kwargs_reach_the_evaluation_envs():
+    records = evaluate.run_episodes(RightTurner(), "custom", [0, 1, 2], 100, {"max_steps": 5})
+    assert [record["steps"] for record in records] == [5, 5, 5]
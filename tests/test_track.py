@@ -0,0 +1,43 @@
+import numpy as np
+
+from raycast import track_polylines
+
+from track_Custom import Track
+
+
+def original_left_boundary(track, x):
+    # The boundary of the original per-unit Track, for its default 100-long layout
+    curvatures = [track.curvatures[0]] * 50 + [track.curvatures[1]] * 50
+    curvature = curvatures[min(int(x), 99)]  # Negative x counts from the end of the list
+    if x >= 50:
+        return -track.width / 2 + curvature * (x - 50) + 50 * curvatures[0]
+    return -track.width / 2 + curvature * x
+
+
+def test_default_track_matches_the_original():
+    np.random.seed(0)
+    track = Track()
+    assert track.wrap_negative_x
+    xs = np.concatenate([np.linspace(-100.5, 130, 500), [-100, -51, -50.5, -50, -1, -0.5]])
+    expected = [original_left_boundary(track, x) for x in xs]
+    np.testing.assert_allclose(track.get_boundaries(xs)[0], expected)
+    np.testing.assert_allclose([track.boundaries(x)[0] for x in xs], expected)
+
+
+def test_custom_tracks_extend_their_first_segment():
+    track = Track(segments=[(30, 0.1), (40, -0.2)])
+    assert not track.wrap_negative_x
+    xs = np.linspace(-80, 0, 50)
+    np.testing.assert_allclose(track.get_boundaries(xs)[0], -track.width / 2 + 0.1 * xs)
+
+
+def test_ray_polylines_follow_the_wrapped_boundaries():
+    np.random.seed(1)
+    for track in (Track(), Track(segments=[(30.5, 0.1), (40, -0.2), (20, 0.05)], wrap_negative_x=True)):
+        x_knots, left, right = track_polylines(track)
+        assert np.all(np.diff(x_knots) >= 0)
+        # Off the jumps, which the knots trace as vertical steps
+        xs = np.array([-170, -120, -80.3, -60.4, -45.2, -1.5, -0.5, 0, 20, 55.5])
+        xs = xs[xs >= x_knots[0]]
+        np.testing.assert_allclose(np.interp(xs, x_knots, left), track.get_boundaries(xs)[0], atol=1e-9)
+        np.testing.assert_allclose(np.interp(xs, x_knots, right), track.get_boundaries(xs)[1], atol=1e-9)
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+from CarEnvCustom import SimpleCarRacingEnv
+from trajectory import COLUMNS, TrajectoryReader, TrajectoryRecorder
+
+
+def record_episodes(path, n_episodes=3, max_steps=40, chunk_size=16):
+    """Record a few episodes and return the frames as the env saw them."""
+    np.random.seed(0)
+    env = TrajectoryRecorder(SimpleCarRacingEnv(), str(path), chunk_size=chunk_size)
+    car = env.unwrapped
+    frames, starts = [], []
+
+    def snapshot(action, reward):
+        x, y = car.car_position
+        left, right = car.track.boundaries(x)
+        frames.append((x, y, car.angle, car.speed, action, reward, y - left, right - y))
+
+    rng = np.random.default_rng(0)
+    for episode in range(n_episodes):
+        starts.append(len(frames))
+        env.reset(seed=episode)
+        snapshot(-1, 0.0)
+        for _ in range(max_steps):
+            action = int(rng.integers(2))
+            _, reward, done, truncated, _ = env.step(action)
+            snapshot(action, reward)
+            if done or truncated:
+                break
+    return env, np.array(frames, dtype=np.float32), starts
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "run.carrec"
+    env, frames, starts = record_episodes(path)
+    track = env.unwrapped.track
+    env.close()
+
+    reader = TrajectoryReader(str(path))
+    assert len(reader) == len(frames)
+    for name, column in zip(COLUMNS, frames.T):
+        np.testing.assert_array_equal(reader.column(name), column)
+    assert reader.frame(len(frames) - 1) == dict(zip(COLUMNS, frames[-1].tolist()))
+    assert [reader.episode_range(e)[0] for e in range(len(reader.episodes))] == starts
+    assert reader.episode_of(starts[1]) == 1
+
+    xs = np.linspace(0, track.track_length, 50)
+    np.testing.assert_allclose(reader.track(0).get_boundaries(xs), track.get_boundaries(xs))
+
+
+def test_unfinished_recording_rebuilds_its_index(tmp_path):
+    path = tmp_path / "run.carrec"
+    env, frames, starts = record_episodes(path)
+    env._write_chunk()
+    env._file.close()  # As if the recorder died before close()
+
+    reader = TrajectoryReader(str(path))
+    assert len(reader) == len(frames)
+    np.testing.assert_array_equal(reader.column("x"), frames[:, 0])
+    assert [e["start"] for e in reader.episodes] == starts
+    assert reader.track(0) is None
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(os.urandom(64))
+    with pytest.raises(ValueError):
+        TrajectoryReader(str(path))
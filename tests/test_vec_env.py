@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from CarEnvCustom import SimpleCarRacingEnv
+from CarMultiEnv import MultiCarRacingVecEnv
+from CarVecEnv import SimpleCarRacingVecEnv
+from track_Custom import Track
+
+LIMIT_KEYS = ("TimeLimit.truncated", "truncation_reason", "steps_saved")
+
+
+def make_pair(n_envs, seed=3, **env_kwargs):
+    # The same random tracks for the scalar envs and the batched env
+    np.random.seed(seed)
+    tracks = [Track() for _ in range(n_envs)]
+    dummy = DummyVecEnv([lambda track=track: SimpleCarRacingEnv(track=track, **env_kwargs) for track in tracks])
+    return dummy, SimpleCarRacingVecEnv(n_envs, tracks=tracks, **env_kwargs)
+
+
+def driver_actions(env, rng, noise=0.35):
+    # Steer back towards the right most of the time, so episodes both finish and crash
+    angles = np.array(env.get_attr("angle"))
+    actions = ((angles > 0) & (angles < np.pi)).astype(np.int64)
+    flip = rng.random(len(actions)) < noise
+    actions[flip] = 1 - actions[flip]
+    return actions
+
+
+def assert_same_steps(dummy, batched, n_steps, seed=0):
+    """Step both envs with the same actions, return the number of episodes that ended."""
+    np.testing.assert_array_equal(dummy.reset(), batched.reset())
+    rng = np.random.default_rng(seed)
+    episodes = 0
+    for _ in range(n_steps):
+        actions = driver_actions(batched, rng)
+        expected, actual = dummy.step(actions), batched.step(actions)
+        for a, b in zip(expected[:3], actual[:3]):
+            np.testing.assert_array_equal(a, b)
+        for expected_info, info in zip(expected[3], actual[3]):
+            assert expected_info.keys() == info.keys()
+            for key in LIMIT_KEYS:
+                assert expected_info.get(key) == info.get(key)
+            if "terminal_observation" in expected_info:
+                np.testing.assert_array_equal(expected_info["terminal_observation"], info["terminal_observation"])
+                episodes += 1
+    return episodes
+
+
+@pytest.mark.parametrize("env_kwargs", [
+    {},
+    {"action_repeat": 3},
+    {"max_steps": 60, "stall_steps": 30, "progress_window": 20},
+    {"action_repeat": 2, "max_steps": 40, "stall_steps": 20},
+])
+def test_batched_env_matches_dummy_vec_env(env_kwargs):
+    dummy, batched = make_pair(8, **env_kwargs)
+    assert assert_same_steps(dummy, batched, 400) > 0
+
+
+def test_truncation_counters_match():
+    dummy, batched = make_pair(8, max_steps=50, stall_steps=30, progress_window=15)
+    assert_same_steps(dummy, batched, 300)
+    for reason, count in batched.truncations.items():
+        assert count == sum(env.truncations[reason] for env in dummy.envs)
+    assert batched.steps_saved == sum(env.steps_saved for env in dummy.envs)
+
+
+def test_env_method_reset_matches_dummy_vec_env():
+    dummy, batched = make_pair(3)
+    dummy.reset()
+    batched.reset()
+    rng = np.random.default_rng(1)
+    for _ in range(7):
+        actions = rng.integers(2, size=3)
+        dummy.step(actions)
+        batched.step(actions)
+
+    # Out of order on purpose
+    expected = dummy.env_method("reset", indices=[2, 0])
+    actual = batched.env_method("reset", indices=[2, 0])
+    for (expected_obs, expected_info), (obs, info) in zip(expected, actual):
+        np.testing.assert_array_equal(expected_obs, obs)
+        assert expected_info == info
+    actions = np.array([1, 0, 1])
+    np.testing.assert_array_equal(dummy.step(actions)[0], batched.step(actions)[0])
+
+
+def test_env_method_seed_and_unsupported_methods():
+    env = SimpleCarRacingVecEnv(3)
+    assert env.env_method("seed", 7, indices=[1]) == [None]
+    assert env._seeds == [None, 7, None]
+    assert env.env_method("get_wrapper_attr", "speed") == [1.0, 1.0, 1.0]
+    with pytest.raises(AttributeError, match="render"):
+        env.env_method("render")
+
+
+def test_batched_env_matches_dummy_vec_env_behind_the_start_line():
+    dummy, batched = make_pair(8)
+    # Starting points on every stretch of the wrapped default tracks, centred between their boundaries
+    x = np.array([-0.5, -1.0, -3.0, -30.0, -50.5, -51.0, -70.0, -130.0])
+    for i, track in enumerate(batched.tracks):
+        assert track.wrap_negative_x
+        start = (x[i], sum(track.boundaries(x[i])) / 2)
+        dummy.env_method("__setattr__", "start_position", start, indices=[i])
+        batched.start_positions[i] = start
+    assert assert_same_steps(dummy, batched, 200) > 0
+
+
+def test_multi_car_grid_starts_between_the_wrapped_boundaries():
+    np.random.seed(2)
+    env = MultiCarRacingVecEnv(60, n_opponents=0)  # Rows back to x = -58, past both jumps of the default track
+    x, y = env.start_positions.T
+    left, right = env.get_boundaries(x)
+    np.testing.assert_array_equal((left, right), env.track.get_boundaries(x))
+    assert np.all((left < y) & (y < right))
@@ -1,4 +1,6 @@
 # track.py
+import numpy as np
+
 TRACK_WIDTH = 5  # Width of the track
 STRAIGHT_LENGTH = 50  # Length of the straight section
 SLOPE = 0.5  # Slope of the turn (horizontal 1, vertical 0.3)
@@ -19,3 +21,9 @@ def left_boundary(x_position):
 def right_boundary(x_position):
     """Calculate the right boundary of the track at a given x position."""
     return track_center_y(x_position) + TRACK_WIDTH / 2
+
+def get_boundaries(x_positions):
+    """Calculate the (left, right) boundaries for an array of x positions."""
+    x_positions = np.asarray(x_positions, dtype=np.float64)
+    center_y = np.where(x_positions <= STRAIGHT_LENGTH, 0.0, SLOPE * (x_positions - STRAIGHT_LENGTH))
+    return center_y - TRACK_WIDTH / 2, center_y + TRACK_WIDTH / 2
@@ -1,96 +1,242 @@
+"""
+Curved tracks made of straight-sloped segments, for CarEnvCustom.
+
+Behind the start line, at negative x, the default two-segment track keeps
+the boundaries of the original Track, which looked up negative x positions in
+its per-unit curvature list from the end: x <= -1 takes the curvature at
+track_length + ceil(x), which is curvature_2 down to x > -track_length / 2 - 1
+and curvature_1 below that, with no accumulated offset. Below -track_length,
+where the original raised an IndexError, the first curvature is used. Cars
+only reach negative x by driving backwards over the start line or from
+MultiCarRacingVecEnv's starting grid.
+
+Tracks with custom segments extend their first segment behind the start line
+instead, so the boundaries continue the line they start on. wrap_negative_x
+picks either behaviour for any track. SimpleCarRacingVecEnv and the ray
+sensors follow the same flag.
+"""
+import bisect
+import math
+
 import numpy as np
-import matplotlib.pyplot as plt
+
+
+def random_segments(n_segments, segment_length=50, curvature_range=(-0.2, 0.2), rng=np.random):
+    """A list of (length, curvature) pairs with uniformly drawn curvatures."""
+    curvatures = rng.uniform(curvature_range[0], curvature_range[1], size=n_segments)
+    return [(segment_length, float(curvature)) for curvature in curvatures]
+
 
 class Track:
-    def __init__(self, track_length=100, uniform_width=5):
-        self.track_length = track_length
+    """
+    Track made of straight-sloped segments of uniform width.
+
+    :param track_length: Length of the default random two-segment track
+    :param uniform_width: Distance between the left and right boundaries
+    :param segments: Optional list of (length, curvature) pairs; overrides
+        track_length, which becomes the sum of the segment lengths
+    :param wrap_negative_x: Boundaries at x <= -1 as the original Track had
+        them, see the module docstring. By default only the default
+        two-segment track wraps.
+    """
+
+    # The car may leave the track ends, only the boundaries limit it
+    x_limits = None
+
+    def __init__(self, track_length=100, uniform_width=5, segments=None, wrap_negative_x=None):
         self.width = uniform_width
-        
-        # Set the two curvatures: curvature_1 and curvature_2
-        self.curvatures = self._generate_smooth_transition_curvatures()
+        self.custom_segments = segments is not None
+        self.wrap_negative_x = not self.custom_segments if wrap_negative_x is None else wrap_negative_x
+
+        # Default: the two curvatures curvature_1 and curvature_2
+        if segments is None:
+            segments = self._generate_smooth_transition_segments(track_length)
+        lengths, curvatures = zip(*segments)
+        self.segment_lengths = np.array(lengths, dtype=np.float64)
+        self.curvatures = np.array(curvatures, dtype=np.float64)
+        self.n_segments = len(self.curvatures)
+        if self.custom_segments:
+            total_length = float(self.segment_lengths.sum())
+            track_length = int(total_length) if total_length.is_integer() else total_length
+        self.track_length = track_length
+
+        # Precompute the segment tables once, the track never changes afterwards
+        self._build_boundary_tables()
 
     def get_width(self):
         return self.width
     
-    def _generate_smooth_transition_curvatures(self):
+    def _generate_smooth_transition_segments(self, track_length):
         curvature_1 = np.random.uniform(0.05, 0.2)  # Curvature for the first segment
         curvature_2 = np.random.uniform(-0.05, -0.2)  # Curvature for the second segment
 
-        # Initializing curvatures list
-        curvatures = []
-        segment_length = self.track_length // 2
+        # First segment: curvature_1, second segment: curvature_2 starting directly after it
+        segment_length = track_length // 2
+        return [(segment_length, curvature_1), (track_length - segment_length, curvature_2)]
+
+    def _build_boundary_tables(self):
+        # Where each segment starts and the centre line offset accumulated up to it
+        self.segment_starts = np.concatenate([[0.0], np.cumsum(self.segment_lengths)[:-1]])
+        self.segment_offsets = np.concatenate([[0.0], np.cumsum(self.curvatures * self.segment_lengths)[:-1]])
+        self._build_lookup_lists()
+
+        # The boundaries are straight within a segment, so their values at the
+        # segment starts and the track end describe the whole track exactly
+        self.x_knots = np.append(self.segment_starts, float(self.track_length))
+        self.left_boundaries, self.right_boundaries = self.get_boundaries(self.x_knots)
+        self.centerline = (self.left_boundaries + self.right_boundaries) / 2
+
+    def _build_lookup_lists(self):
+        # Plain floats for fast scalar lookups
+        self._starts_list = self.segment_starts.tolist()
+        self._curvature_list = self.curvatures.tolist()
+        self._offset_list = self.segment_offsets.tolist()
+
+    @classmethod
+    def from_tables(cls, tables, uniform_width, track_length, custom_segments=True):
+        """
+        Track backed by precomputed tables instead of generating its own.
 
-        # First segment: curvature_1
-        for i in range(segment_length):
-            curvatures.append(curvature_1)
+        The arrays are used as given, so views into a memory-mapped track pool
+        stay views and nothing is copied.
 
-        # Second segment: curvature_2, starting directly after curvature_1
-        for i in range(segment_length, self.track_length):
-            curvatures.append(curvature_2)
+        :param tables: Mapping with segment_lengths, curvatures, segment_starts,
+            segment_offsets, x_knots, left_boundaries, right_boundaries and centerline
+        :param uniform_width: Distance between the left and right boundaries
+        :param track_length: x position of the finish line
+        :param custom_segments: False for tracks laid out like the default one,
+            which keeps the observation bounds of the trained checkpoints and
+            the boundaries behind the start line, see wrap_negative_x
+        """
+        track = cls.__new__(cls)
+        track.width = uniform_width
+        track.custom_segments = custom_segments
+        track.wrap_negative_x = not custom_segments
+        track.track_length = track_length
+        for name in ("segment_lengths", "curvatures", "segment_starts", "segment_offsets",
+                     "x_knots", "left_boundaries", "right_boundaries", "centerline"):
+            setattr(track, name, tables[name])
+        track.n_segments = len(track.curvatures)
+        track._build_lookup_lists()
+        return track
 
-        return curvatures
+    def get_segment_index(self, x_position):
+        # Binary search over the segment starts; before the start and past the
+        # end the first and last segments are extended
+        index = bisect.bisect_right(self._starts_list, x_position) - 1
+        return min(max(index, 0), self.n_segments - 1)
+
+    def get_segment_indices(self, x_positions):
+        index = np.searchsorted(self.segment_starts, x_positions, side="right") - 1
+        return np.clip(index, 0, self.n_segments - 1)
 
     def get_curvature(self, x_position):
-        # Ensure x_position is within the bounds of the curvatures list
-        index = min(int(x_position), self.track_length - 1)
-        return self.curvatures[index]
+        return self._curvature_list[self.get_segment_index(x_position)]
+
+    def _centerline_terms(self, x_position):
+        # Linear interpolation from the start of the current segment, on plain
+        # floats since numpy scalar arithmetic is several times slower
+        x_position = float(x_position)
+        if x_position <= -1 and self.wrap_negative_x:
+            # Indexed the per-unit curvature list from its end, with no offset
+            index = self.get_segment_index(self.track_length + math.ceil(x_position))
+            return self._curvature_list[index] * x_position, 0.0
+        index = self.get_segment_index(x_position)
+        slope_term = self._curvature_list[index] * (x_position - self._starts_list[index])
+        return slope_term, self._offset_list[index]
+
+    def _centerline_terms_batch(self, x_positions):
+        # Vectorized version of _centerline_terms for an array of x positions
+        x_positions = np.asarray(x_positions, dtype=np.float64)
+        index = self.get_segment_indices(x_positions)
+        slope_term = self.curvatures[index] * (x_positions - self.segment_starts[index])
+        offset = self.segment_offsets[index]
+        if self.wrap_negative_x:
+            wrapped = x_positions <= -1
+            if np.any(wrapped):
+                wrapped_index = self.get_segment_indices(self.track_length + np.ceil(x_positions))
+                slope_term = np.where(wrapped, self.curvatures[wrapped_index] * x_positions, slope_term)
+                offset = np.where(wrapped, 0.0, offset)
+        return slope_term, offset
+
+    def wrapped_knots(self):
+        """
+        (x, left, right) knots of the boundaries from far behind the start line up to x = -1.
+
+        With wrap_negative_x every segment's curvature applies on one stretch
+        of x <= -1, through y = 0 at x = 0, and the boundaries jump between
+        the stretches. The knots hold both ends of every stretch, so they trace
+        the jumps as vertical steps, and end at the first segment's boundaries
+        at x = -1, where x > -1 continues. Empty without wrap_negative_x.
+        """
+        if not self.wrap_negative_x:
+            return np.empty(0), np.empty(0), np.empty(0)
+        # Segment i covers track_length + ceil(x) >= segment_starts[i], i.e. x > ceil(start - track_length) - 1
+        ends = np.append(np.ceil(self.segment_starts[1:] - self.track_length) - 1, -1.0)
+        ends = np.minimum(ends, -1.0)
+        starts = np.concatenate([[min(-2.0 * self.track_length, ends[0] - 1)], ends[:-1]])
+        stretches = starts < ends
+        knot_x = np.stack([starts[stretches], ends[stretches]], axis=1).ravel()
+        knot_y = np.repeat(self.curvatures[stretches], 2) * knot_x
+        # Back to the first segment, which x > -1 extends
+        knot_x = np.append(knot_x, -1.0)
+        knot_y = np.append(knot_y, self.curvatures[0] * (-1.0 - self.segment_starts[0]) + self.segment_offsets[0])
+        return knot_x, knot_y - self.width / 2, knot_y + self.width / 2
 
     def get_left_boundary(self, x_position):
-        # Adjust x_position by subtracting 50 if x_position is greater than or equal to 50
-        new_x = x_position
-        if x_position >= 50:
-            new_x -= 50
-        
-        # Calculate the left boundary based on the curvature at the adjusted x_position
-        curvature = self.get_curvature(x_position)
-        left_boundary = -self.width / 2 + curvature * new_x
-        
-        # Calculate the dynamic offset for the first 50 units based on curvature
-        if x_position >= 50:
-            offset = sum([self.get_curvature(x) * 1 for x in range(50)])  # Sum of curvature changes
-            left_boundary += offset
-            
-        return left_boundary
+        slope_term, offset = self._centerline_terms(x_position)
+        return -self.width / 2 + slope_term + offset
 
     def get_right_boundary(self, x_position):
-        # Adjust x_position by subtracting 50 if x_position is greater than or equal to 50
-        new_x = x_position
-        if x_position >= 50:
-            new_x -= 50
-        
-        # Calculate the right boundary based on the curvature at the adjusted x_position
-        curvature = self.get_curvature(x_position)
-        right_boundary = self.width / 2 + curvature * new_x
-        
-        # Calculate the dynamic offset for the first 50 units based on curvature
-        if x_position >= 50:
-            offset = sum([self.get_curvature(x) * 1 for x in range(50)])  # Sum of curvature changes
-            right_boundary += offset
-            
-        return right_boundary
-
-# # Instantiate the track object
-# track = Track(track_length=100, uniform_width=10)
-
-# # Generate x_positions for smooth plotting
-# x_positions = np.linspace(0, track.track_length, 1000)
-
-# # Calculate the left and right boundaries
-# left_boundaries = [track.get_left_boundary(x) for x in x_positions]
-# right_boundaries = [track.get_right_boundary(x) for x in x_positions]
-
-# # Middle curve (track centerline) is the average of the left and right boundaries
-# middle_curve = [(left + right) / 2 for left, right in zip(left_boundaries, right_boundaries)]
-
-# # Plot the track boundaries with the generated path and middle curve
-# plt.figure(figsize=(10, 6))
-# plt.plot(x_positions, middle_curve, label="Middle Curve", color='blue', linestyle='--')
-# plt.plot(x_positions, left_boundaries, label="Left Boundary", color='red')
-# plt.plot(x_positions, right_boundaries, label="Right Boundary", color='green')
-# plt.fill_between(x_positions, left_boundaries, right_boundaries, color='gray', alpha=0.5)
-# plt.xlabel('Track Position (x)')
-# plt.ylabel('Track Elevation (y)')
-# plt.title('Track Boundaries and Middle Curve Based on Curvature')
-# plt.legend()
-# plt.grid(True)
-# plt.show()
+        slope_term, offset = self._centerline_terms(x_position)
+        return self.width / 2 + slope_term + offset
+
+    def boundaries(self, x_position):
+        """Return the (left, right) boundaries at one x position with a single segment lookup."""
+        slope_term, offset = self._centerline_terms(x_position)
+        return -self.width / 2 + slope_term + offset, self.width / 2 + slope_term + offset
+
+    def get_boundaries(self, x_positions):
+        """Return (left, right) boundary arrays for an array of x positions."""
+        slope_term, offset = self._centerline_terms_batch(x_positions)
+        left = -self.width / 2 + slope_term + offset
+        right = self.width / 2 + slope_term + offset
+        return left, right
+
+    def get_y_range(self):
+        """Lowest and highest y the track reaches, for sizing observation spaces."""
+        if not self.custom_segments:
+            # The default track keeps the bounds the trained checkpoints were built with
+            return -self.width / 2, self.width / 2 + 20
+        return float(self.left_boundaries.min()), float(self.right_boundaries.max())
+
+
+def plot_track(track, n_points=1000):
+    """Plot the track boundaries and centre line with matplotlib."""
+    import matplotlib.pyplot as plt  # Only needed for plotting, keep it out of the env imports
+
+    # Generate x_positions for smooth plotting
+    x_positions = np.linspace(0, track.track_length, n_points)
+
+    # Calculate the left and right boundaries
+    left_boundaries, right_boundaries = track.get_boundaries(x_positions)
+
+    # Middle curve (track centerline) is the average of the left and right boundaries
+    middle_curve = (left_boundaries + right_boundaries) / 2
+
+    # Plot the track boundaries with the generated path and middle curve
+    plt.figure(figsize=(10, 6))
+    plt.plot(x_positions, middle_curve, label="Middle Curve", color='blue', linestyle='--')
+    plt.plot(x_positions, left_boundaries, label="Left Boundary", color='red')
+    plt.plot(x_positions, right_boundaries, label="Right Boundary", color='green')
+    plt.fill_between(x_positions, left_boundaries, right_boundaries, color='gray', alpha=0.5)
+    plt.xlabel('Track Position (x)')
+    plt.ylabel('Track Elevation (y)')
+    plt.title('Track Boundaries and Middle Curve Based on Curvature')
+    plt.legend()
+    plt.grid(True)
+    plt.show()
+
+
+if __name__ == "__main__":
+    plot_track(Track(track_length=100, uniform_width=10))
@@ -0,0 +1,183 @@
+"""
+Pre-baked pools of curved tracks, stored in one memory-mapped .npy file.
+
+    python track_pool.py track_pool.npy --tracks 10000 --seed 0
+    env = SimpleCarRacingEnv(track_pool="track_pool.npy")   # new track every reset()
+
+The file holds one fixed-size record per track: width, length, the segment
+curvatures and lengths, and the boundary tables at the segment knots. It is
+opened read-only with mmap_mode="r", so a Track built from it reads straight
+from the mapped pages. Every process opening the same file shares one copy in
+the OS page cache, and pickling a TrackPool only sends its path.
+"""
+import argparse
+
+import numpy as np
+from track_Custom import Track
+
+# Per-track tables with one value per segment, and at every knot (segment starts plus track end)
+SEGMENT_FIELDS = ("segment_lengths", "curvatures", "segment_starts", "segment_offsets")
+KNOT_FIELDS = ("x_knots", "left_boundaries", "right_boundaries", "centerline")
+TABLE_FIELDS = SEGMENT_FIELDS + KNOT_FIELDS
+
+
+def pool_dtype(n_segments):
+    return np.dtype(
+        [("width", "f8"), ("track_length", "f8"), ("custom_segments", "?")]
+        + [(name, "f8", (n_segments,)) for name in SEGMENT_FIELDS]
+        + [(name, "f8", (n_segments + 1,)) for name in KNOT_FIELDS]
+    )
+
+
+def build_tables(segment_lengths, curvatures, uniform_width=5, track_length=None):
+    """Track tables for many tracks at once, from (tracks, segments) length and curvature arrays.
+
+    Computed with the same formulas as Track, so a pooled track has exactly
+    the boundaries of Track(segments=...) with the same segments.
+    """
+    segment_lengths = np.asarray(segment_lengths, dtype=np.float64)
+    curvatures = np.asarray(curvatures, dtype=np.float64)
+    n_tracks, n_segments = curvatures.shape
+    if track_length is None:
+        track_length = segment_lengths.sum(axis=1)
+
+    zeros = np.zeros((n_tracks, 1))
+    starts = np.concatenate([zeros, np.cumsum(segment_lengths, axis=1)[:, :-1]], axis=1)
+    offsets = np.concatenate([zeros, np.cumsum(curvatures * segment_lengths, axis=1)[:, :-1]], axis=1)
+    x_knots = np.concatenate([starts, np.broadcast_to(track_length, (n_tracks,))[:, None]], axis=1)
+
+    # Knot k lies in segment k, the track end in the last segment
+    index = np.minimum(np.arange(n_segments + 1), n_segments - 1)
+    slope_term = curvatures[:, index] * (x_knots - starts[:, index])
+    left = -uniform_width / 2 + slope_term + offsets[:, index]
+    right = uniform_width / 2 + slope_term + offsets[:, index]
+    return {
+        "segment_lengths": segment_lengths,
+        "curvatures": curvatures,
+        "segment_starts": starts,
+        "segment_offsets": offsets,
+        "x_knots": x_knots,
+        "left_boundaries": left,
+        "right_boundaries": right,
+        "centerline": (left + right) / 2,
+    }
+
+
+def generate_track_pool(path, n_tracks, n_segments=None, segment_length=50, curvature_range=(-0.2, 0.2),
+                        track_length=100, uniform_width=5, seed=None):
+    """
+    Write n_tracks random tracks to a .npy file and return its path.
+
+    :param n_segments: None for tracks laid out like the default Track(),
+        two halves of track_length with the same curvature ranges, which keeps
+        the observation bounds of the trained checkpoints. Otherwise every track
+        has n_segments segments of segment_length, like random_segments().
+    :param curvature_range: Curvature range of the n_segments tracks
+    :param seed: Seed of the generator, the same seed writes the same pool
+    """
+    rng = np.random.default_rng(seed)
+    if n_segments is None:
+        half = track_length // 2
+        lengths = np.tile([half, track_length - half], (n_tracks, 1))
+        curvatures = np.stack([rng.uniform(0.05, 0.2, n_tracks), rng.uniform(-0.2, -0.05, n_tracks)], axis=1)
+        custom_segments = False
+    else:
+        lengths = np.full((n_tracks, n_segments), segment_length)
+        curvatures = rng.uniform(curvature_range[0], curvature_range[1], size=(n_tracks, n_segments))
+        custom_segments = True
+        track_length = None
+
+    tables = build_tables(lengths, curvatures, uniform_width, track_length)
+    records = np.zeros(n_tracks, dtype=pool_dtype(curvatures.shape[1]))
+    records["width"] = uniform_width
+    records["track_length"] = tables["x_knots"][:, -1]
+    records["custom_segments"] = custom_segments
+    for name, values in tables.items():
+        records[name] = values
+    np.save(path, records)
+    return path
+
+
+class TrackPool:
+    """
+    Read-only, memory-mapped view of a pool written by generate_track_pool().
+
+    Duck-types the parts of Track the envs size their observation space with
+    (track_length, get_width() and get_y_range()), taken over the whole pool.
+
+    :param path: .npy file of the pool
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = np.load(path, mmap_mode="r")
+        # Field views into the mapped file, nothing is read until it is indexed. Plain
+        # ndarray views of the same pages, np.memmap indexing is several times slower
+        fields = {name: self.records[name].view(np.ndarray) for name in self.records.dtype.names}
+        self.widths = fields["width"]
+        self.track_lengths = fields["track_length"]
+        self.custom_segments = fields["custom_segments"]
+        for name in TABLE_FIELDS:
+            setattr(self, name, fields[name])
+        self.n_segments = self.curvatures.shape[1]
+
+        # Pool-wide values, read once
+        self.max_width = float(self.widths.max())
+        self.track_length = float(self.track_lengths.max())
+        self._custom = bool(self.custom_segments.any())
+        starts = self.segment_starts
+        self.shared_starts = np.array(starts[0]) if bool((starts == starts[0]).all()) else None
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getstate__(self):
+        # Workers re-open the file and share its pages instead of receiving a copy
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def track(self, index):
+        """Track whose tables are views into the pool, nothing is copied."""
+        length = float(self.track_lengths[index])
+        return Track.from_tables(
+            {name: getattr(self, name)[index] for name in TABLE_FIELDS},
+            uniform_width=float(self.widths[index]),
+            track_length=int(length) if length.is_integer() else length,
+            custom_segments=bool(self.custom_segments[index]),
+        )
+
+    def sample(self, rng):
+        """A random (index, track) pair drawn with a numpy Generator."""
+        index = int(rng.integers(len(self)))
+        return index, self.track(index)
+
+    def get_width(self):
+        return self.max_width
+
+    def get_y_range(self):
+        """Lowest and highest y any track of the pool reaches."""
+        if not self._custom:
+            # Same bounds as the default Track, so the trained checkpoints fit
+            return -self.max_width / 2, self.max_width / 2 + 20
+        return float(self.left_boundaries.min()), float(self.right_boundaries.max())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a pool of random tracks to a .npy file")
+    parser.add_argument("path")
+    parser.add_argument("--tracks", type=int, default=10000)
+    parser.add_argument("--segments", type=int, default=None,
+                        help="Segments per track (default: the two-segment layout of Track())")
+    parser.add_argument("--segment-length", type=float, default=50)
+    parser.add_argument("--curvature-range", type=float, nargs=2, default=(-0.2, 0.2))
+    parser.add_argument("--track-length", type=int, default=100, help="Length of the two-segment tracks")
+    parser.add_argument("--width", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    generate_track_pool(args.path, args.tracks, args.segments, args.segment_length, tuple(args.curvature_range),
+                        args.track_length, args.width, args.seed)
+    pool = TrackPool(args.path)
+    print(f"Wrote {len(pool)} tracks with {pool.n_segments} segments to {args.path}")
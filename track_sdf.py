@@ -0,0 +1,216 @@
+"""
+Tracks baked into signed distance fields, for O(1) boundary queries anywhere.
+
+    track = SDFTrack(Track(), resolution=0.25)
+    env = SimpleCarRacingEnv(track=track)         # boundary distances from the grids
+    left, right = track.distances(x, y)           # scalars or arrays
+    direction, distance = track.centerline_direction(x, y)
+
+The backends measure boundary distances vertically, at the car's x, which
+only makes sense for a track that is a function y(x). SDFTrack stores, on a
+regular grid, the Euclidean distance from each point to the left boundary,
+the right boundary and the centre line, signed so that the track side is
+positive, plus their gradients. Every query is then a bilinear lookup,
+whatever the shape of the track.
+
+An SDFTrack is itself a track backend (see CarEnvCore). Its
+distances(x, y) replace the vertical distances in the observation and the
+off-track check of CarEnvCore and CarVecEnv. Everything else, like the
+boundaries used to clamp a car and the track tables, comes from the wrapped
+track.
+"""
+import numpy as np
+
+# Field planes of the grid, each distance followed by its x and y gradient
+FIELDS = ("left", "left_dx", "left_dy", "right", "right_dx", "right_dy", "centre", "centre_dx", "centre_dy")
+LEFT, RIGHT, CENTRE = FIELDS.index("left"), FIELDS.index("right"), FIELDS.index("centre")
+
+
+def polyline_distance(grid_x, grid_y, boundary_y, window):
+    """Distance from every grid point to the polyline through (grid_x, boundary_y).
+
+    The nearest point of a y(x) polyline is never farther away horizontally
+    than vertically, so only the segments within window columns are tried.
+    Beyond window columns the result is an upper bound.
+    """
+    n_columns = len(grid_x)
+    start_x, start_y = grid_x[:-1], boundary_y[:-1]
+    step_x, step_y = np.diff(grid_x), np.diff(boundary_y)
+    length2 = step_x * step_x + step_y * step_y
+    columns = np.arange(n_columns)
+
+    best = np.abs(grid_y[:, None] - boundary_y[None, :])  # Vertical distance, an upper bound
+    for offset in range(-window, window):
+        segment = columns + offset
+        valid = (segment >= 0) & (segment < n_columns - 1)
+        segment = np.clip(segment, 0, n_columns - 2)
+        px = grid_x - start_x[segment]
+        py = grid_y[:, None] - start_y[segment]
+        t = np.clip((px * step_x[segment] + py * step_y[segment]) / length2[segment], 0, 1)
+        dx = px - t * step_x[segment]
+        dy = py - t * step_y[segment]
+        distance = np.sqrt(dx * dx + dy * dy)
+        np.minimum(best, np.where(valid, distance, np.inf), out=best)
+    return best
+
+
+def bake_fields(track, resolution=0.25, margin=None):
+    """(fields, x0, y0) grids of FIELDS over the track plus margin, lower left corner at (x0, y0)."""
+    width = track.get_width()
+    margin = width if margin is None else margin
+    x_limits = track.x_limits if track.x_limits is not None else (0, track.track_length)
+    grid_x = np.arange(x_limits[0] - margin, x_limits[1] + margin + resolution, resolution)
+    left, right = track.get_boundaries(grid_x)
+    grid_y = np.arange(left.min() - margin, right.max() + margin + resolution, resolution)
+    centre = (left + right) / 2
+
+    # Exact within a track width of the line, farther out only the sign has to be right
+    window = int(np.ceil(max(width, margin) / resolution))
+    signed_left = polyline_distance(grid_x, grid_y, left, window) * np.sign(grid_y[:, None] - left)
+    signed_right = polyline_distance(grid_x, grid_y, right, window) * np.sign(right - grid_y[:, None])
+    signed_centre = polyline_distance(grid_x, grid_y, centre, window) * np.sign(grid_y[:, None] - centre)
+
+    planes = []
+    for field in (signed_left, signed_right, signed_centre):
+        gradient_y, gradient_x = np.gradient(field, resolution)
+        planes += [field, gradient_x, gradient_y]
+    return np.stack(planes).astype(np.float32), float(grid_x[0]), float(grid_y[0])
+
+
+class SDFTrack:
+    """
+    Track backend answering boundary queries from baked distance grids.
+
+    :param track: Any track backend, see CarEnvCore
+    :param resolution: Grid cell size in track units
+    :param margin: Grid extent beyond the track, one track width by default.
+        Farther out, queries read the grid's edge, which is off track.
+    """
+
+    def __init__(self, track, resolution=0.25, margin=None):
+        self.track = track
+        self.resolution = resolution
+        self.fields, self.x0, self.y0 = bake_fields(track, resolution, margin)
+        self.shape = self.fields.shape[1:]
+        # The four corners of both boundary distances per cell, so a scalar query reads one row
+        left, right = self.fields[LEFT].astype(np.float64), self.fields[RIGHT].astype(np.float64)
+        self._distance_corners = np.stack([
+            field[j:field.shape[0] - 1 + j, i:field.shape[1] - 1 + i]
+            for field in (left, right) for j in (0, 1) for i in (0, 1)
+        ], axis=-1)
+        self._max_i = self.shape[1] - 1.000001
+        self._max_j = self.shape[0] - 1.000001
+
+    def __getattr__(self, name):
+        # Everything else, e.g. the segment tables of a Track, comes from the wrapped track
+        if name == "track":
+            raise AttributeError(name)
+        return getattr(self.track, name)
+
+    @property
+    def track_length(self):
+        return self.track.track_length
+
+    @property
+    def x_limits(self):
+        return self.track.x_limits
+
+    def get_width(self):
+        return self.track.get_width()
+
+    def get_y_range(self):
+        return self.track.get_y_range()
+
+    def boundaries(self, x_position):
+        return self.track.boundaries(x_position)
+
+    def get_boundaries(self, x_positions):
+        return self.track.get_boundaries(x_positions)
+
+    def sample(self, planes, x, y):
+        """Bilinear lookup of the given field planes at points (x, y), shape (len(planes),) + x.shape."""
+        fx = np.clip((np.asarray(x, dtype=np.float64) - self.x0) / self.resolution, 0, self.shape[1] - 1.000001)
+        fy = np.clip((np.asarray(y, dtype=np.float64) - self.y0) / self.resolution, 0, self.shape[0] - 1.000001)
+        i, j = fx.astype(np.int64), fy.astype(np.int64)
+        tx, ty = fx - i, fy - j
+        grid = self.fields[planes]
+        bottom = grid[:, j, i] * (1 - tx) + grid[:, j, i + 1] * tx
+        top = grid[:, j + 1, i] * (1 - tx) + grid[:, j + 1, i + 1] * tx
+        return bottom * (1 - ty) + top * ty
+
+    def distances(self, x, y):
+        """Signed distances to the (left, right) boundaries, negative past that boundary."""
+        if isinstance(x, float) and isinstance(y, float):
+            return self._point_distances(x, y)
+        left, right = self.sample([LEFT, RIGHT], x, y)
+        return left[()], right[()]
+
+    def _point_distances(self, x, y):
+        # sample() on plain floats, numpy scalar arithmetic is several times slower
+        fx = min(max((x - self.x0) / self.resolution, 0.0), self._max_i)
+        fy = min(max((y - self.y0) / self.resolution, 0.0), self._max_j)
+        i, j = int(fx), int(fy)
+        tx, ty = fx - i, fy - j
+        l00, l01, l10, l11, r00, r01, r10, r11 = self._distance_corners[j, i].tolist()
+        left = (l00 * (1 - tx) + l01 * tx) * (1 - ty) + (l10 * (1 - tx) + l11 * tx) * ty
+        right = (r00 * (1 - tx) + r01 * tx) * (1 - ty) + (r10 * (1 - tx) + r11 * tx) * ty
+        return left, right
+
+    def signed_distance(self, x, y):
+        """Distance to the nearest boundary, positive on the track and negative off it."""
+        left, right = self.sample([LEFT, RIGHT], x, y)
+        return np.minimum(left, right)[()]
+
+    def off_track(self, x, y):
+        return self.signed_distance(x, y) < 0
+
+    def centerline_direction(self, x, y):
+        """Unit vector(s) (dx, dy) towards the nearest centre line point, and the distance to it."""
+        distance, gradient_x, gradient_y = self.sample([CENTRE, CENTRE + 1, CENTRE + 2], x, y)
+        norm = np.maximum(np.hypot(gradient_x, gradient_y), 1e-9)
+        # The signed distance grows away from the line, so go down its gradient on either side
+        sign = -np.sign(distance)
+        direction = np.stack([sign * gradient_x / norm, sign * gradient_y / norm], axis=-1)
+        return direction, np.abs(distance)[()]
+
+
+class SDFTrackBatch:
+    """
+    The grids of many SDFTracks stacked for lookups with one point per row.
+
+    Rows sharing an SDFTrack share its grid. Grids of different sizes are
+    padded to the largest, each keeps its own origin and size.
+
+    :param tracks: SDFTrack per row
+    """
+
+    def __init__(self, tracks):
+        unique = {}
+        self.grid_index = np.array([unique.setdefault(id(t), len(unique)) for t in tracks])
+        grids = list({id(t): t for t in tracks}.values())
+        shapes = np.array([g.shape for g in grids])
+        height, width = shapes.max(axis=0)
+        self.fields = np.zeros((len(grids), len(FIELDS), height, width), dtype=np.float32)
+        for k, g in enumerate(grids):
+            self.fields[k, :, :g.shape[0], :g.shape[1]] = g.fields
+        self.x0 = np.array([g.x0 for g in grids])[self.grid_index]
+        self.y0 = np.array([g.y0 for g in grids])[self.grid_index]
+        self.resolutions = np.array([g.resolution for g in grids])[self.grid_index]
+        self.max_i = shapes[self.grid_index, 1] - 1.000001
+        self.max_j = shapes[self.grid_index, 0] - 1.000001
+        self._rows = np.arange(len(tracks))
+
+    def sample(self, plane, x, y, rows=None):
+        """Bilinear lookup of one field plane, point k read from the grid of rows[k]."""
+        rows = self._rows if rows is None else rows
+        fx = np.clip((x - self.x0[rows]) / self.resolutions[rows], 0, self.max_i[rows])
+        fy = np.clip((y - self.y0[rows]) / self.resolutions[rows], 0, self.max_j[rows])
+        i, j = fx.astype(np.int64), fy.astype(np.int64)
+        tx, ty = fx - i, fy - j
+        grid, k = self.fields[:, plane], self.grid_index[rows]
+        bottom = grid[k, j, i] * (1 - tx) + grid[k, j, i + 1] * tx
+        top = grid[k, j + 1, i] * (1 - tx) + grid[k, j + 1, i + 1] * tx
+        return bottom * (1 - ty) + top * ty
+
+    def distances(self, x, y, rows=None):
+        return self.sample(LEFT, x, y, rows), self.sample(RIGHT, x, y, rows)
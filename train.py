@@ -1,29 +1,157 @@
+import argparse
+import os
+import time
+
+import numpy as np
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 from CarEnvCustom import SimpleCarRacingEnv
+from CarVecEnv import SimpleCarRacingVecEnv
+from shm_vec_env import SharedMemoryVecEnv
+from model_registry import default_registry
+from profiling import StepProfiler, VecStepProfiler
+from telemetry import TelemetryCallback
+from checkpointing import AsyncCheckpointCallback, latest_checkpoint, load_checkpoint
+
+# How rollouts are collected: one process, one process per env,
+# shared-memory workers, or the numpy-batched curved-track env
+VEC_ENV_TYPES = ("dummy", "subproc", "shm", "batched")
+
+# PPO hyperparameters of new models, sweep.py overrides them per trial
+PPO_DEFAULTS = {"learning_rate": 0.0003, "batch_size": 64, "gamma": 0.99, "ent_coef": 0.01}
+
+
+def make_env(rank, seed=None, track_pool=None, profile_path=None, env_kwargs=None):
+    """Return a function building the rank-th env, seeded with seed + rank."""
+    def _init():
+        if seed is not None:
+            # Track() draws its curvatures from the global numpy RNG
+            np.random.seed(seed + rank)
+        # Each worker maps the pool file itself, so they all share its pages
+        env = SimpleCarRacingEnv(track_pool=track_pool, **(env_kwargs or {}))
+        if profile_path is not None:
+            # One stats file per env, the workers cannot share counters
+            root, extension = os.path.splitext(profile_path)
+            env = StepProfiler(env, dump_path=f"{root}.rank{rank}{extension}")
+        if seed is not None:
+            env.reset(seed=seed + rank)
+        return env
+    return _init
+
+
+def build_vec_env(vec_env_type="dummy", n_envs=1, n_workers=None, seed=None, track_pool=None, profile_path=None,
+                  env_kwargs=None):
+    # env_kwargs, e.g. action_repeat or max_steps, are accepted by the scalar and the batched env alike
+    if vec_env_type not in VEC_ENV_TYPES:
+        raise ValueError(f"Unknown vec env type {vec_env_type!r}, expected one of {VEC_ENV_TYPES}")
+
+    # Forked workers would otherwise all inherit the same RNG state and build the same track
+    if seed is None and vec_env_type in ("subproc", "shm"):
+        seed = int(np.random.SeedSequence().entropy % (2 ** 31))
+
+    if vec_env_type == "batched":
+        if seed is not None:
+            np.random.seed(seed)
+        env = SimpleCarRacingVecEnv(n_envs, track_pool=track_pool, **(env_kwargs or {}))
+        if seed is not None:
+            env.seed(seed)  # Seeds the pool draws at the next reset
+        return VecStepProfiler(env, dump_path=profile_path) if profile_path is not None else env
+
+    env_fns = [make_env(rank, seed, track_pool, profile_path, env_kwargs) for rank in range(n_envs)]
+    if vec_env_type == "subproc":
+        return SubprocVecEnv(env_fns)
+    if vec_env_type == "shm":
+        return SharedMemoryVecEnv(env_fns, n_workers=n_workers)
+    return DummyVecEnv(env_fns)
+
+
+def train(model_path="car_race_model9.zip", additional_timesteps=20000,
+          vec_env_type="dummy", n_envs=1, n_workers=None, seed=None, track_pool=None, profile_path=None,
+          telemetry_path=None, checkpoint_dir=None, checkpoint_every=50000, keep_checkpoints=3, action_repeat=1,
+          max_steps=None, stall_steps=None, progress_window=None):
+    env_kwargs = {"action_repeat": action_repeat, "max_steps": max_steps, "stall_steps": stall_steps,
+                  "progress_window": progress_window}
+    env = build_vec_env(vec_env_type, n_envs, n_workers, seed, track_pool, profile_path, env_kwargs)
+
+    # A run with checkpoints picks up where the latest one left off
+    checkpoint = latest_checkpoint(checkpoint_dir) if checkpoint_dir is not None else None
+    if checkpoint is not None:
+        # Restores the timestep count and the RNG states as well, so no reseeding
+        model = load_checkpoint(checkpoint, env=env)
+        print(f"Resuming from {checkpoint} at {model.num_timesteps} timesteps.")
+    else:
+        try:
+            # Load the existing model
+            model = PPO.load(model_path, env=env)
+            print("Loaded existing model for further training.")
+        except FileNotFoundError:
+            # Initialize a new model if no saved model exists
+            model = PPO("MlpPolicy", env, verbose=1, **PPO_DEFAULTS)
+            print("No pre-trained model found. Starting new training.")
+        if seed is not None:
+            model.set_random_seed(seed)
 
-env = SimpleCarRacingEnv()
+    callbacks = []
+    if telemetry_path is not None:
+        callbacks.append(TelemetryCallback(telemetry_path))
+    if checkpoint_dir is not None:
+        callbacks.append(AsyncCheckpointCallback(checkpoint_dir, checkpoint_every, keep_checkpoints))
 
-# Wrap the environment with DummyVecEnv for vectorization
-env = DummyVecEnv([lambda: env])  # Ensure compatibility with stable-baselines3
+    # Train the model, a resumed run only for the timesteps it still lacks
+    start_timesteps = model.num_timesteps if checkpoint is not None else 0
+    start_time = time.perf_counter()
+    model.learn(total_timesteps=additional_timesteps - start_timesteps, callback=callbacks,
+                reset_num_timesteps=checkpoint is None)
+    elapsed = time.perf_counter() - start_time
 
-model_path = "car_race_model9.zip"
+    # learn() restarts the timestep counter unless resuming, so this is the run's steps
+    steps = model.num_timesteps - start_timesteps
+    processes = {"dummy": 1, "batched": 1, "subproc": n_envs}.get(vec_env_type, min(n_workers or n_envs, n_envs))
+    print(f"[{vec_env_type} x{n_envs} envs, {processes} processes] "
+          f"{steps} steps in {elapsed:.1f}s: {steps / elapsed:.0f} steps/sec")
 
-try:
-    # Load the existing model
-    model = PPO.load(model_path, env=env)
-    print("Loaded existing model for further training.")
-except FileNotFoundError:
-    # Initialize a new model if no saved model exists
-    model = PPO("MlpPolicy", env, learning_rate=0.0003, batch_size=64, gamma=0.99, verbose=1, ent_coef=0.01)
-    print("No pre-trained model found. Starting new training.")
+    # Save the model and index the new checkpoint with the env it was trained on
+    model.save(model_path)
+    trained_env_kwargs = {key: value for key, value in env_kwargs.items() if value is not None}
+    if track_pool is not None:
+        trained_env_kwargs["track_pool"] = track_pool
+    default_registry().register(model_path, env_id="custom", env_kwargs=trained_env_kwargs)
 
-# Train the model
-additional_timesteps = 20000  # Set the number of additional timesteps to train
+    env.close()
+    return steps / elapsed
 
-model.learn(total_timesteps=additional_timesteps)
 
-# Save the model
-model.save(model_path)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train PPO on the curved track")
+    parser.add_argument("--model-path", default="car_race_model9.zip")
+    parser.add_argument("--timesteps", type=int, default=20000,
+                        help="Additional timesteps to train, with --checkpoint-dir counted over all resumed runs")
+    parser.add_argument("--vec-env", choices=VEC_ENV_TYPES, default="dummy")
+    parser.add_argument("--n-envs", type=int, default=1, help="Number of environments")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for --vec-env shm (default: one per env)")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed, env i gets seed + i")
+    parser.add_argument("--track-pool", default=None,
+                        help="Track pool .npy from track_pool.py, a new track is drawn at every reset")
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help="Append per-phase env step timings to this JSON lines file (one per env "
+                             "unless --vec-env batched), see profiling.py")
+    parser.add_argument("--telemetry", default=None, metavar="PATH",
+                        help="Append throughput, update time and episode metrics per PPO iteration to this "
+                             "JSON lines or .csv file, see telemetry.py")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="Save checkpoints here in the background, and resume from the latest one if any")
+    parser.add_argument("--checkpoint-every", type=int, default=50000, help="Timesteps between checkpoints")
+    parser.add_argument("--keep-checkpoints", type=int, default=3, help="Newest checkpoints kept")
+    parser.add_argument("--action-repeat", type=int, default=1,
+                        help="Physics substeps per policy step, the checkpoint must be driven with the same")
+    parser.add_argument("--max-steps", type=int, default=None, help="Truncate episodes after this many steps")
+    parser.add_argument("--stall-steps", type=int, default=None,
+                        help="Truncate episodes after this many slow steps in a row, e.g. pinned at a boundary")
+    parser.add_argument("--progress-window", type=int, default=None,
+                        help="Truncate episodes that gained no ground within this many steps")
+    args = parser.parse_args()
 
-env.close()
+    train(args.model_path, args.timesteps, args.vec_env, args.n_envs, args.workers, args.seed, args.track_pool,
+          args.profile, args.telemetry, args.checkpoint_dir, args.checkpoint_every, args.keep_checkpoints,
+          args.action_repeat, args.max_steps, args.stall_steps, args.progress_window)
@@ -0,0 +1,262 @@
+"""
+Compact recordings of env runs for replay without a model.
+
+    env = TrajectoryRecorder(SimpleCarRacingEnv(), "run.carrec")
+    ...                                   # reset() and step() as usual
+    env.close()                           # writes the index
+
+    python trajectory.py record car_race_model9.zip run.carrec --episodes 5
+    python UI_Custom_track.py --replay run.carrec
+
+File layout, all little-endian:
+
+    b"CARREC01" | uint32 header length | JSON header (columns, env)
+    chunks:  uint32 n | n float32 per column, one column after the other
+    JSON index | uint64 index offset | b"CARIDX01"
+
+Every frame is one row: the car state after reset() (action -1, reward 0)
+or after a step. Rows are buffered and written as a chunk of columns when the
+buffer is full and at the end of every episode. The index lists the chunk
+offsets and where each episode starts, with the track it was driven on, so a
+reader can jump to any frame directly. If the index is missing (the recorder
+never closed), the reader rebuilds it from the chunk headers.
+"""
+import argparse
+import bisect
+import json
+import struct
+
+import gymnasium as gym
+import numpy as np
+
+MAGIC = b"CARREC01"
+INDEX_MAGIC = b"CARIDX01"
+COLUMNS = ("x", "y", "angle", "speed", "action", "reward", "left_distance", "right_distance")
+
+_LENGTH = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+
+
+def track_spec(track):
+    """JSON description of a track backend, enough to rebuild it for drawing."""
+    from CarEnvCore import RectangleTrack, TurnTrack
+    if isinstance(track, TurnTrack):
+        return {"kind": "turn"}
+    if isinstance(track, RectangleTrack):
+        return {"kind": "rectangle", "bounds": dict(track.track_bounds)}
+    return {
+        "kind": "segments",
+        "width": float(track.get_width()),
+        "segments": [[float(length), float(curvature)]
+                     for length, curvature in zip(track.segment_lengths, track.curvatures)],
+        "wrap_negative_x": bool(getattr(track, "wrap_negative_x", False)),
+    }
+
+
+def track_from_spec(spec):
+    from CarEnvCore import RectangleTrack, TurnTrack
+    from track_Custom import Track
+    if spec["kind"] == "turn":
+        return TurnTrack()
+    if spec["kind"] == "rectangle":
+        return RectangleTrack(**spec["bounds"])
+    return Track(uniform_width=spec["width"], segments=[tuple(segment) for segment in spec["segments"]],
+                 wrap_negative_x=spec.get("wrap_negative_x", False))
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """
+    Streams the car state of every frame to a recording file.
+
+    :param env: A SimpleCarRacingEnv of any of the three tracks
+    :param path: Recording file to write
+    :param chunk_size: Frames buffered before a chunk is written
+    """
+
+    def __init__(self, env, path, chunk_size=1024):
+        super().__init__(env)
+        self.path = path
+        self.chunk_size = chunk_size
+        self._buffer = np.zeros((len(COLUMNS), chunk_size), dtype=np.float32)
+        self._n_buffered = 0
+        self._n_frames = 0
+        self._chunks = []  # (offset, frames)
+        self._episodes = []  # {"start", "track"}
+        self._file = open(path, "wb")
+        header = json.dumps({"columns": COLUMNS, "env": type(env.unwrapped).__module__}).encode()
+        self._file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+
+    def _record(self, action, reward):
+        car = self.env.unwrapped
+        x, y = float(car.car_position[0]), float(car.car_position[1])
+        left, right = car.track.boundaries(x)
+        self._buffer[:, self._n_buffered] = (x, y, car.angle, car.speed, action, reward, y - left, right - y)
+        self._n_buffered += 1
+        self._n_frames += 1
+        if self._n_buffered == self.chunk_size:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        if self._n_buffered == 0:
+            return
+        self._chunks.append((self._file.tell(), self._n_buffered))
+        self._file.write(_LENGTH.pack(self._n_buffered))
+        self._file.write(np.ascontiguousarray(self._buffer[:, :self._n_buffered]).tobytes())
+        self._file.flush()
+        self._n_buffered = 0
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        self._episodes.append({"start": self._n_frames, "track": track_spec(self.env.unwrapped.track)})
+        self._record(-1, 0.0)
+        return observation, info
+
+    def step(self, action):
+        observation, reward, done, truncated, info = self.env.step(action)
+        self._record(int(action), float(reward))
+        if done or truncated:
+            self._write_chunk()  # A crash loses at most the episode in progress
+        return observation, reward, done, truncated, info
+
+    def close(self):
+        if not self._file.closed:
+            self._write_chunk()
+            index_offset = self._file.tell()
+            index = {"chunks": self._chunks, "episodes": self._episodes, "frames": self._n_frames}
+            self._file.write(json.dumps(index).encode())
+            self._file.write(_OFFSET.pack(index_offset) + INDEX_MAGIC)
+            self._file.close()
+        super().close()
+
+
+class TrajectoryReader:
+    """
+    Random access to the frames of a recording, memory-mapped.
+
+    :param path: Recording written by TrajectoryRecorder
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a trajectory recording")
+        (header_length,) = _LENGTH.unpack(bytes(self._data[8:12]))
+        self.header = json.loads(bytes(self._data[12:12 + header_length]))
+        self.columns = tuple(self.header["columns"])
+        self._data_start = 12 + header_length
+
+        index = self._read_index()
+        self._chunk_arrays = [
+            np.frombuffer(self._data, dtype=np.float32, count=len(self.columns) * frames,
+                          offset=offset + _LENGTH.size).reshape(len(self.columns), frames)
+            for offset, frames in index["chunks"]
+        ]
+        frames = [array.shape[1] for array in self._chunk_arrays]
+        self._chunk_starts = np.concatenate([[0], np.cumsum(frames)[:-1]]).astype(int).tolist() if frames else []
+        self.n_frames = int(sum(frames))
+        self.episodes = [e for e in index["episodes"] if e["start"] < self.n_frames]
+        self._episode_starts = [e["start"] for e in self.episodes]
+        self._tracks = {}
+
+    def _read_index(self):
+        tail = bytes(self._data[-len(INDEX_MAGIC):]) if len(self._data) >= 20 else b""
+        if tail == INDEX_MAGIC:
+            (index_offset,) = _OFFSET.unpack(bytes(self._data[-16:-8]))
+            return json.loads(bytes(self._data[index_offset:-16]))
+        # Unfinished recording: walk the chunk headers, episodes start at action -1
+        chunks, offset = [], self._data_start
+        row_bytes = 4 * len(self.columns)
+        while offset + _LENGTH.size <= len(self._data):
+            (frames,) = _LENGTH.unpack(bytes(self._data[offset:offset + _LENGTH.size]))
+            if frames == 0 or offset + _LENGTH.size + frames * row_bytes > len(self._data):
+                break
+            chunks.append((offset, frames))
+            offset += _LENGTH.size + frames * row_bytes
+        return {"chunks": chunks, "episodes": self._scan_episodes(chunks)}
+
+    def _scan_episodes(self, chunks):
+        action_row = self.columns.index("action")
+        episodes, start = [], 0
+        for offset, frames in chunks:
+            actions = np.frombuffer(self._data, dtype=np.float32, count=len(self.columns) * frames,
+                                    offset=offset + _LENGTH.size).reshape(len(self.columns), frames)[action_row]
+            episodes += [{"start": start + int(i), "track": None} for i in np.flatnonzero(actions == -1)]
+            start += frames
+        return episodes
+
+    def __len__(self):
+        return self.n_frames
+
+    def frame(self, index):
+        """Dict of column values of one frame."""
+        chunk = bisect.bisect_right(self._chunk_starts, index) - 1
+        values = self._chunk_arrays[chunk][:, index - self._chunk_starts[chunk]]
+        return dict(zip(self.columns, values.tolist()))
+
+    def column(self, name):
+        """One column over the whole recording, as a float32 array."""
+        row = self.columns.index(name)
+        return np.concatenate([array[row] for array in self._chunk_arrays]) if self._chunk_arrays else np.zeros(0)
+
+    def episode_of(self, index):
+        return bisect.bisect_right(self._episode_starts, index) - 1
+
+    def episode_range(self, episode):
+        """(first, last + 1) frame of an episode."""
+        end = self._episode_starts[episode + 1] if episode + 1 < len(self.episodes) else self.n_frames
+        return self._episode_starts[episode], end
+
+    def track(self, episode):
+        """Track backend the episode was driven on, None if the index was lost."""
+        spec = self.episodes[episode]["track"]
+        if spec is None:
+            return None
+        key = json.dumps(spec, sort_keys=True)
+        if key not in self._tracks:
+            self._tracks[key] = track_from_spec(spec)
+        return self._tracks[key]
+
+
+def record(model_path, output_path, env_id="custom", n_episodes=1, max_steps=500, seed=0):
+    """Run a policy for a few episodes and record them."""
+    from evaluate import make_env
+    from numpy_policy import load_policy
+
+    policy = load_policy(model_path)
+    env = TrajectoryRecorder(make_env(env_id, seed), output_path)
+    for episode in range(n_episodes):
+        observation, _ = env.reset(seed=seed + episode)
+        for _ in range(max_steps):
+            action, _ = policy.predict(observation, deterministic=True)
+            observation, _, done, truncated, _ = env.step(action)
+            if done or truncated:
+                break
+    env.close()
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or inspect trajectory recordings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="Record a policy driving an env")
+    record_parser.add_argument("model_path", help="PPO checkpoint (.zip) or numpy export (.npz)")
+    record_parser.add_argument("output_path")
+    record_parser.add_argument("--env", choices=("straight", "turn", "custom"), default="custom")
+    record_parser.add_argument("--episodes", type=int, default=1)
+    record_parser.add_argument("--max-steps", type=int, default=500)
+    record_parser.add_argument("--seed", type=int, default=0)
+    info_parser = subparsers.add_parser("info", help="Summarize a recording")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.model_path, args.output_path, args.env, args.episodes, args.max_steps, args.seed)
+        print(f"Recorded {args.episodes} episodes to {args.output_path}")
+    else:
+        reader = TrajectoryReader(args.path)
+        rewards = reader.column("reward")
+        print(f"{args.path}: {reader.header['env']}, {len(reader)} frames, {len(reader.episodes)} episodes")
+        for episode in range(len(reader.episodes)):
+            start, end = reader.episode_range(episode)
+            print(f"  episode {episode}: {end - start - 1} steps, return {rewards[start:end].sum():.1f}")
@@ -0,0 +1,393 @@
+"""
+Drawing and loop helpers shared by the pygame UI scripts.
+
+The track never changes during an episode, so it is drawn once to a
+background Surface. Each frame only the rectangles touched by the previous and
+the current frame (car, direction line, text) are restored from the
+background, redrawn and sent to the display.
+
+The simulation runs at a fixed rate of its own (FixedTimestep), independent
+of the frame rate, and the frames interpolate between the last two states.
+The policy runs on a background thread (PolicyWorker), so a slow predict()
+delays the next simulation step but never a frame. play_recording() drives
+the same loop from a trajectory.py recording instead of an env and a policy.
+
+Imports pygame, so the UI scripts import this module inside main().
+"""
+import math
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pygame
+
+
+def track_background(size, x_positions, left_boundaries, right_boundaries, to_screen,
+                     background_color, track_color, line_width=8):
+    """Surface with the track drawn as vertical slices between the two boundaries.
+
+    to_screen maps arrays of (x, y) track coordinates to screen pixels.
+    """
+    surface = pygame.Surface(size).convert()
+    surface.fill(background_color)
+    x_screen, left_screen = to_screen(x_positions, left_boundaries)
+    _, right_screen = to_screen(x_positions, right_boundaries)
+    for x, top, bottom in zip(x_screen.tolist(), left_screen.tolist(), right_screen.tolist()):
+        pygame.draw.line(surface, track_color, (x, top), (x, bottom), line_width)
+    return surface
+
+
+class DirtyRectRenderer:
+    """
+    Draws on top of a cached background and updates only what changed.
+
+    Per frame: begin(), then draw through draw()/blit() (or add() the Rect of
+    any other drawing), then end().
+
+    :param screen: Display surface
+    :param background: Surface of the static scene, same size as the screen
+    """
+
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self._previous = []
+        self._current = []
+        self._full_redraw = True
+
+    def set_background(self, background):
+        self.background = background
+        self._full_redraw = True
+
+    def redraw_all(self):
+        """Send the whole screen at the next end(), e.g. after drawing outside the renderer."""
+        self._full_redraw = True
+
+    def begin(self):
+        if self._full_redraw:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            # Wipe last frame's drawings by restoring the background below them
+            for rect in self._previous:
+                self.screen.blit(self.background, rect, rect)
+        self._current = []
+
+    def add(self, rect):
+        self._current.append(rect)
+        return rect
+
+    def draw(self, draw_fn, *args, **kwargs):
+        """Call a pygame.draw function on the screen and remember the Rect it touched."""
+        return self.add(draw_fn(self.screen, *args, **kwargs))
+
+    def blit(self, surface, position):
+        return self.add(self.screen.blit(surface, position))
+
+    def end(self):
+        if self._full_redraw:
+            pygame.display.flip()
+            self._full_redraw = False
+        else:
+            pygame.display.update(self._previous + self._current)
+        self._previous = self._current
+
+
+class FrameTimer:
+    """
+    Rolling average of the time spent per phase of a frame.
+
+    :param window: Number of frames averaged
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self.durations = {}
+        self._frame_starts = deque(maxlen=window + 1)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        if name not in self.durations:
+            self.durations[name] = deque(maxlen=self.window)
+        self.durations[name].append(seconds)
+
+    def tick(self):
+        """Mark the start of a frame, for the frame rate."""
+        self._frame_starts.append(time.perf_counter())
+
+    def fps(self):
+        if len(self._frame_starts) < 2:
+            return 0.0
+        return (len(self._frame_starts) - 1) / (self._frame_starts[-1] - self._frame_starts[0])
+
+    def ms(self, name):
+        values = self.durations.get(name)
+        return float(np.mean(values)) * 1000 if values else 0.0
+
+    def summary(self, phases=("render", "inference", "sim")):
+        return f"{self.fps():6.0f} FPS  " + "  ".join(f"{name} {self.ms(name):5.2f} ms" for name in phases)
+
+
+def lerp(start, end, alpha):
+    return start + (end - start) * alpha
+
+
+def lerp_angle(start, end, alpha):
+    # Along the shorter arc, so 359° -> 1° does not spin through 180°
+    return start + ((end - start + math.pi) % (2 * math.pi) - math.pi) * alpha
+
+
+class FixedTimestep:
+    """
+    Hands out simulation steps at a fixed rate, however fast frames are drawn.
+
+    Each frame, iterate over due_steps() and run one simulation step per
+    item; breaking out early keeps the unused time for the next frame. alpha()
+    is how far the current frame lies between the last two states.
+
+    :param step_rate: Simulation steps per second at 1x speed
+    :param max_steps_per_frame: Cap on catch-up steps after a slow frame
+    :param frame_budget: Seconds per frame spent simulating in max-speed mode
+    """
+
+    SPEEDS = (1, 2, 4, 8, 16, 32)
+
+    def __init__(self, step_rate=10, max_steps_per_frame=64, frame_budget=1 / 60):
+        self.step_time = 1 / step_rate
+        self.max_steps_per_frame = max_steps_per_frame
+        self.frame_budget = frame_budget
+        self.speed = 1
+        self.max_speed = False
+        self._accumulator = 0.0
+        self._last = time.perf_counter()
+        self._deadline = 0.0
+
+    def reset(self):
+        """Forget the time that passed, e.g. while the UI waited for a key."""
+        self._accumulator = 0.0
+        self._last = time.perf_counter()
+
+    def faster(self):
+        self.speed = self.SPEEDS[min(self.SPEEDS.index(self.speed) + 1, len(self.SPEEDS) - 1)]
+
+    def slower(self):
+        self.speed = self.SPEEDS[max(self.SPEEDS.index(self.speed) - 1, 0)]
+
+    def toggle_max_speed(self):
+        self.max_speed = not self.max_speed
+        self.reset()
+
+    def due_steps(self):
+        now = time.perf_counter()
+        if self.max_speed:
+            # As many steps as fit in the frame budget, no interpolation
+            self._deadline = now + self.frame_budget
+            while time.perf_counter() < self._deadline:
+                yield
+            self._last = time.perf_counter()
+            return
+
+        self._accumulator += (now - self._last) * self.speed
+        self._last = now
+        steps = 0
+        while self._accumulator >= self.step_time:
+            if steps == self.max_steps_per_frame:
+                # Too far behind, drop the backlog instead of snowballing
+                self._accumulator = self.step_time
+                return
+            yield
+            self._accumulator -= self.step_time
+            steps += 1
+
+    def remaining(self):
+        """How long a step may wait for the policy without delaying the frame."""
+        return max(0.0, self._deadline - time.perf_counter()) if self.max_speed else 0.0
+
+    def alpha(self):
+        return 1.0 if self.max_speed else min(self._accumulator / self.step_time, 1.0)
+
+    def label(self):
+        return "max speed" if self.max_speed else f"{self.speed}x"
+
+
+class PolicyWorker:
+    """
+    Runs policy.predict() on a background thread, one observation at a time.
+
+    submit() hands over the next observation, poll() returns its action once
+    it is ready and None before that. Answers to observations submitted
+    earlier, e.g. before a reset, are dropped.
+
+    :param policy: Anything with a PPO-style predict(obs, deterministic=True)
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.inference_time = 0.0
+        self._requests = queue.Queue()
+        self._ready = threading.Event()
+        self._submitted = 0
+        self._result = (0, None)
+        self._thread = threading.Thread(target=self._run, name="policy-worker", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            number, obs = request
+            start = time.perf_counter()
+            action, _ = self.policy.predict(obs, deterministic=True)
+            self.inference_time = time.perf_counter() - start
+            self._result = (number, action)
+            if number == self._submitted:
+                self._ready.set()
+
+    def submit(self, obs):
+        self._ready.clear()
+        self._submitted += 1
+        self._requests.put((self._submitted, obs))
+
+    def poll(self, timeout=0.0):
+        """The action for the last submitted observation, or None if it is not ready."""
+        ready = self._ready.wait(timeout) if timeout > 0 else self._ready.is_set()
+        number, action = self._result
+        if not ready or number != self._submitted:
+            return None
+        self._ready.clear()
+        self._submitted += 1  # Each answer is handed out once
+        return action
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join()
+
+
+def play_recording(screen, reader, track_view, fps=60, step_rate=10, show_hud=False, default_track=None):
+    """
+    Replay a trajectory.TrajectoryReader recording, no env or policy involved.
+
+    Keys: Space pauses, Left/Right step one frame (50 with Shift), Page
+    Up/Down jump between episodes, Home/End to the ends, F and S change the
+    speed, H toggles the HUD, Q quits. Clicking or dragging on the bar at the
+    bottom seeks.
+
+    :param track_view: Function of a track backend returning the background
+        Surface and the to_screen(x, y) mapping for it
+    :param default_track: Track of episodes recorded without an index
+    """
+    screen_width, screen_height = screen.get_size()
+    font = pygame.font.Font(None, 30)
+    hud_font = pygame.font.Font(None, 22)
+    bar = pygame.Rect(10, screen_height - 12, screen_width - 20, 6)
+    black, grey, red = (0, 0, 0), (200, 200, 200), (255, 0, 0)
+
+    n_frames = len(reader)
+    returns = np.cumsum(reader.column("reward"), dtype=np.float64)  # Running return, for any frame
+    timestep = FixedTimestep(step_rate)
+    timer = FrameTimer()
+    clock = pygame.time.Clock()
+    renderer, to_screen = None, None
+    frame, episode, playing, running = 0, -1, True, n_frames > 0
+
+    def seek(target):
+        nonlocal frame
+        frame = int(min(max(target, 0), n_frames - 1))
+        timestep.reset()
+
+    while running:
+        timer.tick()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                step = 50 if event.mod & pygame.KMOD_SHIFT else 1
+                if event.key in (pygame.K_q, pygame.K_ESCAPE):
+                    running = False
+                elif event.key == pygame.K_SPACE:
+                    playing = not playing
+                    timestep.reset()
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    playing = False
+                    seek(frame + (step if event.key == pygame.K_RIGHT else -step))
+                elif event.key == pygame.K_PAGEUP:
+                    start, _ = reader.episode_range(reader.episode_of(frame))
+                    # Back to the start of this episode, or of the previous one when already there
+                    seek(start if frame > start else reader.episode_range(max(reader.episode_of(frame) - 1, 0))[0])
+                elif event.key == pygame.K_PAGEDOWN:
+                    seek(reader.episode_range(reader.episode_of(frame))[1])
+                elif event.key == pygame.K_HOME:
+                    seek(0)
+                elif event.key == pygame.K_END:
+                    seek(n_frames - 1)
+                elif event.key == pygame.K_f:
+                    timestep.faster()
+                elif event.key == pygame.K_s:
+                    timestep.slower()
+                elif event.key == pygame.K_h:
+                    show_hud = not show_hud
+            elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION):
+                pressed = event.type == pygame.MOUSEBUTTONDOWN or event.buttons[0]
+                if pressed and bar.inflate(0, 20).collidepoint(event.pos):
+                    seek((event.pos[0] - bar.left) / bar.width * (n_frames - 1))
+
+        if playing:
+            for _ in timestep.due_steps():
+                if frame + 1 >= n_frames:
+                    playing = False
+                    break
+                frame += 1
+
+        with timer.phase("render"):
+            if reader.episode_of(frame) != episode:
+                episode = reader.episode_of(frame)
+                track = reader.track(episode)
+                background, to_screen = track_view(track if track is not None else default_track)
+                if renderer is None:
+                    renderer = DirtyRectRenderer(screen, background)
+                else:
+                    renderer.set_background(background)
+            renderer.begin()
+
+            # Between this frame and the next one of the same episode
+            start, end = reader.episode_range(episode)
+            current = reader.frame(frame)
+            following = reader.frame(frame + 1) if playing and frame + 1 < end else current
+            alpha = timestep.alpha()
+            x, y = to_screen(lerp(current["x"], following["x"], alpha), lerp(current["y"], following["y"], alpha))
+            angle = lerp_angle(current["angle"], following["angle"], alpha)
+            renderer.draw(pygame.draw.circle, red, (x, y), 5)
+            renderer.draw(pygame.draw.line, black, (x, y), (x + np.cos(angle) * 20, y - np.sin(angle) * 20), 2)
+
+            episode_return = returns[frame] - (returns[start - 1] if start > 0 else 0.0)
+            lines = (f"Episode {episode + 1}/{len(reader.episodes)}  step {frame - start}/{end - start - 1}",
+                     f"Speed: {current['speed']:.2f}",
+                     f"Reward: {current['reward']:.2f}",
+                     f"Total Reward: {episode_return:.2f}")
+            for row, text in enumerate(lines):
+                renderer.blit(font.render(text, True, black), (10, 10 + 30 * row))
+            if not playing:
+                renderer.blit(font.render("Paused", True, black), (screen_width - 100, 10))
+
+            # Scrub bar over the whole recording
+            renderer.draw(pygame.draw.rect, grey, bar)
+            progress = bar.copy()
+            progress.width = max(1, round(bar.width * frame / max(n_frames - 1, 1)))
+            renderer.draw(pygame.draw.rect, red, progress)
+
+            if show_hud:
+                hud_text = f"{timer.summary(('render',))}  replay {timestep.label()}"
+                renderer.blit(hud_font.render(hud_text, True, black), (10, screen_height - 40))
+            renderer.end()
+
+        clock.tick(fps)